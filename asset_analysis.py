@@ -7,17 +7,22 @@ from __future__ import annotations
 print('\033[?25l', end = "")    # Hide terminal cursor
 print('\nInitiating the pipeline, please wait...', end = '\r')
 
-import os, shutil, re, argparse
+import os, re, argparse
 from sys import stdout
+from time import perf_counter
+from dataclasses import dataclass, field
+from concurrent.futures import as_completed
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
-from lib.data import data
-from lib.exceptions import AssetTypeError, PredictionDaysError, BadPortError, NoParameterError, DateError
-from lib.model_methods import preprocessing
-from lib.fin_asset import financial_assets, prediction_assessment
-from lib.db_utils import SQLite_Query
+from lib.exceptions import AssetTypeError, PredictionDaysError, BadPortError, NoParameterError, DateError, SplitError, FetchError
 import datetime as dt
-from typing import Any, Final
-from lib.utils import dunders, yml_parser, terminal_str_formatter
+from typing import Any, Final, TYPE_CHECKING
+from lib.utils import dunders, yml_parser, terminal_str_formatter, watchlist_parser
+
+# The data, ML, plotting and dashboard stacks are imported by the code paths that use them,
+# so -h, argument errors and -serve start without loading them.
+if TYPE_CHECKING:
+    import pandas as pd
+    from lib.storage import _storage
 
 stdout.write('\x1b[2K') # erase line.
 
@@ -39,6 +44,17 @@ DEFAULT_DROPOUT: Final[float] = parse_constants['DEFAULT_DROPOUT']
 DEFAULT_OPTIMIZER: Final[str] =  parse_constants['DEFAULT_OPTIMIZER']
 DEFAULT_UNITS: Final[int] = parse_constants['DEFAULT_UNITS']
 DEFAULT_CLOSING: Final[int] = parse_constants['DEFAULT_CLOSING']
+DEFAULT_WORKERS: Final[int] = parse_constants['DEFAULT_WORKERS']
+MODEL_CACHE_MAX_ENTRIES: Final[int] = parse_constants['MODEL_CACHE_MAX_ENTRIES']
+MODEL_CACHE_MAX_MB: Final[int] = parse_constants['MODEL_CACHE_MAX_MB']
+FINETUNE: Final[dict] = {'max_rows': parse_constants['FINETUNE_MAX_ROWS'],
+                        'replay': parse_constants['FINETUNE_REPLAY'],
+                        'epochs': parse_constants['FINETUNE_EPOCHS']}
+# Only the price columns used by the pipeline are queried, with their NumPy dtypes.
+PRICE_QUERY: Final[tuple] = ('Date', 'Close', 'Adj_Close')
+PRICE_FLOATS: Final[tuple] = ('Close', 'Adj_Close')    # Queried with the pipeline precision.
+PRECISION: Final[str] = parse_constants['PRECISION']
+PRECISIONS: Final[tuple] = ('float32', 'float64')
 
 CURRENCIES: Final[dict] = { 'USD': '$',
                             'EUR': '€',
@@ -57,7 +73,8 @@ def args_parser(msg: str) -> argparse.Namespace:
     """
 
     parser = argparse.ArgumentParser(description = msg, formatter_class = argparse.RawDescriptionHelpFormatter)
-    parser.add_argument("-ast", help = "Market Asset. Needs to be written as: Asset_initials-currency")
+    parser.add_argument("-ast", help = "Market Asset. Needs to be written as: Asset_initials-currency. "
+                        "Several assets separated by commas or spaces run in batch mode.")
     parser.add_argument("-tp", help = "Asset Type, etc. Cryptocurrency or Stock.")
     parser.add_argument("-pd", help = "Prediction days used for training. Must be a positive integer.")
     parser.add_argument("-db", help = "Optional argument: SQLite3 Database name. Defaults: asset_name_data.db")
@@ -72,11 +89,41 @@ def args_parser(msg: str) -> argparse.Namespace:
     parser.add_argument("-dropout", help = f"Optional argument: BaseRandomLayer for LSTM-RNN. Defaults to {DEFAULT_DROPOUT}.")
     parser.add_argument("-optimizer", help = f"Optional argument: Optimization algorithm. Defaults to {DEFAULT_OPTIMIZER}.")
     parser.add_argument("-units", help = f"Optional argument: Dimensionality of the output space. Defaults to {DEFAULT_UNITS}.")
-    parser.add_argument("-closing", help = f"Optional argument: Closing value of the model. Defaults to {DEFAULT_CLOSING}.")
+    parser.add_argument("-closing", help = f"Optional argument: Days forecast after the last day. Defaults to {DEFAULT_CLOSING}.")
+    parser.add_argument("-precision", help = f"Optional argument: Floating point precision of the prices from the query to the assessment: float32 or float64. Defaults to {PRECISION}.")
+    parser.add_argument("-sweep", help = "Optional argument: Search space .yml file. Runs a hyperparameter sweep of the first asset instead of the analysis.")
+    parser.add_argument("-sweep_strategy", help = "Optional argument: Sweep search strategy: grid, random or halving (successive halving). Defaults to grid.")
+    parser.add_argument("-trials", help = "Optional argument: Number of trials of the random and halving sweeps.")
+    parser.add_argument("-trial_threads", help = "Optional argument: CPU threads of each sweep trial or backtest worker. Defaults to the CPUs divided by -workers.")
+    parser.add_argument("-backtest", action = 'store_true', help = "Optional argument: Walk-forward backtest of the model on the assets instead of the analysis. Each fold forecasts the next -closing days.")
+    parser.add_argument("-folds", help = "Optional argument: Latest walk-forward folds evaluated. Defaults to 10.")
+    parser.add_argument("-fold_scheme", help = "Optional argument: Training rows of each fold: expanding, all the rows so far, or rolling, the last -train_rows. Defaults to expanding.")
+    parser.add_argument("-train_rows", help = "Optional argument: Training rows of the first expanding fold and of every rolling fold. Defaults to 504.")
+    parser.add_argument("-retrain_every", help = "Optional argument: Folds between two models trained from scratch, the folds in between fine-tune the last model. Defaults to 1.")
+    parser.add_argument("-risk", action = 'store_true', help = "Optional argument: Update the rolling risk metrics of the assets in the risk_metrics table instead of the analysis. Only the new days are computed, -refresh recomputes them all.")
+    parser.add_argument("-benchmark", help = "Optional argument: Asset the -risk betas are measured against. Defaults to the equal weighted assets.")
+    parser.add_argument("-stream", help = "Optional argument: Live predictions instead of the analysis. Directory watched for csv bar files, or local TCP port receiving newline delimited json bars. Each bar is stored and forecast with the cached model of its asset, and the dashboard is refreshed.")
+    parser.add_argument("-forecast", help = "Optional argument: Forecasting mode of the -closing days: direct, one model output per day, or recursive, next day predictions fed back into the model. Defaults to direct.")
     parser.add_argument("-test",  action = 'store_true', help = f"Optional argument: Runs a test profile. Uses {DEFAULT_ASSET} as an example.")
     parser.add_argument("-end_y", help = "Optional argument: Year of end date for data calls. Only use when -tdy is set to False.")
     parser.add_argument("-end_m", help = "Optional argument: Month of end date for data calls. Only use when -tdy is set to False.")
     parser.add_argument("-end_d", help = "Optional argument: Day of end date for data calls. Only use when -tdy is set to False.")
+    parser.add_argument("-watchlist", help = "Optional argument: File with the assets to analyse in batch mode. One or more tickers per line, # for comments.")
+    parser.add_argument("-workers", help = f"Optional argument: Worker processes for batch mode. Defaults to {DEFAULT_WORKERS}.")
+    parser.add_argument("-refresh", action = 'store_true', help = "Optional argument: Re-download the full history instead of only the missing days.")
+    parser.add_argument("-provider", help = "Optional argument: Market data provider: yahoo, local, synthetic or faulty (synthetic with injected latency and failures). Defaults to yahoo.")
+    parser.add_argument("-provider_dir", help = "Optional argument: Directory of <ticker>.csv or <ticker>.parquet files for the local provider.")
+    parser.add_argument("-provider_cache", help = "Optional argument: Directory of an on-disk cache of the provider downloads. Defaults to memory only.")
+    parser.add_argument("-fetch_workers", help = "Optional argument: Assets downloaded at once. Defaults to 8.")
+    parser.add_argument("-rate_limit", help = "Optional argument: Market data provider requests per second, 0 for no limit. Defaults to 2.")
+    parser.add_argument("-split", help = "Optional argument: Train/test split. Fraction of the data used for training e.g. 0.8 or first test date as YYYY-MM-DD. Defaults: train on all the data and evaluate in-sample.")
+    parser.add_argument("-storage", help = "Optional argument: Storage of the asset prices: sqlite or parquet. Defaults to sqlite.")
+    parser.add_argument("-serve", action = 'store_true', help = "Optional argument: Launch the dashboard server of all the analysed assets stored in the Databases subdirectory, without running any analysis.")
+    parser.add_argument("-instrument", action = 'store_true', help = "Optional argument: Time every stage of the run (download, query, preprocessing, fit, predict, assessment, dashboard) with its rows, bytes and peak memory. The timings are printed and saved as json and as a Prometheus textfile in the Metrics subdirectory.")
+    parser.add_argument("-profile", help = "Optional argument: Comma separated stages profiled during the run, or all. Profiles are saved in the Metrics subdirectory. Implies -instrument.")
+    parser.add_argument("-profiler", help = "Optional argument: Profiler of the -profile stages: cprofile or pyinstrument. Defaults to cprofile.")
+    parser.add_argument("-prom_file", help = "Optional argument: Prometheus textfile of the -instrument timings, e.g. in the node exporter textfile directory. Defaults to Metrics/market_analysis.prom.")
+    parser.add_argument("-retrain", action = 'store_true', help = "Optional argument: Train a new model from scratch even when a cached model for the same data and parameters exists, or one that can be fine-tuned on the new days.")
     return parser.parse_args()
 
 def bool_parser(var: Any) -> bool:
@@ -139,6 +186,22 @@ class Launcher(dunders):
         * `batch` (int | None): Batch size of the model.
         * `dimensionality` (int | None): Dimensionality of the output space.
         * `closing` (int | None):  Number of prediction days i.e. if it is equal to 1 then just the next day will be predicted.
+        * `workers` (int | None): Worker processes used when more than one asset is analysed.
+        * `refresh` (bool): If True, re-download the full history instead of only the missing days.
+        * `retrain` (bool): If True, train a new model even when a cached one exists.
+        * `provider` (str | None): Market data provider: yahoo, local, synthetic or faulty.
+        * `provider_dir` (str | None): Directory of the local provider.
+        * `provider_cache` (str | None): Directory of the on-disk provider cache.
+        * `split` (float | str | None): Fraction of the data used for training or first test date (YYYY-MM-DD).
+        * `storage` (str | None): Storage of the asset prices: sqlite or parquet.
+        * `forecast` (str | None): Forecasting mode of the closing days: direct or recursive.
+        * `precision` (str | None): Floating point precision of the prices: float32 or float64.
+        * `fetch_workers` (int | None): Assets downloaded at once.
+        * `rate_limit` (float | None): Market data provider requests per second, 0 for no limit.
+        * `instrument` (bool): Time the stages of the run and export the timings.
+        * `profile` (str | None): Comma separated stages profiled during the run, or all. Implies instrument.
+        * `profiler` (str | None): Profiler of the profiled stages: cprofile or pyinstrument.
+        * `prom_file` (str | None): Prometheus textfile of the stage timings.
 
     Raises:
         * `AssetTypeError`: Invalid asset type.
@@ -154,7 +217,14 @@ class Launcher(dunders):
                 port: int, plt: bool, model: str, drop: float | None, 
                 optimizer: str | None, loss: str | None, epoch: int | None,
                 batch: int | None, dimensionality: int | None,
-                closing: int | None) -> None:
+                closing: int | None, workers: int | None = None,
+                refresh: bool = False, retrain: bool = False,
+                provider: str | None = None, provider_dir: str | None = None,
+                provider_cache: str | None = None, split: float | str | None = None,
+                storage: str | None = None, forecast: str | None = None,
+                precision: str | None = None, fetch_workers: int | None = None,
+                rate_limit: float | None = None, instrument: bool = False, profile: str | None = None,
+                profiler: str | None = None, prom_file: str | None = None) -> None:
 
         self.date = date
         # will always be datetime if interpreter reaches this point because self.date input will be checked by _dt_format().
@@ -169,9 +239,15 @@ class Launcher(dunders):
             raise AssetTypeError(f"Asset type: {self.asset_type} is not valid. Some valid asset types are: "
                                 "Cryptocurrency, crypto, stock.")
 
-        self.asset = asset
-        if not any(curr in self.asset for curr in tuple(CURRENCIES.keys())):
-            self.asset = self.asset + "-USD"
+        self.assets = []
+        for tick in re.split(r'[\s,]+', asset.strip()):
+            if not tick:
+                continue
+            if not any(curr in tick for curr in tuple(CURRENCIES.keys())):
+                tick = tick + "-USD"
+            if tick not in self.assets:
+                self.assets.append(tick)
+        self.asset = self.assets[0]
 
         self.today = today
         self.today = _defaults(var = self.today, default = True)
@@ -216,7 +292,45 @@ class Launcher(dunders):
         self.dimensionality = dimensionality
         self.dimensionality = _defaults(var = dimensionality, default = DEFAULT_UNITS)
         self.closing = closing
-        self.closing = _defaults(var = closing, default = DEFAULT_CLOSING)
+        self.closing = int(_defaults(var = closing, default = DEFAULT_CLOSING))
+        self.workers = int(_defaults(var = workers, default = DEFAULT_WORKERS))
+        self.refresh = bool_parser(var = refresh)
+        self.retrain = bool_parser(var = retrain)
+        self.split = _split_parser(split = split)
+
+        self.precision = _defaults(var = precision, default = PRECISION)
+        if self.precision not in PRECISIONS:
+            raise ValueError(f'Precision: {self.precision} is not valid. Valid precisions are: {", ".join(PRECISIONS)}.')
+
+        from lib.inference import output_width
+        self.forecast = _defaults(var = forecast, default = 'direct')
+        output_width(horizon = self.closing, mode = self.forecast)     # Validates the mode and the horizon.
+
+        from lib.storage import STORAGES
+        from lib.providers import get_provider
+        from lib.model_registry import model_registry
+        self.storage = _defaults(var = storage, default = 'sqlite')
+        if self.storage not in STORAGES:
+            raise ValueError(f'Storage: {self.storage} is not valid. Valid storages are: {", ".join(STORAGES)}.')
+
+        from lib.ingest import FETCH_WORKERS, RATE_LIMIT
+        self.fetch_workers = int(_defaults(var = fetch_workers, default = FETCH_WORKERS))
+        self.rate_limit = float(_defaults(var = rate_limit, default = RATE_LIMIT))
+        self.fetched = set()    # Assets already downloaded in this run.
+
+        # One provider for the whole run, so each ticker and date range is fetched once.
+        self.provider = get_provider(name = _defaults(var = provider, default = 'yahoo'), root = provider_dir,
+                                    store = _defaults(var = provider_cache, default = None))
+        self.registry = model_registry(root = self.__models_subdir(), max_entries = MODEL_CACHE_MAX_ENTRIES,
+                                    max_mb = MODEL_CACHE_MAX_MB)
+
+        from lib.instrument import PROFILERS
+        self.profile = () if profile is None else tuple(name.strip() for name in str(profile).split(',') if name.strip())
+        self.instrumented = bool_parser(var = instrument) or bool(self.profile)    # Profiling needs the stage timers.
+        self.profiler = _defaults(var = profiler, default = 'cprofile')
+        if self.profiler not in PROFILERS:
+            raise ValueError(f'Profiler: {self.profiler} is not valid. Valid profilers are: {", ".join(PROFILERS)}.')
+        self.prom_file = _defaults(var = prom_file, default = os.path.join(self.__metrics_subdir(), 'market_analysis.prom'))
 
     @classmethod
     def __db_subdir(cls):
@@ -227,62 +341,554 @@ class Launcher(dunders):
         """
         return os.path.join(cls.cwd, "Databases")
 
-    def analyze(self) -> bool:
-        """Run through all the analysis of the asset. Produces the dash dashboard on localhost.
+    @classmethod
+    def __models_subdir(cls):
+        """Class method for the model registry subdirectory, next to the database subdirectory.
+
+        Returns:
+            `str`: Path to the model registry subdirectory.
+        """
+        return os.path.join(cls.cwd, "Models")
+
+    @classmethod
+    def __metrics_subdir(cls):
+        """Class method for the instrumentation subdirectory, next to the database subdirectory.
 
         Returns:
-            `boolean`: True when operation finishes successfully.
+            `str`: Path to the run metrics and profiles subdirectory.
+        """
+        return os.path.join(cls.cwd, "Metrics")
+
+    @classmethod
+    def serve(cls, port: int | None = None) -> Any:
+        """Launch the long running dashboard server of all the assets stored in the database subdirectory.
+
+        Args:
+            * `port` (int | None, optional): Local host port for the dashboard. Defaults to None (PORT).
+
+        Returns:
+            Launches an instance of the app.
+        """
+
+        from dashboard.server import dashboard_serve
+        return dashboard_serve(root = cls.__db_subdir(), port = int(_defaults(var = port, default = PORT)))
+
+    def _asset_db(self) -> str:
+        """Path of the asset type database, always inside the Databases subdirectory.
+
+        Returns:
+            `str`: Path to the database.
         """
 
         db_subdir = self.__db_subdir()
-        fin_asset = data(start = self.date, model_name = self.model)
-        asset_l = self.asset.split()
-        asset_n, asset_curr = asset_l[0].split('-', 1)  # Asset name and currency.
-        asset_curr_symbol: str = ''.join([val for key, val in CURRENCIES.items() if asset_curr in key])
-        db_output_fl: str = os.path.join(db_subdir, self.big_db)
+        os.makedirs(db_subdir, exist_ok = True)
+        return os.path.join(db_subdir, self.big_db)
 
-        if os.path.isfile(db_output_fl):
-            fin_asset.asset_data(database = db_output_fl, asset_type = self.asset_type, asset_list = asset_l,
-                today = self.today, year = self.year, month = self.month, day = self.day)
+    def _price_storage(self, db_output_fl: str) -> _storage:
+        """Storage backend of the asset prices. The Parquet dataset of an asset type sits next to its database.
 
-        else:
-            fin_asset.asset_data(database = self.big_db, asset_type = self.asset_type, asset_list = asset_l,
-                    today = self.today)
+        Args:
+            * `db_output_fl` (str): Database path.
+
+        Returns:
+            `_storage`: The storage backend.
+        """
+
+        from lib.storage import get_storage
+        return get_storage(name = self.storage, db = db_output_fl, model_name = self.model,
+                        root = os.path.join(self.__db_subdir(), f'{self.asset_type}_parquet'))
+
+    def _fetch_assets(self, assets: list, db_output_fl: str) -> None:
+        """Download the missing days of many assets in parallel and store them.
 
-            # Move database output to Databases subdirectory.
-            db_output = os.path.join(self.cwd, self.big_db)
-            shutil.move(db_output, db_output_fl)
+        Args:
+            * `assets` (list): Asset names.
+            * `db_output_fl` (str): Database path.
+
+        Raises:
+            `FetchError`: When some assets could not be downloaded. The other assets are stored.
+        """
+
+        from lib.data import data
+        from lib.instrument import stage
+
+        fin_asset = data(start = self.date, model_name = self.model, incremental = not self.refresh,
+                        provider = self.provider, storage = self._price_storage(db_output_fl = db_output_fl),
+                        workers = self.fetch_workers, rate = self.rate_limit)
+        with stage('download') as download_stage:
+            try:
+                fin_asset.asset_data(database = db_output_fl, asset_type = self.asset_type, asset_list = assets,
+                        today = self.today, year = self.year, month = self.month, day = self.day)
+            except FetchError:
+                self.fetched.update(result.ticker for result in fin_asset.results if result.status == 'ok')
+                raise
+            finally:
+                download_stage.count(assets = len(assets), rows = sum(result.rows for result in fin_asset.results))
+        self.fetched.update(assets)
+
+    def _update_prices(self, assets: list, db_output_fl: str,
+                    fallback: str = 'The stored prices of the failed assets are used.') -> bool:
+        """Download the missing days of many assets and carry on when some downloads fail.
+
+        Args:
+            * `assets` (list): Asset names.
+            * `db_output_fl` (str): Database path.
+            * `fallback` (str, optional): What happens to the failed assets, printed after the errors. Defaults to
+            their stored prices being used.
+
+        Returns:
+            `boolean`: True when every asset is up to date.
+        """
 
-        asset_l_q = asset_l[0].replace("-", "_")
-        asset_l_q = asset_l_q + f'_{self.model}'
-        asset_df, asset_dates = SQLite_Query(database = db_output_fl, table = asset_l_q)
-        asset_x_train, asset_y_train, asset_scaler = preprocessing(asset_df, self.pred_days)
+        try:
+            self._fetch_assets(assets = assets, db_output_fl = db_output_fl)
+        except FetchError as e:
+            print(f'{e.errmessage}\n{fallback}\n')
+            return False
+        return True
+
+    def _asset_prices(self, tick: str, db_output_fl: str) -> pd.DataFrame:
+        """Fetch the missing days of an asset and query its prices with the pipeline precision.
+
+        Args:
+            * `tick` (str): Asset name e.g. BTC-USD.
+            * `db_output_fl` (str): Database path.
+
+        Returns:
+            `pd.DataFrame`: The PRICE_QUERY columns.
+        """
+
+        from lib.instrument import stage
+
+        storage = self._price_storage(db_output_fl = db_output_fl)
+        if tick not in self.fetched:
+            self._fetch_assets(assets = [tick], db_output_fl = db_output_fl)
+        with stage('query') as query_stage:
+            df = storage.read(ticker = tick, columns = list(PRICE_QUERY), dtypes = dict.fromkeys(PRICE_FLOATS, self.precision))
+            query_stage.count(rows = len(df), bytes = int(df.memory_usage(deep = True).sum()))
+        return df
+
+    def _asset_pipeline(self, tick: str, db_output_fl: str, track: bool = True) -> tuple[pd.DataFrame, float, str, str, pd.DataFrame]:
+        """Fetch, preprocess, train, predict and assess a single asset. Results are stored in the database.
+
+        Args:
+            * `tick` (str): Asset name e.g. BTC-USD.
+            * `db_output_fl` (str): Database path.
+            * `track` (bool, optional): Display the training progress animation. Defaults to True.
+
+        Returns:
+            `tuple[pd.DataFrame, float, str, str, pd.DataFrame]`: Assessed data queried from the database, next day
+            prediction, volatility, currency symbol of the asset and forecast of the closing days.
+        """
+
+        from lib.model_methods import preprocessing, split_index
+        from lib.fin_asset import financial_assets, prediction_assessment, forecast_frame
+        from lib.db_utils import new_run_id, record_run, record_forecast
+        from lib.inference import output_width
+        from lib.instrument import stage
+
+        asset_n, asset_curr = tick.split('-', 1)  # Asset name and currency.
+        asset_curr_symbol: str = ''.join([val for key, val in CURRENCIES.items() if asset_curr in key])
+
+        asset_df = self._asset_prices(tick = tick, db_output_fl = db_output_fl)
+        asset_dates = asset_df['Date'].to_list()
+        split_idx = split_index(data = asset_df, split = self.split, prediction_days = self.pred_days)
+        asset_train = asset_df.iloc[:split_idx] if split_idx else asset_df
+        with stage('preprocessing') as preprocessing_stage:
+            asset_x_train, asset_y_train, asset_scaler = preprocessing(asset_train, self.pred_days,
+                                                                    horizon = output_width(horizon = self.closing, mode = self.forecast))
+            preprocessing_stage.count(rows = len(asset_train), windows = len(asset_x_train))
         asset_class = financial_assets(pred_days = self.pred_days, asset_type = self.asset_type, plot = self.plt)
-        asset_real_pred, asset_next, asset_volatility = asset_class.predictor(model = self.model, x = asset_dates, x_train = asset_x_train, 
+        asset_real_pred, asset_next, asset_volatility, asset_forecast = asset_class.predictor(model = self.model, x = asset_dates, x_train = asset_x_train, 
                                                                             y_train = asset_y_train, asset_scaler = asset_scaler,
-                                                                            tick = asset_l[0], query_asset = asset_df,
+                                                                            tick = tick, query_asset = asset_df,
                                                                             asset_currency_symbol = asset_curr_symbol,
                                                                             drop = self.drop, optimizer = self.optimizer,
                                                                             loss = self.loss, epoch = self.epoch,
                                                                             batch = self.batch, dimensionality = self.dimensionality, 
-                                                                            closing = self.closing)
+                                                                            closing = self.closing, track = track,
+                                                                            registry = self.registry, retrain = self.retrain,
+                                                                            finetune = FINETUNE if FINETUNE['max_rows'] > 0 else None,
+                                                                            db = db_output_fl, split_idx = split_idx,
+                                                                            horizon_mode = self.forecast)
+
+        with stage('assessment') as assessment_stage:
+            run_id = new_run_id()
+            record_run(db = db_output_fl, run_id = run_id, asset = tick, model = self.model,
+                    next_day = float(asset_next), volatility = float(asset_volatility),
+                    asset_type = self.asset_type, currency = asset_curr_symbol)
+            all_data = prediction_assessment(df_all = asset_df, df_pred_real = asset_real_pred, db = db_output_fl,
+                                            asset = tick, model_name = self.model, run_id = run_id)
+            forecast = forecast_frame(last_date = asset_dates[-1], forecast = asset_forecast, asset_type = self.asset_type)
+            record_forecast(db = db_output_fl, run_id = run_id, df = forecast, mode = self.forecast)
+            assessment_stage.count(rows = len(asset_real_pred) + len(forecast))
+
+        return all_data, asset_next, asset_volatility, asset_curr_symbol, forecast
+
+    def analyze(self) -> bool | list[asset_run]:
+        """Run through all the analysis of the asset. Produces the dash dashboard on localhost.
+        When more than one asset is specified, the batch mode is used instead.
 
-        all_data = prediction_assessment(df_all = asset_df, df_pred_real = asset_real_pred, db = db_output_fl,
-                                        asset = asset_l[0], model_name = self.model)
+        Returns:
+            `boolean | list[asset_run]`: True when operation finishes successfully, the batch
+            summary in batch mode.
+        """
 
-        dashboard_data = all_data.drop(all_data.columns[[0, 1, 3, 4, 5, 6, 8]], axis = 1)
+        if len(self.assets) > 1:
+            return self.analyze_batch()
 
-        print('\033[?25h', end = "")    # Display terminal cursor again just before dash initiates.
+        from contextlib import nullcontext
+        from lib.instrument import stage
+
+        tracker = self._instrument()
+        try:
+            with tracker.activate() if tracker is not None else nullcontext(), stage('analyze', asset = self.asset):
+                db_output_fl = self._asset_db()
+                all_data, asset_next, asset_volatility, asset_curr_symbol, forecast = self._asset_pipeline(tick = self.asset,
+                                                                                                db_output_fl = db_output_fl)
+
+                dashboard_data = all_data.loc[:, ['Date', 'Adj_Close', 'Predicted_Values', 'Difference', 'Percent_Difference']]
+
+                # Import dashboard_launch and build the app.
+                with stage('dashboard'):
+                    from dashboard.app import dashboard_launch, dashboard_run
+                    from dashboard.plots.figure_cache import CACHE_DIR
+                    app = dashboard_launch(df = dashboard_data, fin_asset = self.asset,
+                                        asset_type = self.asset_type, nxt_day = asset_next,
+                                        volatility = asset_volatility, asset_currency = asset_curr_symbol,
+                                        port = self.port, model = self.model, forecast = forecast,
+                                        cache_dir = os.path.join(self.__db_subdir(), CACHE_DIR), serve = False)
+        finally:
+            self._report(tracker = tracker)
 
-        # Import dashboard_launch and launch app.
-        from dashboard.app import dashboard_launch
-        dashboard_launch(df = dashboard_data, fin_asset = self.asset,
-                        asset_type = self.asset_type, nxt_day = asset_next,
-                        volatility = asset_volatility, asset_currency = asset_curr_symbol,
-                        port = self.port, model = self.model)
+        print('\033[?25h', end = "")    # Display terminal cursor again just before dash initiates.
+        dashboard_run(app = app, port = self.port)
 
         return True
 
+    def _instrument(self, run_id: str | None = None) -> Any | None:
+        """Stage timers of a run, when the run is instrumented.
+
+        Args:
+            * `run_id` (str | None, optional): Run identifier. Defaults to None (a new one).
+
+        Returns:
+            `instrument | None`: The instrument, None when -instrument and -profile are not set.
+        """
+
+        if not self.instrumented:
+            return None
+
+        from lib.instrument import instrument
+        from lib.db_utils import new_run_id
+        return instrument(run_id = _defaults(var = run_id, default = new_run_id()), profile = self.profile,
+                        profiler = self.profiler, profile_dir = self.__metrics_subdir())
+
+    def _report(self, tracker: Any | None) -> None:
+        """Print the stage timings of an instrumented run and export them as json and as a Prometheus textfile.
+        Runs that raised are exported too, with the stage that failed.
+
+        Args:
+            * `tracker` (instrument | None): Instrument of the run, None for runs that are not instrumented.
+        """
+
+        if tracker is None:
+            return
+        json_fl = tracker.to_json(path = os.path.join(self.__metrics_subdir(), f'{tracker.run_id}.json'))
+        prom_fl = tracker.to_prometheus(path = self.prom_file)
+        print(f'\n{tracker.summary()}\n\nRun {tracker.run_id} metrics saved to {json_fl} and {prom_fl}.\n')
+
+    def sweep(self, space: str, strategy: str | None = None, trials: int | None = None,
+            threads: int | None = None) -> pd.DataFrame:
+        """Hyperparameter sweep of the model of the first asset, on its training rows. The -units, -dropout,
+        -optimizer, -loss, -epoch and -batch values are used for the hyperparameters missing from the space.
+
+        Args:
+            * `space` (str): Search space .yml file, a list of values per hyperparameter.
+            * `strategy` (str | None, optional): grid, random or halving. Defaults to None (grid).
+            * `trials` (int | None, optional): Number of trials of the random and halving strategies. Defaults to None.
+            * `threads` (int | None, optional): CPU threads of each trial. Defaults to None (the CPUs shared by the workers).
+
+        Returns:
+            `pd.DataFrame`: The recorded trials, the best first.
+        """
+
+        from lib.sweep import hyper_sweep, load_space, sweep_summary
+        from lib.pool import thread_budget
+        from lib.model_methods import split_index
+        from lib.inference import output_width
+
+        db_output_fl = self._asset_db()
+        asset_df = self._asset_prices(tick = self.asset, db_output_fl = db_output_fl)
+        split_idx = split_index(data = asset_df, split = self.split, prediction_days = self.pred_days)
+        asset_train = asset_df.iloc[:split_idx] if split_idx else asset_df
+
+        threads = thread_budget(workers = self.workers, threads = threads)
+        defaults = {'units': int(self.dimensionality), 'dropout': float(self.drop), 'optimizer': self.optimizer,
+                    'loss': self.loss, 'epoch': int(self.epoch), 'batch': int(self.batch)}
+        sweeper = hyper_sweep(db = db_output_fl, asset = self.asset, prices = asset_train.loc[:, ['Close']],
+                            pred_days = self.pred_days, defaults = defaults, workers = self.workers, threads = threads,
+                            horizon = output_width(horizon = self.closing, mode = self.forecast))
+        results = sweeper.run(strategy = _defaults(var = strategy, default = 'grid'), space = load_space(f = space),
+                            n = None if trials is None else int(trials))
+        print('\n' + sweep_summary(df = results))
+        print('\033[?25h', end = "")    # Display terminal cursor again.
+        return results
+
+    def backtest(self, folds: int | None = None, scheme: str | None = None, train_rows: int | None = None,
+                retrain_every: int | None = None, threads: int | None = None) -> pd.DataFrame:
+        """Walk-forward backtest of the model on all the assets. Each fold trains on the rows before a day
+        and forecasts the next -closing days. The folds run in -workers processes and are cached, so
+        only the folds of the new days are computed on later runs.
+
+        Args:
+            * `folds` (int | None, optional): Latest folds evaluated. Defaults to None (FOLDS).
+            * `scheme` (str | None, optional): expanding or rolling. Defaults to None (expanding).
+            * `train_rows` (int | None, optional): Training rows of the first fold, and of every rolling fold.
+            Defaults to None (TRAIN_ROWS).
+            * `retrain_every` (int | None, optional): Folds between two models trained from scratch. Defaults to None (1).
+            * `threads` (int | None, optional): CPU threads of each worker. Defaults to None (the CPUs shared by the workers).
+
+        Returns:
+            `pd.DataFrame`: Error and directional accuracy of each asset and forecast day.
+        """
+
+        from lib.backtest import walk_forward, backtest_summary, FOLDS, TRAIN_ROWS
+        from lib.pool import thread_budget
+
+        db_output_fl = self._asset_db()
+        self._update_prices(assets = self.assets, db_output_fl = db_output_fl)
+        storage = self._price_storage(db_output_fl = db_output_fl)
+        stored = set(storage.assets())
+        prices = {tick: storage.read(ticker = tick, columns = ['Date', 'Close'], dtypes = {'Close': self.precision})
+                for tick in self.assets if tick in stored}
+
+        threads = thread_budget(workers = self.workers, threads = threads)
+        params = {'units': int(self.dimensionality), 'dropout': float(self.drop), 'optimizer': self.optimizer,
+                'loss': self.loss, 'epoch': int(self.epoch), 'batch': int(self.batch)}
+        tester = walk_forward(db = db_output_fl, model_name = self.model, params = params, pred_days = self.pred_days,
+                            horizon = self.closing, workers = self.workers, threads = threads, mode = self.forecast,
+                            scheme = _defaults(var = scheme, default = 'expanding'),
+                            train_rows = int(_defaults(var = train_rows, default = TRAIN_ROWS)),
+                            folds = int(_defaults(var = folds, default = FOLDS)),
+                            retrain_every = int(_defaults(var = retrain_every, default = 1)),
+                            finetune = {'replay': FINETUNE['replay'], 'epochs': FINETUNE['epochs']})
+        results = tester.run(prices = prices)
+        print('\n' + backtest_summary(df = results))
+        print('\033[?25h', end = "")    # Display terminal cursor again.
+        return results
+
+    def risk(self, benchmark: str | None = None) -> dict[int, int]:
+        """Update the rolling volatility, max drawdown, Sharpe and Sortino ratios, beta and value at risk
+        of all the assets, in one vectorized pass per window. Only the days after the stored metrics are
+        computed and stored, unless -refresh is set.
+
+        Args:
+            * `benchmark` (str | None, optional): Asset the betas are measured against. Defaults to None (the
+            equal weighted assets).
+
+        Returns:
+            `dict[int, int]`: Rows written by window.
+        """
+
+        from lib.risk import risk_engine, risk_summary
+
+        db_output_fl = self._asset_db()
+        assets = list(self.assets) if benchmark is None or benchmark in self.assets else [*self.assets, benchmark]
+        self._update_prices(assets = assets, db_output_fl = db_output_fl)
+
+        storage = self._price_storage(db_output_fl = db_output_fl)
+        stored = set(storage.assets())
+        if benchmark is not None and benchmark not in stored:
+            raise ValueError(f'Benchmark {benchmark} has no stored prices.')
+        assets = [tick for tick in self.assets if tick in stored]
+
+        written = risk_engine(db = db_output_fl, storage = storage, benchmark = benchmark).update(assets = assets, full = self.refresh)
+        print(f'{sum(written.values())} risk metric rows saved to {db_output_fl}.\n')
+        print(risk_summary(db = db_output_fl, assets = assets))
+        print('\033[?25h', end = "")    # Display terminal cursor again.
+        return written
+
+    def stream(self, source: str, max_bars: int | None = None, serve: bool = True) -> dict:
+        """Live predictions of the assets from a bar source. The missing days are downloaded first, then
+        every new bar is stored, slid into the window of its asset and forecast with the cached model,
+        and the forecast is stored under a streaming run. Runs until Ctrl+C.
+
+        Args:
+            * `source` (str): Directory of csv bar drops, or local TCP port of newline delimited json bars.
+            * `max_bars` (int | None, optional): Stop after this many bars. Defaults to None (Ctrl+C).
+            * `serve` (bool, optional): Serve the dashboard, refreshed on every bar, meanwhile. Defaults to True.
+
+        Returns:
+            `dict`: Bars processed and skipped and the mean and max latency in ms from arrival to stored forecast.
+        """
+
+        from threading import Thread
+        from lib.stream import stream_engine, directory_source, socket_source
+        from lib.inference import output_width
+
+        db_output_fl = self._asset_db()
+        self._update_prices(assets = self.assets, db_output_fl = db_output_fl)
+
+        params = {'model': self.model, 'pred_days': self.pred_days, 'units': self.dimensionality, 'dropout': self.drop,
+                'optimizer': self.optimizer, 'loss': self.loss, 'epoch': self.epoch, 'batch': self.batch,
+                'closing': output_width(horizon = self.closing, mode = self.forecast)}
+        engine = stream_engine(db = db_output_fl, storage = self._price_storage(db_output_fl = db_output_fl),
+                            registry = self.registry, params = params, pred_days = self.pred_days, horizon = self.closing,
+                            asset_type = self.asset_type, mode = self.forecast, precision = self.precision)
+        for tick in self.assets:
+            engine.add(asset = tick, currency = ''.join([val for key, val in CURRENCIES.items() if tick.split('-', 1)[1] in key]))
+        if not engine.live:
+            raise ValueError('None of the assets has a cached model to stream with.')
+
+        bars = socket_source(port = int(source)) if str(source).isdigit() else directory_source(root = source)
+        where = f'port {bars.port}' if str(source).isdigit() else source
+        if serve:
+            from dashboard.server import dashboard_serve
+            Thread(target = dashboard_serve, kwargs = {'root': self.__db_subdir(), 'port': self.port}, daemon = True).start()
+        print(f'Streaming {len(engine.live)} assets from {where}, Ctrl+C to stop...\n')
+        print('\033[?25h', end = "")    # Display terminal cursor again.
+
+        stats = engine.run(source = bars, max_bars = None if max_bars is None else int(max_bars))
+        latency = '' if stats['bars'] == 0 else f', {stats["mean_ms"]:.1f} ms mean and {stats["max_ms"]:.1f} ms max latency'
+        print(f'\n{stats["bars"]} bars streamed, {stats["skipped"]} skipped{latency}.')
+        return stats
+
+    def analyze_batch(self) -> list[asset_run]:
+        """Analyse all the assets over a pool of worker processes. Each asset goes through
+        the full pipeline and its results are stored in the database. No dashboard is launched.
+
+        Returns:
+            `list[asset_run]`: Timing and status of each asset, in the input order.
+        """
+
+        from contextlib import nullcontext
+        from lib.instrument import stage
+        from lib.pool import process_pool
+
+        db_output_fl = self._asset_db()
+        workers = max(1, min(self.workers, len(self.assets)))
+        print(f'Analysing {len(self.assets)} assets with {workers} workers...\n')
+
+        batch_start = perf_counter()
+        runs = {}
+        tracker = self._instrument()
+        try:
+            with tracker.activate() if tracker is not None else nullcontext(), stage('batch'):
+                # All the downloads at once, the workers only read the stored prices.
+                self._update_prices(assets = self.assets, db_output_fl = db_output_fl,
+                                    fallback = 'Failed assets are downloaded again by their workers.')
+
+                run_id = None if tracker is None else tracker.run_id
+                with process_pool(workers = workers) as executor:
+                    futures = {executor.submit(_batch_worker, self, tick, db_output_fl, run_id): tick for tick in self.assets}
+                    for future in as_completed(futures):
+                        run: asset_run = future.result()
+                        runs[run.asset] = run
+                        if tracker is not None:
+                            tracker.merge(records = run.stages, asset = run.asset)
+                        print(f'[{len(runs)}/{len(self.assets)}] {run.asset}: {run.status} ({run.elapsed:.1f}s)')
+
+            runs = [runs[tick] for tick in self.assets]
+            print('\n' + batch_summary(runs = runs, elapsed = perf_counter() - batch_start))
+        finally:
+            self._report(tracker = tracker)
+        print('\033[?25h', end = "")    # Display terminal cursor again.
+        return runs
+
+@dataclass
+class asset_run:
+    """Dataclass holding the outcome of a single asset in a batch run.
+    """
+
+    asset: str
+    status: str
+    elapsed: float
+    next_day: float | None = None
+    volatility: str | None = None
+    error: str | None = None
+    stages: list = field(default_factory = list)
+
+def _batch_worker(launcher: Launcher, tick: str, db_output_fl: str, run_id: str | None = None) -> asset_run:
+    """Batch mode worker. Runs the full pipeline for one asset and never raises, failures
+    are reported in the returned asset_run.
+
+    Args:
+        * `launcher` (Launcher): Launcher instance holding the run parameters.
+        * `tick` (str): Asset name.
+        * `db_output_fl` (str): Database path.
+        * `run_id` (str | None, optional): Run identifier of the instrumented batch. Defaults to None.
+
+    Returns:
+        `asset_run`: Status and timing of the asset, with its stage timers when instrumented.
+    """
+
+    from contextlib import nullcontext
+    from lib.instrument import stage
+
+    start = perf_counter()
+    tracker = None if run_id is None else launcher._instrument(run_id = run_id)
+    try:
+        with tracker.activate() if tracker is not None else nullcontext(), stage('pipeline'):
+            _, next_day, volatility, _, _ = launcher._asset_pipeline(tick = tick, db_output_fl = db_output_fl, track = False)
+    except Exception as e:
+        return asset_run(asset = tick, status = 'failed', elapsed = perf_counter() - start,
+                        error = f'{type(e).__name__}: {e}', stages = [] if tracker is None else tracker.records)
+
+    return asset_run(asset = tick, status = 'ok', elapsed = perf_counter() - start,
+                    next_day = float(next_day), volatility = volatility,
+                    stages = [] if tracker is None else tracker.records)
+
+def batch_summary(runs: list[asset_run], elapsed: float) -> str:
+    """Format the batch run results as a table.
+
+    Args:
+        * `runs` (list[asset_run]): Results of each asset.
+        * `elapsed` (float): Wall time of the whole batch in seconds.
+
+    Returns:
+        `str`: The summary table.
+    """
+
+    lines = [f'{"Asset":<14}{"Status":<9}{"Time (s)":>10}{"Next day":>16}{"Volatility":>12}']
+    for run in runs:
+        next_day = '' if run.next_day is None else f'{run.next_day:.4f}'
+        volatility = '' if run.volatility is None else f'{run.volatility}%'
+        lines.append(f'{run.asset:<14}{run.status:<9}{run.elapsed:>10.1f}{next_day:>16}{volatility:>12}')
+        if run.error:
+            lines.append(f'    {run.error}')
+
+    failed = sum(run.status != 'ok' for run in runs)
+    lines.append(f'\n{len(runs) - failed}/{len(runs)} assets analysed in {elapsed:.1f}s.')
+    return '\n'.join(lines)
+
+def _split_parser(split: float | str | None) -> float | str | None:
+    """Parse the train/test split: a training fraction or the first test date.
+
+    Args:
+        * `split` (float | str | None): Input split.
+
+    Raises:
+        * `SplitError`: If the fraction is not between 0 and 1 or the split is neither a fraction nor a YYYY-MM-DD date.
+
+    Returns:
+        `float | str | None`: Training fraction, first test date or None.
+    """
+
+    if split in [None, 'None']:
+        return None
+    try:
+        fraction = float(split)
+    except ValueError:
+        try:
+            return dt.datetime.strptime(split, '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            raise SplitError(f'Split: {split} is neither a training fraction nor a YYYY-MM-DD date.')
+
+    if not 0 < fraction < 1:
+        raise SplitError(f'Split: {split} must be a training fraction between 0 and 1.')
+    return fraction
+
 def _dt_format(date: str | None):
     """Checks for date format with regex. Format is YYYY-MM-DD.
 
@@ -320,7 +926,13 @@ def main():
     arguments = vars(args)
     test_profile: bool = bool_parser(arguments.get('test'))
 
-    if test_profile:     # Launch default profile.
+    if bool_parser(arguments.get('serve')):    # Browse the stored results, no analysis.
+        print('\n')
+        print(terminal_str_formatter(_str_ = TITLE))
+        print('\n')
+        Launcher.serve(port = arguments.get('p'))
+
+    elif test_profile:     # Launch default profile.
 
         # Get terminal width, center and bold the title.
         print('\n')
@@ -336,9 +948,15 @@ def main():
 
     else:
         ast: str = arguments.get('ast')
-        ast_n: str = [k for k, v in locals().items() if v == ast][0] # gets var name.
+        ast_n: str = 'ast'  # Argument name.
+        watchlist: str | None = arguments.get('watchlist')
+        if watchlist is not None:
+            watchlist_assets = watchlist_parser(f = watchlist)
+            if ast is not None:
+                watchlist_assets = ast.replace(',', ' ').split() + watchlist_assets
+            ast = ' '.join(watchlist_assets)
         tp: str = arguments.get('tp')
-        tp_n: str = [k for k, v in locals().items() if v == tp][0]
+        tp_n: str = 'tp'
         pd: str = arguments.get('pd')
         db: str | None = arguments.get('db')
         tdy: bool | None = arguments.get('tdy')
@@ -356,6 +974,23 @@ def main():
         get_batch: int | None = arguments.get('batch')
         get_dimensionality: int | None = arguments.get('units')
         get_closing: int | None = arguments.get('closing')
+        get_forecast: str | None = arguments.get('forecast')
+        get_precision: str | None = arguments.get('precision')
+        get_sweep: str | None = arguments.get('sweep')
+        get_workers: int | None = arguments.get('workers')
+        refresh: bool = bool_parser(arguments.get('refresh'))
+        retrain: bool = bool_parser(arguments.get('retrain'))
+        get_provider_name: str | None = arguments.get('provider')
+        get_provider_dir: str | None = arguments.get('provider_dir')
+        get_provider_cache: str | None = arguments.get('provider_cache')
+        get_split: str | None = arguments.get('split')
+        get_storage_name: str | None = arguments.get('storage')
+        get_fetch_workers: int | None = arguments.get('fetch_workers')
+        get_rate_limit: float | None = arguments.get('rate_limit')
+        instrumented: bool = bool_parser(arguments.get('instrument'))
+        get_profile: str | None = arguments.get('profile')
+        get_profiler: str | None = arguments.get('profiler')
+        get_prom_file: str | None = arguments.get('prom_file')
 
         if tdy == None or tdy == 'None':
             tdy = True
@@ -419,11 +1054,30 @@ def main():
         print(terminal_str_formatter(_str_ = TITLE))
         print('\n')
 
-        Launcher(asset_type = tp, asset = ast, big_db = db, date = d,
+        launcher = Launcher(asset_type = tp, asset = ast, big_db = db, date = d,
                     today = tdy, year = end_year, month = end_month, day = end_day,
                     pred_days = pd, port = p, plt = plt, model = get_model, drop = get_drop, optimizer = get_optimizer,
                     loss = get_loss, epoch = get_epoch, batch = get_batch, dimensionality = get_dimensionality,
-                    closing = get_closing).analyze()
+                    closing = get_closing, workers = get_workers, refresh = refresh,
+                    retrain = retrain, provider = get_provider_name, provider_dir = get_provider_dir,
+                    provider_cache = get_provider_cache, split = get_split,
+                    storage = get_storage_name, forecast = get_forecast,
+                    precision = get_precision, fetch_workers = get_fetch_workers,
+                    rate_limit = get_rate_limit, instrument = instrumented, profile = get_profile,
+                    profiler = get_profiler, prom_file = get_prom_file)
+        if get_sweep is not None:
+            launcher.sweep(space = get_sweep, strategy = arguments.get('sweep_strategy'), trials = arguments.get('trials'),
+                        threads = arguments.get('trial_threads'))
+        elif bool_parser(arguments.get('backtest')):
+            launcher.backtest(folds = arguments.get('folds'), scheme = arguments.get('fold_scheme'),
+                            train_rows = arguments.get('train_rows'), retrain_every = arguments.get('retrain_every'),
+                            threads = arguments.get('trial_threads'))
+        elif bool_parser(arguments.get('risk')):
+            launcher.risk(benchmark = arguments.get('benchmark'))
+        elif arguments.get('stream') is not None:
+            launcher.stream(source = arguments.get('stream'))
+        else:
+            launcher.analyze()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+"""Memory report of the numeric path of the pipeline.
+
+Runs the query, preprocessing, model input and assessment stages of one asset in a fresh
+process per precision and prints the peak RSS after each stage and the peak allocations
+of each stage. legacy is the previous path: float64 prices, model inputs materialised as a
+contiguous window array and the assessment built through Python lists. No model is trained,
+the model inputs are built the way Keras receives them and the prediction is the last price
+of each window.
+
+Run from the repository root:
+    python benchmarks/bench_memory.py
+"""
+
+import os, sys, json, argparse, resource, subprocess, tempfile, tracemalloc
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from lib.db_utils import DATE_FORMAT
+from lib.df_utils import df_analyses
+from lib.fin_asset import financial_assets
+from lib.model_methods import preprocessing, test_preprocessing
+from lib.storage import sqlite_storage
+from lib.windows import _window_rows
+
+MODES = ('legacy', 'float64', 'float32')
+TICKER = 'BENCH-USD'
+MODEL = 'RNN'
+BATCH = 32
+
+def legacy_assessment(real: np.ndarray, pred: np.ndarray, d: list) -> pd.DataFrame:
+    """Assessment as it was done before, through Python lists.
+
+    Args:
+        * `real` (np.ndarray): Actual prices.
+        * `pred` (np.ndarray): Predicted prices of shape (rows, 1).
+        * `d` (list): Dates.
+
+    Returns:
+        `pd.DataFrame`: Dates, Real_Values, Predicted_Values, Difference and Percent_Difference columns.
+    """
+
+    real = np.ndarray.tolist(real)
+    pred = [val for vals in np.ndarray.tolist(pred) for val in vals]
+    df = pd.DataFrame({'Dates': d, 'Real_Values': real, 'Predicted_Values': pred})
+    actual, predicted = df.iloc[:, 1].to_numpy(), df.iloc[:, 2].to_numpy()
+    df['Difference'] = np.subtract(predicted, actual).tolist()
+    df['Percent_Difference'] = (np.subtract(predicted, actual) * 100 / actual).tolist()
+    return df
+
+def model_inputs(x: np.ndarray, mode: str) -> np.ndarray:
+    """Predictions from the test windows, fed the way the model receives them.
+
+    Args:
+        * `x` (np.ndarray): Test windows, strided views.
+        * `mode` (str): One of MODES.
+
+    Returns:
+        `np.ndarray`: Last value of each window, shape (windows, 1).
+    """
+
+    if mode == 'legacy':    # The whole window array is copied before predict.
+        return np.ascontiguousarray(x)[:, -1, :1]
+
+    rows, step = _window_rows(x = x)    # window_dataset(): one float32 copy of the series, windows gathered per batch.
+    series = np.asarray(rows, dtype = np.float32)
+    out = np.empty((len(x), 1), dtype = x.dtype)
+    offsets = np.arange(x.shape[1])
+    for start in range(0, len(x), BATCH):
+        idx = np.arange(start, min(start + BATCH, len(x)))
+        out[idx] = series[idx[:, None] * step + offsets][:, -1, :1]
+    return out
+
+def run_stages(db: str, mode: str, window: int) -> list[dict]:
+    """Run the stages of one mode and measure them.
+
+    Args:
+        * `db` (str): Database with the prices.
+        * `mode` (str): One of MODES.
+        * `window` (int): Prediction days.
+
+    Returns:
+        `list[dict]`: Stage name, peak RSS in MB after the stage and peak allocations of the stage in MB.
+    """
+
+    dtype = 'float64' if mode == 'legacy' else mode
+    report = []
+    tracemalloc.start()
+
+    def _measure(stage: str) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        report.append({'stage': stage, 'rss_mb': peak_rss_mb(), 'alloc_mb': peak / 1e6})
+        tracemalloc.reset_peak()
+
+    _measure(stage = 'start')
+    df = sqlite_storage(db = db, model_name = MODEL).read(ticker = TICKER, columns = ['Date', 'Close', 'Adj_Close'],
+                                                        dtypes = {'Close': dtype, 'Adj_Close': dtype})
+    _measure(stage = 'query')
+
+    x_train, y_train, scaler = preprocessing(data = df, prediction_days = window)
+    train_input = np.ascontiguousarray(x_train) if mode == 'legacy' else np.asarray(_window_rows(x = x_train)[0], dtype = np.float32)
+    _measure(stage = 'training input')
+    del train_input, x_train, y_train
+
+    closing = df['Close'].to_numpy()
+    scaled = scaler.transform(closing.reshape(-1, 1))
+    x_test = test_preprocessing(prediction_days = window, inputs = scaled)
+    pred = scaler.inverse_transform(model_inputs(x = x_test, mode = mode))
+    _measure(stage = 'prediction')
+
+    actual, dates = closing[window:], df['Date'].iloc[window:].to_list()
+    if mode == 'legacy':
+        assessed = legacy_assessment(real = actual, pred = pred, d = dates)
+    else:
+        assessed = df_analyses(df = financial_assets.df_act_pred(real = actual, pred = pred, d = dates)).assessment_df_parser()
+    _measure(stage = 'assessment')
+
+    tracemalloc.stop()
+    report.append({'stage': 'dtype', 'dtype': str(assessed['Difference'].dtype)})
+    return report
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process. VmHWM starts over on exec, ru_maxrss keeps the peak of the parent.
+
+    Returns:
+        `float`: Peak RSS in MB.
+    """
+
+    try:
+        with open('/proc/self/status') as fl_stream:
+            for line in fl_stream:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_prices(db: str, rows: int) -> None:
+    """Store a seeded random walk of minute bars. Driftless, so long series stay in the float32 range.
+
+    Args:
+        * `db` (str): Database path.
+        * `rows` (int): Number of minutes.
+    """
+
+    rng = np.random.default_rng(0)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(loc = 0.0, scale = 0.001, size = rows)))
+    df = pd.DataFrame({'Date': pd.date_range(start = '2000-01-01', periods = rows, freq = 'min').strftime(DATE_FORMAT),
+                    'Open': close, 'High': close, 'Low': close, 'Close': close, 'Adj_Close': close,
+                    'Volume': rng.integers(1e5, 1e7, size = rows)})
+    sqlite_storage(db = db, model_name = MODEL).replace(ticker = TICKER, df = df)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Pipeline memory report.')
+    parser.add_argument("-rows", type = int, default = 1_000_000, help = "Length of the price series. Defaults to 1000000.")
+    parser.add_argument("-pd", type = int, default = 60, help = "Prediction days. Defaults to 60.")
+    parser.add_argument("-child", choices = MODES, help = argparse.SUPPRESS)
+    parser.add_argument("-db", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:     # One mode per process, so peak RSS is not shared between modes.
+        print(json.dumps(run_stages(db = args.db, mode = args.child, window = args.pd)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.db')
+        write_prices(db = db, rows = args.rows)
+        print(f'{args.rows} rows, {args.pd} prediction days')
+        for mode in MODES:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '-child', mode, '-db', db, '-pd', str(args.pd)],
+                                capture_output = True, text = True, check = True, cwd = ROOT)
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f'\n{mode} (assessment {report[-1]["dtype"]})')
+            print(f'{"stage":<18}{"peak RSS (MB)":>15}{"stage alloc (MB)":>18}')
+            for stage in report[:-1]:
+                print(f'{stage["stage"]:<18}{stage["rss_mb"]:>15.1f}{stage["alloc_mb"]:>18.1f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+"""Benchmark of the CLI cold startup.
+
+Times asset_analysis.py -h as the scheduler runs it, then once more under python -X importtime.
+Fails (exit code 1) when the wall-clock startup or the import time goes over its budget, or when
+one of the heavy data, ML, plotting or dashboard packages is imported before the arguments are parsed.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py
+"""
+
+import os, sys, argparse, subprocess
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('tensorflow', 'keras', 'sklearn', 'matplotlib', 'seaborn', 'dash', 'plotly',
+                'pandas', 'numpy', 'yfinance', 'pyarrow')
+
+def import_times(stderr: str) -> dict[str, tuple[int, int, int]]:
+    """Parse the -X importtime output.
+
+    Args:
+        * `stderr` (str): Standard error of the process.
+
+    Returns:
+        `dict[str, tuple[int, int, int]]`: Self time (us), cumulative time (us) and nesting level of each module.
+    """
+
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip())) // 2
+        out[name.strip()] = (int(self_us), int(cumulative_us), level)
+    return out
+
+def run_once(args: list, importtime: bool = False) -> tuple[float, dict]:
+    """Run the CLI once.
+
+    Args:
+        * `args` (list): CLI arguments.
+        * `importtime` (bool, optional): Run under -X importtime, which slows the imports down. Defaults to False.
+
+    Returns:
+        `tuple[float, dict]`: Wall time in seconds and the import times, empty without importtime.
+    """
+
+    flags = ['-X', 'importtime'] if importtime else []
+    start = perf_counter()
+    proc = subprocess.run([sys.executable, *flags, 'asset_analysis.py', *args], cwd = ROOT,
+                        capture_output = True, text = True, env = dict(os.environ, PYTHONDONTWRITEBYTECODE = '1'))
+    return perf_counter() - start, import_times(stderr = proc.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'CLI cold startup benchmark.')
+    parser.add_argument("-budget_ms", type = float, default = 250.0, help = "Wall-clock startup budget in milliseconds. Defaults to 250.")
+    parser.add_argument("-import_budget_ms", type = float, default = 250.0, help = "Import time budget in milliseconds. Defaults to 250.")
+    parser.add_argument("-repeat", type = int, default = 5, help = "Runs, the median wall time and the fastest imports are checked.")
+    parser.add_argument("-top", type = int, default = 10, help = "Slowest top level imports to print.")
+    args = parser.parse_args()
+
+    walls = sorted(run_once(args = ['-h'])[0] for _ in range(args.repeat))
+    wall_ms = walls[len(walls) // 2] * 1000
+    runs = [run_once(args = ['-h'], importtime = True)[1] for _ in range(args.repeat)]
+    times = min(runs, key = lambda run: sum(t[1] for t in run.values() if t[2] == 0))
+    total_ms = sum(cumulative for _, cumulative, level in times.values() if level == 0) / 1000
+    heavy = sorted({name.split('.')[0] for name in times if name.split('.')[0] in HEAVY_MODULES})
+
+    print(f'asset_analysis.py -h: {wall_ms:.0f} ms wall (budget {args.budget_ms:.0f} ms), '
+        f'{total_ms:.0f} ms of imports (budget {args.import_budget_ms:.0f} ms)')
+    print(f'\n{"module":<40}{"cumulative (ms)":>16}')
+    top = sorted(((name, t[1]) for name, t in times.items() if t[2] == 0), key = lambda item: item[1], reverse = True)
+    for name, cumulative in top[:args.top]:
+        print(f'{name:<40}{cumulative / 1000:>16.1f}')
+
+    failed = False
+    if heavy:
+        print(f'\nFAIL: heavy packages imported at startup: {", ".join(heavy)}')
+        failed = True
+    if wall_ms > args.budget_ms:
+        print(f'\nFAIL: startup takes {wall_ms:.0f} ms of wall time, over the {args.budget_ms:.0f} ms budget')
+        failed = True
+    if total_ms > args.import_budget_ms:
+        print(f'\nFAIL: startup imports take {total_ms:.0f} ms, over the {args.import_budget_ms:.0f} ms budget')
+        failed = True
+    if not failed:
+        print('\nOK')
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
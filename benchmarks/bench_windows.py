@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+"""Benchmark of the training window construction.
+
+Compares the previous list based loop of preprocessing() with the strided view engine
+of lib.windows, for a 10 year daily series and a minute level series.
+
+Run from the repository root:
+    python benchmarks/bench_windows.py
+"""
+
+import os, sys, argparse
+from timeit import repeat
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.windows import window_targets
+
+def loop_windows(data: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """Window construction as it was done before, a Python loop and two copies.
+
+    Args:
+        * `data` (np.ndarray): Scaled data of shape (time steps, 1).
+        * `window` (int): Number of time steps in each window.
+
+    Returns:
+        `tuple[np.ndarray, np.ndarray]`: Windows and targets.
+    """
+
+    x_train = []
+    y_train = []
+    for i in range(window, len(data)):
+        x_train.append(data[i - window:i, 0])
+        y_train.append(data[i, 0])
+
+    x_train, y_train = np.array(x_train), np.array(y_train)
+    x_train = np.reshape(x_train, (x_train.shape[0], x_train.shape[1], 1))
+    return x_train, y_train
+
+def best_of(func, number: int) -> float:
+    """Best wall time of a function in seconds.
+
+    Args:
+        * `func` (callable): Function without arguments.
+        * `number` (int): Number of repeats.
+
+    Returns:
+        `float`: Best time in seconds.
+    """
+
+    return min(repeat(func, number = 1, repeat = number))
+
+def bench(name: str, rows: int, windows: list, number: int) -> None:
+    """Run and print the benchmark of one series.
+
+    Args:
+        * `name` (str): Series description.
+        * `rows` (int): Length of the series.
+        * `windows` (list): Window lengths to benchmark.
+        * `number` (int): Number of repeats of each measurement.
+    """
+
+    data = np.random.default_rng(0).random((rows, 1))
+    print(f'\n{name}: {rows} rows')
+    print(f'{"window":>8}{"loop (s)":>12}{"view (s)":>12}{"view+copy (s)":>15}{"speedup":>10}{"loop MB":>10}')
+    for window in windows:
+        if window >= rows:
+            continue
+
+        x_loop, y_loop = loop_windows(data, window)
+        x_view, y_view = window_targets(data, window)
+        assert np.array_equal(x_loop, x_view) and np.array_equal(y_loop, y_view)
+        loop_mb = (x_loop.nbytes + y_loop.nbytes) / 1e6
+        del x_loop, y_loop
+
+        t_loop = best_of(lambda: loop_windows(data, window), number)
+        t_view = best_of(lambda: window_targets(data, window), number)
+        t_copy = best_of(lambda: np.ascontiguousarray(window_targets(data, window)[0]), number)   # What Keras pays on fit.
+        print(f'{window:>8}{t_loop:>12.4f}{t_view:>12.6f}{t_copy:>15.4f}{t_loop / t_view:>9.0f}x{loop_mb:>10.1f}')
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Sliding window construction benchmark.')
+    parser.add_argument("-daily_rows", type = int, default = 3650, help = "Length of the daily series. Defaults to 10 years of daily bars.")
+    parser.add_argument("-minute_rows", type = int, default = 60 * 390, help = "Length of the minute series. Defaults to 60 trading days of minute bars.")
+    parser.add_argument("-windows", type = int, nargs = '+', default = [60, 120, 250, 500], help = "Window lengths.")
+    parser.add_argument("-repeat", type = int, default = 3, help = "Repeats of each measurement, the best one is reported.")
+    args = parser.parse_args()
+
+    bench(name = '10 year daily series', rows = args.daily_rows, windows = args.windows, number = args.repeat)
+    bench(name = 'Minute level series', rows = args.minute_rows, windows = args.windows, number = args.repeat)
+
+if __name__ == "__main__":
+    main()
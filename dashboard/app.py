@@ -4,10 +4,14 @@ from typing import Any, Final
 from lib.fin_asset import prediction_comparison
 import dash
 from dash import dcc, html
+from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import webbrowser
 from threading import Timer
 from dashboard.plots.lines import line_plotter
+from dashboard.plots.downsample import relayout_range, MAX_POINTS
+from dashboard.plots.figure_cache import figure_cache
 
 ##http://localhost:8050
 
@@ -59,24 +63,107 @@ def __compare_prices(df: pd.DataFrame, value_pre: str, next_day_price: str):
 
 y_dict = {'Adj_Close': 'Actual_Values',
         'Predicted_Values': 'Predicted_Values'}
+forecast_y_dict = dict(y_dict, Forecast = 'Forecast')
 
-def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day: int | float,
-                    volatility: str, currency: str, model_name: str) -> dash.Dash:
+EXTERNAL_STYLESHEETS: Final[list] = [
+    {
+        "href": "https://fonts.googleapis.com/css2?"
+                "family=Lato:wght@400;700&display=swap",
+        "rel": "stylesheet",
+    },
+]
 
-    """Create a one graph dashboard using dash.
+GRAPH_CONFIG: Final[dict] = {'displayModeBar': True,
+                            'scrollZoom': True,
+                            'modeBarButtonsToAdd':['drawline',
+                                'drawopenpath',
+                                'drawclosedpath',
+                                'drawcircle',
+                                'drawrect',
+                                'eraseshape']
+                            }
+
+def forecast_rows(df: pd.DataFrame, forecast: pd.DataFrame | None) -> pd.DataFrame:
+    """Append the forecast days to the dashboard data, in a Forecast column that starts from the last actual price.
+
+    Args:
+        * `df` (pd.DataFrame): DataFrame with the dashboard data.
+        * `forecast` (pd.DataFrame | None): Date and Forecast columns.
+
+    Returns:
+        `pd.DataFrame`: The dashboard data, unchanged without a forecast.
+    """
+
+    if forecast is None or forecast.empty:
+        return df
+    last = df.iloc[[-1]].loc[:, ['Date', 'Adj_Close']].rename(columns = {'Adj_Close': 'Forecast'})
+    return pd.concat([df, last, forecast.loc[:, ['Date', 'Forecast']]], ignore_index = True)
+
+def price_figure(df: pd.DataFrame, asset: str, asset_type: str, x_range: tuple | None = None,
+                cache: figure_cache | None = None, forecast: pd.DataFrame | None = None) -> dict:
+    """Price chart figure of an asset, actual and predicted prices and the forecast of the next days.
+    The lines are downsampled to the chart width, over the visible dates only.
 
     Args:
         * `df` (pd.DataFrame): DataFrame with the dashboard data.
         * `asset` (str): Asset name.
         * `asset_type` (str): Type of asset.
+        * `x_range` (tuple | None, optional): Visible dates after a zoom. Defaults to None (all the dates).
+        * `cache` (figure_cache | None, optional): Cache of the full range figures. Defaults to None.
+        * `forecast` (pd.DataFrame | None, optional): Date and Forecast columns. Defaults to None.
+
+    Returns:
+        `dict`: Figure of the dcc.Graph.
+    """
+
+    df = forecast_rows(df = df, forecast = forecast)
+    all_y = forecast_y_dict if 'Forecast' in df.columns else y_dict
+    if cache is not None and x_range is None:
+        key = cache.key(fingerprint = cache.fingerprint(df = df),
+                        config = {'asset': asset, 'asset_type': asset_type, 'y': all_y, 'max_points': MAX_POINTS})
+        figure = cache.get(key = key)
+        if figure is None:
+            figure = cache.put(key = key, figure = price_figure(df = df, asset = asset, asset_type = asset_type))
+        return figure
+
+    return {
+        "data": line_plotter(df = df, x_name = 'Date', all_y = all_y, x_range = x_range).plot_generator(),
+        "layout": {
+            "title": {
+                "text": f"{asset} {asset_type} Price Prediction",
+                "x": 0.35,
+                "xanchor": "left",
+            },
+            "xaxis": {"fixedrange": False},
+            "yaxis": {
+                "tickprefix": "$",
+                "fixedrange": True,
+            },
+            "uirevision": asset,    # Keeps the zoom when the lines are resampled.
+            'plot_bgcolor': '#111111',
+            'paper_bgcolor': '#111111',
+            'font': {
+                'color': '#FFFFFF'}
+        },
+    }
+
+def asset_description(df: pd.DataFrame, next_day: int | float, volatility: str, currency: str,
+                    forecast: pd.DataFrame | None = None) -> str:
+    """Description of the next day prediction, compared with the last predicted price.
+
+    Args:
+        * `df` (pd.DataFrame): DataFrame with the dashboard data.
         * `next_day` (int | float): Next day prediction value.
         * `volatility` (str): Volatility percentage value.
+        * `currency` (str): Currency symbol of the asset.
+        * `forecast` (pd.DataFrame | None, optional): Date and Forecast columns of the next days. Defaults to None.
 
     Returns:
-        Dash: Instance of the dash web application.
+        `str`: Description as markdown.
     """
 
-    specified_date = df['Date'].iloc[-1]
+    predicted = df['Date'][df['Predicted_Values'].notna()]   # Days fetched after the last analysis have no prediction.
+    specified_date = predicted.iloc[-1] if len(predicted) else df['Date'].iloc[-1]
     COMPARISON_INSTANCE = __compare_prices(df = df, value_pre = specified_date, next_day_price = next_day)
     trend_diff = get_first_key_value(COMPARISON_INSTANCE[0])
     TREND, diff = trend_diff[0], trend_diff[1]
@@ -88,14 +175,39 @@ def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day:
     elif TREND == TREND_DESCRIPTIONS["none"]:
         DIFFERENCE = '0'
     TODAYS_VAL = COMPARISON_INSTANCE[1]
-    external_stylesheets = [
-        {
-            "href": "https://fonts.googleapis.com/css2?"
-                    "family=Lato:wght@400;700&display=swap",
-            "rel": "stylesheet",
-        },
-    ]
-    app = dash.Dash(__name__, external_stylesheets = external_stylesheets)
+    horizon = ''
+    if forecast is not None and len(forecast) > 1:
+        horizon = (f" The forecast of the next **{len(forecast)}** days ends at "
+                f"**{currency}{float(forecast['Forecast'].iloc[-1]):.2f}** on {forecast['Date'].iloc[-1]}.")
+
+    return ("_**Description**_: The prediction for the price of the " 
+            f"asset on the next day (Previous date: {specified_date} with Adj Close of {currency}{TODAYS_VAL}) "
+            f"is: **{currency}{next_day}**. The mean volatility of "
+            f"the asset is **{str(round(float(volatility), 3))}**%. Comparing the price prediction with the value of the asset "
+            f"on the previous day, **{TREND}** " 
+            f"can be observed between the two days, with a percent difference of **{DIFFERENCE}%**." + horizon)
+
+def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day: int | float,
+                    volatility: str, currency: str, model_name: str, cache: figure_cache | None = None,
+                    forecast: pd.DataFrame | None = None) -> dash.Dash:
+
+    """Create a one graph dashboard using dash.
+
+    Args:
+        * `df` (pd.DataFrame): DataFrame with the dashboard data.
+        * `asset` (str): Asset name.
+        * `asset_type` (str): Type of asset.
+        * `next_day` (int | float): Next day prediction value.
+        * `volatility` (str): Volatility percentage value.
+        * `cache` (figure_cache | None, optional): Cache of the full range figures. Defaults to None.
+        * `forecast` (pd.DataFrame | None, optional): Date and Forecast columns of the next days. Defaults to None.
+
+    Returns:
+        Dash: Instance of the dash web application.
+    """
+
+    specified_date = df['Date'].iloc[-1]
+    app = dash.Dash(__name__, external_stylesheets = EXTERNAL_STYLESHEETS)
     app.title = "Market Analysis using ML!!!"
     app.layout = html.Div(
         children = [
@@ -121,34 +233,9 @@ def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day:
                     html.Div(
                         children = dcc.Graph(
                             id = "price-chart",
-                            config = {'displayModeBar': True,
-                                    'scrollZoom': True,
-                                    'modeBarButtonsToAdd':['drawline',
-                                        'drawopenpath',
-                                        'drawclosedpath',
-                                        'drawcircle',
-                                        'drawrect',
-                                        'eraseshape']
-                                    },
-                            figure = {
-                                "data": line_plotter(df = df, x_name = 'Date', all_y = y_dict).plot_generator(),
-                                "layout": {
-                                    "title": {
-                                        "text": f"{asset} {asset_type} Price Prediction",
-                                        "x": 0.35,
-                                        "xanchor": "left",
-                                    },
-                                    "xaxis": {"fixedrange": True},
-                                    "yaxis": {
-                                        "tickprefix": "$",
-                                        "fixedrange": True,
-                                    },
-                                    'plot_bgcolor': '#111111',
-                                    'paper_bgcolor': '#111111',
-                                    'font': {
-                                        'color': '#FFFFFF'}
-                                },
-                            },
+                            config = GRAPH_CONFIG,
+                            figure = price_figure(df = df, asset = asset, asset_type = asset_type, cache = cache,
+                                                forecast = forecast),
                         ),
                         className = "card",
                     ),
@@ -160,12 +247,8 @@ def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day:
             html.Div(
                 children = [
                     html.Span(
-                        children = dcc.Markdown("_**Description**_: The prediction for the price of the " 
-                                            f"asset on the next day (Previous date: {specified_date} with Adj Close of {currency}{TODAYS_VAL}) "
-                                            f"is: **{currency}{next_day}**. The mean volatility of "
-                                            f"the asset is **{str(round(float(volatility), 3))}**%. Comparing the price prediction with the value of the asset "
-                                            f"on the previous day, **{TREND}** " 
-                                            f"can be observed between the two days, with a percent difference of **{DIFFERENCE}%**.",
+                        children = dcc.Markdown(asset_description(df = df, next_day = next_day, volatility = volatility,
+                                                                currency = currency, forecast = forecast),
                                             className = "legend-title")
                     ),
                     html.Span(
@@ -178,11 +261,20 @@ def __dashboard_create(df: pd.DataFrame, asset: str, asset_type: str, next_day:
         ]
     )
 
+    @app.callback(Output("price-chart", "figure"), Input("price-chart", "relayoutData"), prevent_initial_call = True)
+    def _zoom(relayout: dict | None) -> dict:
+        x_range = relayout_range(relayout = relayout)
+        if x_range is None and not (relayout or {}).get('xaxis.autorange'):
+            raise PreventUpdate     # Not a zoom or reset of the x axis.
+        return price_figure(df = df, asset = asset, asset_type = asset_type, x_range = x_range, cache = cache,
+                            forecast = forecast)
+
     return app
 
 def dashboard_launch(df: pd.DataFrame, fin_asset: str, asset_type: str, 
                 nxt_day: float | int, volatility: str, asset_currency: str,
-                port: int, model: str) -> Any:
+                port: int, model: str, cache_dir: str | None = None, forecast: pd.DataFrame | None = None,
+                serve: bool = True) -> Any:
 
     """Launch a dash dashboard.
 
@@ -193,12 +285,30 @@ def dashboard_launch(df: pd.DataFrame, fin_asset: str, asset_type: str,
         * `nxt_day` (float | int): Next day price prediction.
         * `volatility` (str): Volatility of asset.
         * `port` (int, optional): Port for server.
+        * `cache_dir` (str | None, optional): Directory of the figure cache. Defaults to None (no cache).
+        * `forecast` (pd.DataFrame | None, optional): Date and Forecast columns of the next days. Defaults to None.
+        * `serve` (bool, optional): Run the app, otherwise only build it for dashboard_run(). Defaults to True.
 
     Returns:
-        Launches an instance of the app.
+        Launches an instance of the app, or the app when serve is False.
     """
 
+    cache = None if cache_dir is None else figure_cache(root = cache_dir)
     app = __dashboard_create(df = df, asset = fin_asset, asset_type = asset_type, next_day = nxt_day,
-                        volatility = volatility, currency = asset_currency, model_name = model)
+                        volatility = volatility, currency = asset_currency, model_name = model, cache = cache,
+                        forecast = forecast)
+    return dashboard_run(app = app, port = port) if serve else app
+
+def dashboard_run(app: Any, port: int) -> Any:
+    """Open the browser and run a built dashboard.
+
+    Args:
+        * `app` (Dash): App from dashboard_launch(serve = False).
+        * `port` (int): Port for server.
+
+    Returns:
+        Launches an instance of the app.
+    """
+
     Timer(1, webbrowser.open_new, args = (f"http://localhost:{port}",)).start()
     return app.run(port = port, debug = False)
\ No newline at end of file
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from typing import Final
+
+MAX_POINTS: Final[int] = 1200  # Points per trace, about the pixel width of the price chart.
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling. Keeps the first and last points and, in
+    each bucket in between, the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves the visual shape of the line.
+
+    Args:
+        * `x` (np.ndarray): Increasing numerical x values.
+        * `y` (np.ndarray): y values, without NaN.
+        * `threshold` (int): Number of points to keep.
+
+    Returns:
+        `np.ndarray`: Sorted indices of the kept points.
+    """
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1  # Bucket i is edges[i]:edges[i + 1].
+    edges[-1] = n - 1
+
+    # Averages of every bucket from cumulative sums, the last point is its own bucket.
+    csum_x, csum_y = np.concatenate(([0.0], np.cumsum(x))), np.concatenate(([0.0], np.cumsum(y)))
+    starts, stops = np.append(edges[:-1], n - 1), np.append(edges[1:], n)
+    counts = stops - starts
+    avg_x = (csum_x[stops] - csum_x[starts]) / counts
+    avg_y = (csum_y[stops] - csum_y[starts]) / counts
+
+    out = np.empty(threshold, dtype = np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def downsample(x: pd.Series, y: pd.Series, max_points: int = MAX_POINTS) -> tuple[pd.Series, pd.Series]:
+    """Downsample a chart trace with LTTB. Missing y values are dropped first.
+
+    Args:
+        * `x` (pd.Series): Dates of the trace.
+        * `y` (pd.Series): Values of the trace.
+        * `max_points` (int, optional): Maximum number of points. Defaults to MAX_POINTS.
+
+    Returns:
+        `tuple[pd.Series, pd.Series]`: The kept dates and values.
+    """
+
+    valid = y.notna().to_numpy()
+    x, y = x[valid], y[valid]
+    if len(x) <= max_points:
+        return x, y
+
+    x_num = pd.to_datetime(x).to_numpy().astype('datetime64[ns]').astype(np.int64)
+    idx = lttb(x = x_num, y = y.to_numpy(), threshold = max_points)
+    return x.iloc[idx], y.iloc[idx]
+
+def visible_rows(df: pd.DataFrame, x: str, x_range: tuple | list | None) -> pd.DataFrame:
+    """Rows of a dataframe inside the visible x range, plus one row on each side so lines reach the chart edges.
+
+    Args:
+        * `df` (pd.DataFrame): Chart data, sorted by x.
+        * `x` (str): Name of the date column.
+        * `x_range` (tuple | list | None): First and last visible dates. None for all the rows.
+
+    Returns:
+        `pd.DataFrame`: The visible rows.
+    """
+
+    if x_range is None:
+        return df
+
+    dates = pd.to_datetime(df[x]).to_numpy()
+    lo = max(int(np.searchsorted(dates, np.datetime64(pd.Timestamp(x_range[0])), side = 'left')) - 1, 0)
+    hi = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(x_range[1])), side = 'right')) + 1
+    return df.iloc[lo:hi]
+
+def relayout_range(relayout: dict | None) -> tuple[str, str] | None:
+    """Visible x range from the relayoutData of a dcc.Graph.
+
+    Args:
+        * `relayout` (dict | None): relayoutData of the graph.
+
+    Returns:
+        `tuple[str, str] | None`: First and last visible dates, None when the chart shows everything
+        or when the event did not change the x range.
+    """
+
+    if not relayout:
+        return None
+    if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        return relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    if 'xaxis.range' in relayout:
+        return tuple(relayout['xaxis.range'][:2])
+    return None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, json, hashlib
+import pandas as pd
+from typing import Final
+from lib.utils import dunders
+
+CACHE_VERSION: Final[int] = 1   # Bump when the figure layout or trace generation changes.
+MAX_FILES: Final[int] = 1000    # Cached figures kept on disk, the least recently used are evicted.
+CACHE_DIR: Final[str] = 'figure_cache'    # Subdirectory of the databases directory.
+
+class figure_cache(dunders):
+    """Content addressed cache of serialized Plotly figures, stored next to the databases.
+    A figure is keyed by the fingerprint of its data and its trace configuration, so
+    unchanged data is a file read instead of a new trace generation and serialization.
+
+    Args:
+        * `root` (str): Directory of the cache.
+        * `max_files` (int, optional): Maximum number of cached figures. Defaults to MAX_FILES.
+    """
+
+    def __init__(self, root: str, max_files: int = MAX_FILES) -> None:
+        self.root = root
+        self.max_files = max_files
+        super().__init__()
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame) -> str:
+        """Fingerprint of the content of a dataframe.
+
+        Args:
+            * `df` (pd.DataFrame): Input dataframe.
+
+        Returns:
+            `str`: sha256 hex digest of the column names and row hashes.
+        """
+
+        digest = hashlib.sha256(json.dumps([str(col) for col in df.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index = False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(fingerprint: str, config: dict) -> str:
+        """Cache key of a figure.
+
+        Args:
+            * `fingerprint` (str): Fingerprint of the figure data.
+            * `config` (dict): Trace and layout settings of the figure.
+
+        Returns:
+            `str`: sha256 hex digest.
+        """
+
+        ident = {'version': CACHE_VERSION, 'fingerprint': fingerprint, 'config': config}
+        return hashlib.sha256(json.dumps(ident, sort_keys = True, default = str).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Path of a cached figure.
+
+        Args:
+            * `key` (str): Cache key.
+
+        Returns:
+            `str`: Path of the json file.
+        """
+
+        return os.path.join(self.root, key + '.json')
+
+    def get(self, key: str) -> dict | None:
+        """Load a cached figure and mark it as recently used.
+
+        Args:
+            * `key` (str): Cache key.
+
+        Returns:
+            `dict | None`: The figure, None on a cache miss.
+        """
+
+        fl = self._path(key = key)
+        try:
+            with open(fl, 'r') as fl_stream:
+                figure = json.load(fl_stream)
+            os.utime(fl)
+        except (OSError, ValueError):
+            return None
+        return figure
+
+    def put(self, key: str, figure: dict) -> dict:
+        """Serialize a figure into the cache.
+
+        Args:
+            * `key` (str): Cache key.
+            * `figure` (dict): Figure of a dcc.Graph, may hold pandas and numpy values.
+
+        Returns:
+            `dict`: The figure as loaded back from its json, what get() returns.
+        """
+
+        from plotly.utils import PlotlyJSONEncoder
+        serialized = json.dumps(figure, cls = PlotlyJSONEncoder)
+        os.makedirs(self.root, exist_ok = True)
+        fl = self._path(key = key)
+        tmp_fl = f'{fl}.{os.getpid()}.tmp'
+        with open(tmp_fl, 'w') as fl_stream:
+            fl_stream.write(serialized)
+        os.replace(tmp_fl, fl)  # Atomic, concurrent readers never load a half written figure.
+        self.evict()
+        return json.loads(serialized)
+
+    def evict(self) -> list:
+        """Remove the least recently used figures past max_files.
+
+        Returns:
+            `list`: Keys of the evicted figures.
+        """
+
+        if not os.path.isdir(self.root):
+            return []
+
+        entries = []
+        for fl in os.listdir(self.root):
+            if not fl.endswith('.json'):
+                continue
+            try:
+                entries.append((os.stat(os.path.join(self.root, fl)).st_mtime, fl))
+            except OSError:
+                continue
+
+        evicted = []
+        for _, fl in sorted(entries)[:max(len(entries) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.root, fl))
+                evicted.append(fl[:-len('.json')])
+            except OSError:
+                pass
+        return evicted
@@ -3,7 +3,8 @@ from __future__ import annotations
 
 import pandas as pd
 from lib.utils import dunders
-from secrets import choice
+from dashboard.plots.downsample import downsample, visible_rows, MAX_POINTS
+from zlib import crc32
 from typing import List, Dict
 
 
@@ -17,17 +18,26 @@ exclude_colours = {'yellow': 'orange',
                 'cyan': 'blue'}
 
 class line_plotter(dunders):
-    """Plotter class that plots lines for Dash line plots.
+    """Plotter class that plots lines for Dash line plots. Each line is downsampled with LTTB
+    to at most max_points points, taken from the visible x range only.
+
+    Args:
+        * `df` (pd.DataFrame): DataFrame containing the data, sorted by x.
+        * `x_name` (str): `x-axis` column name.
+        * `all_y` (dict): `y-axis` column names to line names.
+        * `max_points` (int, optional): Maximum number of points per line. Defaults to MAX_POINTS.
+        * `x_range` (tuple | None, optional): Visible x range. Defaults to None (all the rows).
     """
 
-    def __init__(self, df: pd.DataFrame,  x_name: str, all_y: dict) -> None:
-        self.df = df
+    def __init__(self, df: pd.DataFrame,  x_name: str, all_y: dict, max_points: int = MAX_POINTS,
+                x_range: tuple | None = None) -> None:
+        self.df = visible_rows(df = df, x = x_name, x_range = x_range)
         self.x_name = x_name
         self.all_y = all_y
+        self.max_points = max_points
         super().__init__()
 
-    @staticmethod
-    def _line_dict_generator(df: pd.DataFrame, x: str, y: str, line_colour: str, name: str) -> dict:
+    def _line_dict_generator(self, df: pd.DataFrame, x: str, y: str, line_colour: str, name: str) -> dict:
         """Dictionary template for lines of Dash plot.
 
         Args:
@@ -41,9 +51,10 @@ class line_plotter(dunders):
             dict: Dictionary containing all the line information for Dash.
         """
 
+        x_values, y_values = downsample(x = df.loc[:, x], y = df.loc[:, y], max_points = self.max_points)
         return {
-        "x": df.loc[:, x],
-        "y": df.loc[:, y],
+        "x": x_values,
+        "y": y_values,
         "type": "lines",
         "line": dict(color = line_colour),
         "name": name,
@@ -52,50 +63,35 @@ class line_plotter(dunders):
         }
 
     @staticmethod
-    def _reject_sample(lst: list, exception: list) -> str:   # Used to exclude orange when yellow is picked (vice/versa).
-        """Reject a random list sample based on exception and return 
-        a new random sample from the list.
+    def colour_picker(name: str, picked: list) -> str:
+        """Deterministic colour of a line. The palette is walked from a position given by the line name
+        and the first colour that is neither picked nor an exclusion pair of a picked colour is used,
+        e.g. orange is excluded when yellow is picked (vice/versa).
 
         Args:
-            * `lst` (list): List to pick element from.
-            * `exception` (list): Elements to exclude.
-
-        Returns:
-            `str`: New random sample excluding the exception.
-        """
-
-        while True:
-            picked = choice(lst)
-            if picked not in exception:
-                return picked
-
-    def colour_exclusion(self, current_colour: str, dictionary: dict, exclusion_lst: list) -> str:
-        """Exlusion algorithm to exclude colours that can create clutter on the graph. 
-
-        Args:
-            * `current_colour` (str): Current colour instance.
-            * `dictionary` (dict): Colour exclusion pairs.
-            * `exclusion_lst` (list): Colours that were previously picked. 
+            * `name` (str): Name of the line in legend.
+            * `picked` (list): Colours of the previous lines.
 
         Returns:
-            `str`: New colour sample that is not an exclusion pair.
+            `str`: Colour of the line.
         """
 
-        if len(exclusion_lst) == 0:     # Only when the first dictionary containing the plot line information is generated.
-            return 0
+        excluded = set(picked)
+        for key, value in exclude_colours.items():
+            if key in picked:
+                excluded.add(value)
+            if value in picked:
+                excluded.add(key)
 
-        for key, value in dictionary.items():   # Only after the first dictionary containing the plot line information is generated.
-            for i in exclusion_lst:
-                if i == key:
-                    result = self._reject_sample(lst = colours, exception = [current_colour, i, value])
-                elif i == value:
-                    result = self._reject_sample(lst = colours, exception = [current_colour, i, key])
-                else:
-                    result = 0
-        return result
+        start = crc32(name.encode()) % len(colours)
+        for step in range(len(colours)):
+            colour = colours[(start + step) % len(colours)]
+            if colour not in excluded:
+                return colour
+        return colours[start]   # More lines than clutter free colours.
 
     def plot_generator(self) -> List[Dict[str, str]]:
-        """Dictionary generator containing plot information for Dash.
+        """Dictionary generator containing plot information for Dash. The same lines always get the same colours.
 
         Returns:
             `List[Dict[str, str]]`: List of dictionaries were each dictionary is a line in the Dash plot.
@@ -104,22 +100,9 @@ class line_plotter(dunders):
         out_list = []
         colour_checks = []
         for key, value in self.all_y.items():
-            colour = choice(colours)
-            if len(colour_checks) == 0:
-                colour_checks.append(colour)
-                out_dict = self._line_dict_generator(df = self.df, x = self.x_name, y = key,
-                            line_colour = colour, name = value)
-                out_list.append(out_dict)
-            else:
-                check_bad_colours = self.colour_exclusion(current_colour = colour,
-                                                        dictionary = exclude_colours,
-                                                        exclusion_lst = colour_checks)
-
-                if not check_bad_colours == 0:
-                    colour = check_bad_colours
-
-                out_dict = self._line_dict_generator(df = self.df, x = self.x_name, y = key,
-                                line_colour = colour, name = value)
-                out_list.append(out_dict)
+            colour = self.colour_picker(name = value, picked = colour_checks)
+            colour_checks.append(colour)
+            out_list.append(self._line_dict_generator(df = self.df, x = self.x_name, y = key,
+                                                    line_colour = colour, name = value))
 
         return out_list
\ No newline at end of file
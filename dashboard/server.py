@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, glob
+from functools import lru_cache
+from typing import Any, Final
+import dash
+from dash import dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import pandas as pd
+import webbrowser
+from threading import Timer
+from lib.db_utils import get_run, latest_runs, prediction_history, run_forecast, stream_version
+from lib.fin_asset import assessment_frame
+from lib.storage import sqlite_storage, parquet_storage
+from dashboard.app import price_figure, asset_description, EXTERNAL_STYLESHEETS, GRAPH_CONFIG
+from dashboard.plots.downsample import relayout_range
+from dashboard.plots.figure_cache import figure_cache, CACHE_DIR
+
+FIGURE_CACHE_SIZE: Final[int] = 128    # Full range renders kept in memory.
+SEPARATOR: Final[str] = '|'    # Between the database file name and the run id of a dropdown value.
+STREAM_REFRESH_MS: Final[int] = 1000   # Milliseconds between two checks for new bars of a streaming run.
+
+def list_runs(root: str) -> list[dict]:
+    """Latest run of every asset and model in the databases of a directory.
+
+    Args:
+        * `root` (str): Databases directory.
+
+    Returns:
+        `list[dict]`: Runs, each with the name of its database file under the db key.
+    """
+
+    runs = []
+    for db in sorted(glob.glob(os.path.join(root, '*.db'))):
+        for run in latest_runs(db = db):
+            runs.append(dict(run, db = os.path.basename(db)))
+    return runs
+
+def _prices(db: str, asset: str, model: str, asset_type: str | None) -> pd.DataFrame | None:
+    """Actual prices of an asset, from the SQLite tables or the Parquet dataset next to the database.
+
+    Args:
+        * `db` (str): Database path.
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+        * `asset_type` (str | None): Asset type, names the Parquet dataset.
+
+    Returns:
+        `pd.DataFrame | None`: Date and Adj_Close columns, None if the prices are not stored.
+    """
+
+    storages = [sqlite_storage(db = db, model_name = model)]
+    if asset_type is not None:
+        storages.append(parquet_storage(root = os.path.join(os.path.dirname(db), f'{asset_type}_parquet')))
+    for storage in storages:
+        if asset in storage.assets():
+            return storage.read(ticker = asset, columns = ['Date', 'Adj_Close'], dtypes = {'Adj_Close': 'float64'})
+    return None
+
+@lru_cache(maxsize = FIGURE_CACHE_SIZE)
+def _frame(db: str, run_id: str, version: str | None = None) -> tuple[dict, pd.DataFrame, pd.DataFrame] | None:
+    """Run and dashboard data of a run. Runs never change once stored, so they are cached by run id.
+    Streaming runs change with every bar and are cached by run id and stream version.
+
+    Args:
+        * `db` (str): Database path.
+        * `run_id` (str): Run identifier.
+        * `version` (str | None, optional): Stream version from stream_version(). Defaults to None.
+
+    Returns:
+        `tuple[dict, pd.DataFrame, pd.DataFrame] | None`: The run, its dashboard data and its forecast,
+        None if the run is not stored.
+    """
+
+    run = get_run(db = db, run_id = run_id)
+    if run is None:
+        return None
+    history = prediction_history(db = db, asset = run['asset'], model = run['model'], run_id = run_id)
+    prices = _prices(db = db, asset = run['asset'], model = run['model'], asset_type = run['asset_type'])
+    if prices is None:
+        prices = pd.DataFrame({'Date': history['date'], 'Adj_Close': history['actual']})
+    forecast = run_forecast(db = db, run_id = run_id).rename(columns = {'date': 'Date', 'forecast': 'Forecast'})
+    return run, assessment_frame(prices = prices, history = history), forecast
+
+def _render(db: str, run_id: str, x_range: tuple | None = None, version: str | None = None) -> tuple[dict, str]:
+    """Figure and description of a run. Full range renders are cached in memory, and their figures on disk
+    next to the database. Zoomed renders resample a slice of the cached frame and are not cached, so
+    zooming and panning never evict the full range renders.
+
+    Args:
+        * `db` (str): Database path.
+        * `run_id` (str): Run identifier.
+        * `x_range` (tuple | None, optional): Visible dates after a zoom. Defaults to None (all the dates).
+        * `version` (str | None, optional): Stream version from stream_version(). Defaults to None.
+
+    Returns:
+        `tuple[dict, str]`: Figure of the price chart and markdown description.
+    """
+
+    if x_range is None:
+        return _render_full(db = db, run_id = run_id, version = version)
+    return _build(db = db, run_id = run_id, x_range = x_range, version = version)
+
+@lru_cache(maxsize = FIGURE_CACHE_SIZE)
+def _render_full(db: str, run_id: str, version: str | None = None) -> tuple[dict, str]:
+    """Full range figure and description of a run, cached by run id and stream version.
+
+    Args:
+        * `db` (str): Database path.
+        * `run_id` (str): Run identifier.
+        * `version` (str | None, optional): Stream version from stream_version(). Defaults to None.
+
+    Returns:
+        `tuple[dict, str]`: Figure of the price chart and markdown description.
+    """
+
+    return _build(db = db, run_id = run_id, x_range = None, version = version)
+
+def _build(db: str, run_id: str, x_range: tuple | None, version: str | None) -> tuple[dict, str]:
+    """Build the figure and description of a run from its cached data.
+
+    Args:
+        * `db` (str): Database path.
+        * `run_id` (str): Run identifier.
+        * `x_range` (tuple | None): Visible dates after a zoom, None for all the dates.
+        * `version` (str | None): Stream version from stream_version().
+
+    Returns:
+        `tuple[dict, str]`: Figure of the price chart and markdown description.
+    """
+
+    frame = _frame(db = db, run_id = run_id, version = version)
+    if frame is None:
+        return {}, f"Run {run_id} is not stored in {os.path.basename(db)}."
+    run, df, forecast = frame
+
+    asset_type = run['asset_type'] or ''
+    currency = run['currency'] or ''
+    figure = price_figure(df = df, asset = run['asset'], asset_type = asset_type, x_range = x_range,
+                        cache = figure_cache(root = os.path.join(os.path.dirname(db), CACHE_DIR)), forecast = forecast)
+    description = (f"**{run['asset']}** {asset_type} analysed with a **{run['model']}** (run {run_id}, {run['created']}). "
+                + asset_description(df = df, next_day = run['next_day'], volatility = run['volatility'], currency = currency,
+                                            forecast = forecast))
+    return figure, description
+
+def _layout(root: str) -> html.Div:
+    """Dashboard layout, the asset list is read from the databases on every page load.
+
+    Args:
+        * `root` (str): Databases directory.
+
+    Returns:
+        `html.Div`: The layout.
+    """
+
+    options = [{'label': f"{run['asset']} ({run['model']}, {run['db']})",
+                'value': f"{run['db']}{SEPARATOR}{run['run_id']}"} for run in list_runs(root = root)]
+    return html.Div(
+        children = [
+            html.Div(
+                children = [
+                    html.P(children = "📈", className = "header-emoji"),
+                    html.H1(children = "Market Analytics", className = "header-title"),
+                    html.Span(children = dcc.Markdown(f"Browse the latest predictions of the **{len(options)}** "
+                                                    "analysed assets. Select an asset to load its prices and predictions.",
+                                                    className = "header-description")),
+                    html.P(children = "Made by Christos Synodinos", className = "header-author"),
+                ],
+                className = "header",
+            ),
+            html.Div(
+                children = [
+                    html.Div(
+                        children = dcc.Dropdown(id = "asset-select", options = options,
+                                                value = options[0]['value'] if options else None,
+                                                clearable = False, placeholder = "Select an asset"),
+                        className = "card",
+                    ),
+                    html.Div(
+                        children = dcc.Graph(id = "price-chart", config = GRAPH_CONFIG),
+                        className = "card",
+                    ),
+                    dcc.Interval(id = "stream-tick", interval = STREAM_REFRESH_MS),
+                    dcc.Store(id = "chart-state"),
+                ],
+                className = "wrapper",
+            ),
+            html.Div(
+                children = [
+                    html.Div(
+                        children = [
+                            html.Span(children = dcc.Markdown(id = "asset-description", className = "legend-title")),
+                            html.Span(className = "legend-description"),
+                        ],
+                        className = "Legend",
+                    ),
+                ]
+            ),
+        ]
+    )
+
+def dashboard_server(root: str) -> dash.Dash:
+    """Create the dashboard server of all the assets stored in a databases directory.
+    Nothing is loaded before an asset is selected.
+
+    Args:
+        * `root` (str): Databases directory.
+
+    Returns:
+        Dash: Instance of the dash web application.
+    """
+
+    app = dash.Dash(__name__, external_stylesheets = EXTERNAL_STYLESHEETS)
+    app.title = "Market Analysis using ML!!!"
+    app.layout = lambda: _layout(root = root)
+
+    @app.callback(Output("price-chart", "figure"), Output("asset-description", "children"), Output("chart-state", "data"),
+                Input("asset-select", "value"), Input("price-chart", "relayoutData"), Input("stream-tick", "n_intervals"),
+                State("chart-state", "data"))
+    def _select(value: str | None, relayout: dict | None, tick: int | None, shown: dict | None) -> tuple[dict, str, dict | None]:
+        if not value:
+            if dash.ctx.triggered_id == "stream-tick":
+                raise PreventUpdate
+            return {}, "No analysed assets yet. Run the analysis of an asset first.", None
+
+        db_name, run_id = value.split(SEPARATOR, 1)
+        db = os.path.join(root, os.path.basename(db_name))    # Only databases of the served directory.
+        version = stream_version(db = db, run_id = run_id)
+        shown = shown if shown and shown.get('value') == value else {}     # Rendered state of this asset.
+
+        if dash.ctx.triggered_id == "stream-tick":  # New bars, redrawn over the visible dates.
+            if not shown or version == shown['version']:
+                raise PreventUpdate
+            x_range = None if shown['x_range'] is None else tuple(shown['x_range'])
+        elif dash.ctx.triggered_id == "price-chart":   # Zoom, resample the visible dates.
+            x_range = relayout_range(relayout = relayout)
+            if x_range is None and not (relayout or {}).get('xaxis.autorange'):
+                raise PreventUpdate
+            x_range = None if x_range is None else tuple(x_range)
+        else:   # New asset, all the dates.
+            x_range = None
+
+        figure, description = _render(db = db, run_id = run_id, x_range = x_range, version = version)
+        return figure, description, {'value': value, 'version': version, 'x_range': x_range}
+
+    return app
+
+def dashboard_serve(root: str, port: int) -> Any:
+    """Launch the long running dashboard server.
+
+    Args:
+        * `root` (str): Databases directory.
+        * `port` (int): Port for server.
+
+    Returns:
+        Launches an instance of the app.
+    """
+
+    app = dashboard_server(root = root)
+    Timer(1, webbrowser.open_new, args = (f"http://localhost:{port}",)).start()
+    return app.run(port = port, debug = False)
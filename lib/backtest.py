@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json, hashlib
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from typing import Final
+from lib.utils import dunders
+from lib.db_utils import record_backtest, backtest_folds
+from lib.inference import output_width
+from lib.pool import process_pool
+
+FOLD_SCHEMES: Final[tuple] = ('expanding', 'rolling')  # expanding: train on all the rows so far, rolling: on the last train_rows.
+TRAIN_ROWS: Final[int] = 504    # Training rows of the first expanding fold and of every rolling fold, two years of trading days.
+FOLDS: Final[int] = 10  # Latest folds evaluated.
+
+@dataclass
+class fold:
+    """Dataclass holding the rows of one walk-forward fold. The model trains on
+    [train_start, train_end) and forecasts the horizon rows from train_end.
+    """
+
+    fold: int
+    train_start: int
+    train_end: int
+    test_end: int
+
+def walk_forward_folds(rows: int, train_rows: int, horizon: int, step: int | None = None,
+                    scheme: str = 'expanding') -> list[fold]:
+    """Folds of a series, anchored at its first row so they stay the same when days are appended.
+
+    Args:
+        * `rows` (int): Length of the series.
+        * `train_rows` (int): Training rows of the first fold, and of every fold in the rolling scheme.
+        * `horizon` (int): Days forecast by each fold.
+        * `step` (int | None, optional): Rows between two folds. Defaults to None (horizon, test days do not overlap).
+        * `scheme` (str, optional): One of FOLD_SCHEMES. Defaults to 'expanding'.
+
+    Raises:
+        `ValueError`: Unknown scheme.
+
+    Returns:
+        `list[fold]`: Every fold whose forecast days are all known, oldest first.
+    """
+
+    if scheme not in FOLD_SCHEMES:
+        raise ValueError(f'Fold scheme: {scheme} is not valid. Valid schemes are: {", ".join(FOLD_SCHEMES)}.')
+    step = horizon if step is None else step
+    ends = range(train_rows, rows - horizon + 1, step)
+    return [fold(fold = i, train_start = 0 if scheme == 'expanding' else end - train_rows, train_end = end,
+                test_end = end + horizon) for i, end in enumerate(ends)]
+
+def run_chain(closes: np.ndarray, folds: list[fold], pred_days: int, params: dict, horizon: int, mode: str,
+            finetune: dict | None, seed: int) -> dict:
+    """Fit and forecast consecutive folds. The first fold trains a model from scratch, the next ones
+    fine-tune it on their training rows. Never raises, the folds done before a failure are returned
+    with the error.
+
+    Args:
+        * `closes` (np.ndarray): Close prices of the asset, up to the last fold.
+        * `folds` (list[fold]): Consecutive folds.
+        * `pred_days` (int): Days used for each prediction.
+        * `params` (dict): units, dropout, optimizer, loss, epoch and batch of the model.
+        * `horizon` (int): Days forecast by each fold.
+        * `mode` (str): Forecasting mode, direct or recursive.
+        * `finetune` (dict | None): replay and epochs of the fine-tuned folds.
+        * `seed` (int): Seed of the weights, the shuffles and the replay samples.
+
+    Returns:
+        `dict`: Forecasts (horizon,) and fit time of each fold number, and the error, None on success.
+    """
+
+    out = {'folds': {}, 'error': None}
+    try:
+        import keras
+        from lib.model_methods import models, preprocessing, horizon_prediction
+        from lib.windows import window_targets
+        keras.utils.set_random_seed(seed)
+
+        width = output_width(horizon = horizon, mode = mode)
+        trainer = models(dropout = float(params['dropout']), loss_function = params['loss'],
+                        epoch = int(params['epoch']), batch = int(params['batch']))
+        model = scaler = prev_end = None
+        for f in folds:
+            start = perf_counter()
+            train = closes[f.train_start:f.train_end]
+            if model is None:
+                x, y, scaler = preprocessing(data = pd.DataFrame({'Close': train}), prediction_days = pred_days, horizon = width)
+                model = trainer.LSTM_RNN(x = x, y = y, units = int(params['units']), closing_value = width,
+                                        optimize = params['optimizer'])
+            else:   # The scaler of the chain, the model learnt its scale.
+                x, y = window_targets(scaler.transform(train.reshape(-1, 1)), window = pred_days, horizon = width)
+                model = trainer.fine_tune(model = model, x = x, y = y, new_windows = f.train_end - prev_end,
+                                        replay = finetune['replay'], epochs = finetune['epochs'], seed = seed + f.fold)
+            prev_end = f.train_end
+            forecast = horizon_prediction(input = scaler.transform(train.reshape(-1, 1)), prediction_days = pred_days,
+                                        model = model, scaler = scaler, horizon = horizon, mode = mode)
+            out['folds'][f.fold] = {'forecast': np.asarray(forecast, dtype = np.float64), 'fit_time': perf_counter() - start}
+    except Exception as e:
+        out['error'] = f'{type(e).__name__}: {e}'
+    return out
+
+def backtest_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Error and directional accuracy of the forecasts, per asset and forecast day and over all the days.
+
+    Args:
+        * `df` (pd.DataFrame): Folds from backtest_folds().
+
+    Returns:
+        `pd.DataFrame`: asset, step (0 for all the days), folds, mae, rmse, mape (%) and direction (%, share of
+        forecasts moving the same way as the price from the last training day) columns.
+    """
+
+    err = df['predicted'] - df['actual']
+    frame = pd.DataFrame({'asset': df['asset'], 'step': df['step'], 'fold': df['fold'], 'abs': err.abs(), 'sq': err ** 2,
+                        'pct': (err / df['actual']).abs() * 100,
+                        'hit': np.sign(df['predicted'] - df['last']) == np.sign(df['actual'] - df['last'])})
+    out = []
+    for keys in (['asset', 'step'], ['asset']):
+        agg = frame.groupby(keys).agg(folds = ('fold', 'nunique'), mae = ('abs', 'mean'), mse = ('sq', 'mean'),
+                                    mape = ('pct', 'mean'), direction = ('hit', 'mean')).reset_index()
+        if 'step' not in agg:
+            agg['step'] = 0
+        out.append(agg)
+    metrics = pd.concat(out, ignore_index = True).sort_values(['asset', 'step'], ignore_index = True)
+    metrics['rmse'] = np.sqrt(metrics.pop('mse'))
+    metrics['direction'] = metrics['direction'] * 100
+    return metrics.loc[:, ['asset', 'step', 'folds', 'mae', 'rmse', 'mape', 'direction']]
+
+class walk_forward(dunders):
+    """Walk-forward backtest of a model over many assets. Each fold trains on the rows before a
+    date and forecasts the next horizon days. Folds run in parallel worker processes, chains of
+    retrain_every folds at a time, and their forecasts are cached in the backtest_folds table under
+    a key of the configuration, so a rerun with more history only computes the new folds.
+
+    Args:
+        * `db` (str): Database of the backtest tables.
+        * `model_name` (str): Model name.
+        * `params` (dict): units, dropout, optimizer, loss, epoch and batch of the model.
+        * `pred_days` (int): Days used for each prediction.
+        * `horizon` (int): Days forecast by each fold.
+        * `workers` (int): Chains running at once.
+        * `threads` (int): CPU threads of each worker.
+        * `mode` (str, optional): Forecasting mode, direct or recursive. Defaults to 'direct'.
+        * `scheme` (str, optional): One of FOLD_SCHEMES. Defaults to 'expanding'.
+        * `train_rows` (int, optional): Training rows of the first fold, and of every fold when rolling. Defaults to TRAIN_ROWS.
+        * `folds` (int, optional): Latest folds evaluated. Defaults to FOLDS.
+        * `retrain_every` (int, optional): Folds between two models trained from scratch, the folds in between
+        fine-tune the last one. Defaults to 1 (every fold retrains).
+        * `finetune` (dict | None, optional): replay and epochs of the fine-tuned folds. Defaults to None.
+        * `seed` (int, optional): Seed of the folds. Defaults to 0.
+    """
+
+    def __init__(self, db: str, model_name: str, params: dict, pred_days: int, horizon: int, workers: int,
+                threads: int, mode: str = 'direct', scheme: str = 'expanding', train_rows: int = TRAIN_ROWS,
+                folds: int = FOLDS, retrain_every: int = 1, finetune: dict | None = None, seed: int = 0) -> None:
+        if scheme not in FOLD_SCHEMES:
+            raise ValueError(f'Fold scheme: {scheme} is not valid. Valid schemes are: {", ".join(FOLD_SCHEMES)}.')
+        if train_rows <= pred_days + horizon:
+            raise ValueError(f'{train_rows} training rows are not enough for {pred_days} day windows and {horizon} day targets.')
+        if retrain_every > 1 and finetune is None:
+            raise ValueError('Fine-tuned folds need the replay and epochs of the fine-tuning.')
+        output_width(horizon = horizon, mode = mode)     # Validates the mode and the horizon.
+        self.db = db
+        self.model_name = model_name
+        self.params = params
+        self.pred_days = pred_days
+        self.horizon = horizon
+        self.workers = workers
+        self.threads = threads
+        self.mode = mode
+        self.scheme = scheme
+        self.train_rows = train_rows
+        self.folds = folds
+        self.retrain_every = max(1, retrain_every)
+        self.finetune = finetune if self.retrain_every > 1 else None
+        self.seed = seed
+        super().__init__()
+
+    def config(self) -> dict:
+        """Everything the forecasts of a fold depend on, besides its rows.
+
+        Returns:
+            `dict`: The configuration.
+        """
+
+        return {'model': self.model_name, 'params': {key: str(value) for key, value in self.params.items()},
+                'pred_days': self.pred_days, 'horizon': self.horizon, 'mode': self.mode, 'scheme': self.scheme,
+                'train_rows': self.train_rows, 'retrain_every': self.retrain_every, 'finetune': self.finetune,
+                'seed': self.seed}
+
+    def config_key(self) -> str:
+        """Cache key of the configuration.
+
+        Returns:
+            `str`: Short hash of config().
+        """
+
+        return hashlib.sha256(json.dumps(self.config(), sort_keys = True).encode()).hexdigest()[:16]
+
+    def _chains(self, asset: str, dates: np.ndarray, cached: set) -> list[list[fold]]:
+        """Chains of folds to compute for an asset: the chains holding one of the latest folds that is not cached.
+
+        Args:
+            * `asset` (str): Asset name.
+            * `dates` (np.ndarray): Dates of the asset rows.
+            * `cached` (set): asset, fold and training end date of the cached folds.
+
+        Returns:
+            `list[list[fold]]`: Consecutive folds of each chain, from the first fold of the chain.
+        """
+
+        grid = walk_forward_folds(rows = len(dates), train_rows = self.train_rows, horizon = self.horizon, scheme = self.scheme)
+        chains = set()
+        for f in grid[-self.folds:] if self.folds > 0 else []:
+            if (asset, f.fold, str(dates[f.train_end - 1])) not in cached:
+                chains.add(f.fold // self.retrain_every)
+        # A chain always starts from its first fold, so its models do not depend on which folds are missing.
+        return [grid[chain * self.retrain_every:(chain + 1) * self.retrain_every] for chain in sorted(chains)]
+
+    def run(self, prices: dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Run the missing folds of every asset and aggregate the latest folds.
+
+        Args:
+            * `prices` (dict[str, pd.DataFrame]): Date and Close columns of each asset.
+
+        Returns:
+            `pd.DataFrame`: The metrics of the latest folds, from backtest_metrics(), with the model name.
+        """
+
+        key = self.config_key()
+        stored = backtest_folds(db = self.db, config = key)
+        cached = set(zip(stored['asset'], stored['fold'], stored['train_end'])) if len(stored) else set()
+
+        jobs = []
+        for asset, df in prices.items():
+            dates = df['Date'].to_numpy().astype(str)
+            for chain in self._chains(asset = asset, dates = dates, cached = cached):
+                jobs.append((asset, chain))
+        print(f'Backtest {key}: {len(jobs)} chains of up to {self.retrain_every} folds to compute, '
+            f'{len(cached)} folds cached, {self.workers} workers of {self.threads} threads...\n')
+
+        if jobs:
+            with process_pool(workers = self.workers, threads = self.threads) as executor:
+                futures = {executor.submit(run_chain, prices[asset]['Close'].to_numpy()[:chain[-1].train_end], chain,
+                                        self.pred_days, self.params, self.horizon, self.mode, self.finetune,
+                                        self.seed): (asset, chain) for asset, chain in jobs}
+                for done, future in enumerate(as_completed(futures), start = 1):
+                    asset, chain = futures[future]
+                    result = future.result()
+                    self._record(key = key, asset = asset, df = prices[asset], chain = chain, result = result)
+                    status = 'ok' if result['error'] is None else f'failed ({result["error"]})'
+                    print(f'[{done}/{len(jobs)}] {asset} folds {chain[0].fold}-{chain[-1].fold}: {status}')
+
+        return self.metrics(prices = prices)
+
+    def _record(self, key: str, asset: str, df: pd.DataFrame, chain: list[fold], result: dict) -> int:
+        """Store the forecasts of the folds of a chain next to the actual prices.
+
+        Args:
+            * `key` (str): Configuration key.
+            * `asset` (str): Asset name.
+            * `df` (pd.DataFrame): Date and Close columns of the asset.
+            * `chain` (list[fold]): Folds of the chain.
+            * `result` (dict): Output of run_chain().
+
+        Returns:
+            `int`: Number of rows written.
+        """
+
+        dates = df['Date'].to_numpy().astype(str)
+        closes = df['Close'].to_numpy().astype(np.float64)
+        rows = []
+        for f in chain:
+            if f.fold not in result['folds']:
+                continue
+            out = result['folds'][f.fold]
+            for step, (row, predicted) in enumerate(zip(range(f.train_end, f.test_end), out['forecast']), start = 1):
+                rows.append((asset, f.fold, step, dates[f.train_start], dates[f.train_end - 1], dates[row],
+                            float(closes[f.train_end - 1]), float(predicted), float(closes[row]), out['fit_time']))
+        return record_backtest(db = self.db, config = key, model = self.model_name, params = self.config(), rows = rows)
+
+    def metrics(self, prices: dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Metrics of the latest folds of every asset, from the cache.
+
+        Args:
+            * `prices` (dict[str, pd.DataFrame]): Date and Close columns of each asset.
+
+        Returns:
+            `pd.DataFrame`: From backtest_metrics(), with the model name.
+        """
+
+        stored = backtest_folds(db = self.db, config = self.config_key())
+        latest = []
+        for asset, df in prices.items():
+            dates = df['Date'].to_numpy().astype(str)
+            grid = walk_forward_folds(rows = len(dates), train_rows = self.train_rows, horizon = self.horizon, scheme = self.scheme)
+            latest += [(asset, f.fold, dates[f.train_end - 1]) for f in (grid[-self.folds:] if self.folds > 0 else [])]
+        keep = pd.MultiIndex.from_frame(stored.loc[:, ['asset', 'fold', 'train_end']]).isin(latest)
+        metrics = backtest_metrics(df = stored[keep])
+        metrics.insert(1, 'model', self.model_name)
+        return metrics
+
+def backtest_summary(df: pd.DataFrame) -> str:
+    """Format backtest metrics as a table.
+
+    Args:
+        * `df` (pd.DataFrame): Metrics from walk_forward.run().
+
+    Returns:
+        `str`: The summary table.
+    """
+
+    lines = [f'{"Asset":<12}{"Model":<8}{"Day":>5}{"Folds":>7}{"MAE":>12}{"RMSE":>12}{"MAPE %":>9}{"Direction %":>13}']
+    for row in df.itertuples(index = False):
+        day = 'all' if row.step == 0 else str(row.step)
+        lines.append(f'{row.asset:<12}{row.model:<8}{day:>5}{row.folds:>7}{row.mae:>12.4f}{row.rmse:>12.4f}'
+                    f'{row.mape:>9.2f}{row.direction:>13.1f}')
+    return '\n'.join(lines)
@@ -1,23 +1,78 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import sqlite3, os, datetime, time
-import yfinance as yf
+import os, datetime
 import pandas as pd
-from lib.exceptions import DateError
+from typing import Final
+from lib.exceptions import DateError, FetchError
+from lib.ingest import ingestion_engine, fetch_job, FETCH_WORKERS, RATE_LIMIT
+from lib.providers import _provider, get_provider
+from lib.storage import _storage, sqlite_storage
 from lib.utils import dunders
 
+# Leeway between the requested start date and the first stored row (weekends, market holidays).
+START_TOLERANCE: Final[pd.Timedelta] = pd.Timedelta(days = 7)
+
 class data(dunders):
-    """Access data through the Yahoo API and store them in an SQLite local database.
+    """Access data through a market data provider (Yahoo API by default) and store them in a
+    storage backend (an SQLite local database by default).
+
+    Args:
+        * `start` (datetime): Start date for data fetching.
+        * `model_name` (str): Model name, part of the table names.
+        * `incremental` (bool, optional): Only fetch the days missing from the stored tables. Defaults to True.
+        * `provider` (_provider | None, optional): Market data provider. Defaults to None (cached Yahoo provider).
+        * `storage` (_storage | None, optional): Price storage backend. Defaults to None (SQLite tables in
+        the database passed to asset_data()).
+        * `workers` (int, optional): Assets downloaded at once. Defaults to FETCH_WORKERS.
+        * `rate` (float, optional): Provider requests per second, 0 for no limit. Defaults to RATE_LIMIT.
     """
 
-    def __init__(self, start: datetime, model_name: str) -> None:
+    def __init__(self, start: datetime, model_name: str, incremental: bool = True,
+                provider: _provider | None = None, storage: _storage | None = None,
+                workers: int = FETCH_WORKERS, rate: float = RATE_LIMIT) -> None:
         self.start = start
         self.model_name = model_name
+        self.incremental = incremental
+        self.provider = provider
+        if self.provider is None:
+            self.provider = get_provider(name = 'yahoo')
+        self.storage = storage
+        self.workers = workers
+        self.rate = rate
+        self.results = []
         super().__init__()
 
+    def _fetch_range(self, stored: tuple[str, str] | None, begin: str, stop: str) -> tuple[str, bool] | None:
+        """Decide which dates to fetch for an asset.
+
+        Args:
+            * `stored` (tuple[str, str] | None): Stored range of the asset.
+            * `begin` (str): Requested start date.
+            * `stop` (str): Requested end date (exclusive).
+
+        Returns:
+            `tuple[str, bool] | None`: Start date of the fetch and True when only the missing days are fetched.
+            None when the stored data is already up to date.
+        """
+
+        if not self.incremental or stored is None:
+            return begin, False
+
+        first, last = pd.Timestamp(stored[0]), pd.Timestamp(stored[1])
+        begin_ts, stop_ts = pd.Timestamp(begin), pd.Timestamp(stop)
+        if not (begin_ts <= first <= begin_ts + START_TOLERANCE) or last >= stop_ts:
+            return begin, False     # Requested range differs from the stored one, re-download it all.
+
+        fetch_start = last + pd.Timedelta(days = 1)
+        if fetch_start >= stop_ts:
+            return None
+        return fetch_start.date().isoformat(), True
+
     def __data_fetch(self, db: str, type: str, currency: list, begin: str, stop: str) -> bool:
-        """Get data from Yahoo.
+        """Get data from the provider. The assets are downloaded in parallel with rate limits and
+        bounded retries and stored by a single writer. In incremental mode only the days after the
+        last stored date are downloaded and appended to the stored asset data.
 
         Args:
             * `db` (str): Database name used for storage.
@@ -27,45 +82,32 @@ class data(dunders):
             * `stop` (str): End date for data fetching.
 
         Returns:
-            `boolean`: True when operation finishes successfully.
+            `boolean`: True when every asset is stored, False when some downloads failed.
         """
 
-        engine = sqlite3.connect(db)
-        cur = engine.cursor()
-        print('\nConnecting to Yahoo Finance...\n')
-        for i in currency:
-            connected = False
-            while not connected:    # Check connection to Yahoo finance.
-                try:
-                    print(f'Fetching {i} {type} data...\n')
-                    df: pd.DataFrame = yf.download(tickers = i, start = begin, end = stop)
-                    connected = True
-                except Exception as e:
-                    print("type error: " + str(e))
-                    time.sleep(30)
-
-                print(f'\nAdding {i} data to {db} database...\n')                
-
-                df.rename(columns = {"Adj Close": "Adj_Close"}, inplace = True) # Replace white space with _ in column names.
-
-                df = df.reset_index()   # Numerical integer index instead of date index.
-
-                str_to_replace = "-"
-                str_check = any(tables in str_to_replace for tables in i)
-
-                if str_check == True:  # Checks if the "-" character exists. If yes, then it gets replaced with "_".
-                    table = i.replace("-", "_")
-                    table = table + f'_{self.model_name}'
-                    df.to_sql(table, con = engine, if_exists = 'replace', index = True)
-                else:
-                    table = i + f'_{self.model_name}'
-                    df.to_sql(i, con = engine, if_exists = 'replace', index = True)
-                print(f'{i} {type} data saved!\n')
-
-        cur.close()
-        engine.close()
-
-        return True
+        storage = self.storage
+        if storage is None:
+            storage = sqlite_storage(db = db, model_name = self.model_name)
+
+        jobs = []
+        for i in dict.fromkeys(currency):
+            stored = storage.stored_range(ticker = i)
+            fetch = self._fetch_range(stored = stored, begin = begin, stop = stop)
+            if fetch is None:
+                print(f'{i} {type} data is up to date.\n')
+                continue
+            fetch_start, append = fetch
+            jobs.append(fetch_job(ticker = i, start = fetch_start, end = stop, after = stored[1] if append else None))
+        if not jobs:
+            return True
+
+        print(f'\nFetching {len(jobs)} {type} assets from the market data provider...\n')
+        engine = ingestion_engine(provider = self.provider, storage = storage, workers = self.workers, rate = self.rate)
+        self.results = engine.run(jobs = jobs)
+        saved = sum(result.rows for result in self.results)
+        failed = [result.ticker for result in self.results if result.status != 'ok']
+        print(f'\n{saved} {type} rows saved to {db}, {len(jobs) - len(failed)}/{len(jobs)} assets updated.\n')
+        return not failed
 
     def asset_data(self, database: str, asset_type: str, asset_list: list, today = True, 
                 year: str = None, month: str = None, day: str = None) -> bool:
@@ -82,6 +124,7 @@ class data(dunders):
 
         Raises:
             `DateError`: When data is incorrectly selected.
+            `FetchError`: When some assets could not be downloaded. The other assets are stored.
 
         Returns:
             `boolean`: True when operation finishes successfully.
@@ -101,8 +144,11 @@ class data(dunders):
         else:
             db = False
 
-        self.__data_fetch(db = database, type = asset_type, currency = asset_list,
-                        begin = self.start, stop = end_time) # get stock data
+        fetched = self.__data_fetch(db = database, type = asset_type, currency = asset_list,
+                                begin = self.start, stop = end_time) # get stock data
+        if not fetched:
+            failed = ', '.join(f'{result.ticker} ({result.error})' for result in self.results if result.status != 'ok')
+            raise FetchError(f'{asset_type} data could not be downloaded: {failed}')
 
         if db == True:
             print(f'{asset_type} Database has been successfully updated!\n')
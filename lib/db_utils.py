@@ -1,13 +1,109 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import sqlite3
+import os, json, sqlite3, atexit, threading, datetime, uuid
+import numpy as np
 import pandas as pd
-from lib.exceptions import EntryNotFoundError
+from typing import Final
 from lib.utils import dunders
 
+DATE_FORMAT: Final[str] = '%Y-%m-%d %H:%M:%S'   # Format of the dates stored in the tables.
+QUERY_CHUNK_ROWS: Final[int] = 65536   # Rows fetched at a time by query_columns().
+
+# Applied to every pooled connection. WAL lets readers run while a writer commits, busy_timeout
+# makes concurrent writers wait for the lock instead of failing.
+PRAGMAS: Final[dict] = {'journal_mode': 'WAL',
+                        'synchronous': 'NORMAL',
+                        'cache_size': -64000,       # 64 MB page cache.
+                        'mmap_size': 268435456,     # 256 MB memory mapped I/O.
+                        'temp_store': 'MEMORY',
+                        'busy_timeout': 30000}
+
+class connection_pool(dunders):
+    """Pool of SQLite connections, one per database, thread and process. Connections are opened
+    once with the PRAGMAS applied and reused by every helper of this module.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+        self._pid = os.getpid()
+        super().__init__()
+
+    def _reset(self) -> None:
+        """Drop the connections inherited from the parent process after a fork, they must not be shared."""
+
+        self._local = threading.local()
+        self._all = []
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _open(db: str) -> sqlite3.Connection:
+        """Open a connection and apply the PRAGMAS.
+
+        Args:
+            * `db` (str): Database name.
+
+        Returns:
+            `sqlite3.Connection`: Database connection object.
+        """
+
+        con = sqlite3.connect(db, timeout = PRAGMAS['busy_timeout'] / 1000)
+        for pragma, value in PRAGMAS.items():
+            con.execute(f'PRAGMA {pragma} = {value}')
+        return con
+
+    def get(self, db: str) -> sqlite3.Connection:
+        """Connection of the calling thread to a database, opened on first use.
+
+        Args:
+            * `db` (str): Database name.
+
+        Returns:
+            `sqlite3.Connection`: Database connection object.
+        """
+
+        if os.getpid() != self._pid:
+            self._reset()
+        if db == ':memory:':
+            return self._open(db = db)   # Every in-memory connection is its own database.
+
+        conns = self._local.__dict__.setdefault('conns', {})
+        key = os.path.abspath(db)
+        con = conns.get(key)
+        if con is not None:
+            try:
+                con.total_changes   # Raises if the connection was closed by its user.
+                return con
+            except sqlite3.ProgrammingError:
+                pass
+
+        con = self._open(db = db)
+        conns[key] = con
+        with self._lock:
+            self._all.append(con)
+        return con
+
+    def close_all(self) -> None:
+        """Close every connection opened by this process."""
+
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            for con in self._all:
+                try:
+                    con.close()
+                except sqlite3.Error:
+                    pass
+            self._all = []
+        self._local = threading.local()
+
+_POOL: Final[connection_pool] = connection_pool()
+atexit.register(_POOL.close_all)
+
 def db_conn(db: str) -> sqlite3.Connection:
-    """Connect to SQLite3 database.
+    """Pooled connection to an SQLite3 database. It is shared by the calling thread and must not be closed.
 
     Args:
         * `db` (str): Database name.
@@ -15,7 +111,7 @@ def db_conn(db: str) -> sqlite3.Connection:
     Returns:
         `sqlite3.Connection`: Database connection object.
     """
-    return sqlite3.connect(db)   # Read SQLite table into dataframe.
+    return _POOL.get(db = db)
 
 def db_curr(engine: sqlite3.Connection) -> sqlite3.Cursor:
     """Generate SQLite3 cursor object.
@@ -37,26 +133,86 @@ def db_con_curr(db: str) -> tuple[sqlite3.Connection, sqlite3.Cursor]:
     Returns:
         `tuple[sqlite3.Connection, sqlite3.Cursor]`: SQLite3 connection and cursor objects.
     """
-    return sqlite3.connect(db), sqlite3.connect(db).cursor()
+    engine = db_conn(db = db)
+    return engine, engine.cursor()
+
+def bulk_write(db: str, statement: str, rows: list) -> int:
+    """Execute a parameterised write statement for many rows in a single transaction.
+
+    Args:
+        * `db` (str): Database name.
+        * `statement` (str): SQL statement with ? placeholders.
+        * `rows` (list): Parameters of each row.
+
+    Returns:
+        `int`: Number of rows changed.
+    """
+
+    engine = db_conn(db = db)
+    with engine:    # Commits once, rolls back everything on error.
+        cursor = engine.executemany(statement, rows)
+    return cursor.rowcount
 
-def SQLite_Query(database: str, table: str) -> tuple[pd.DataFrame, list]:
-    """Access an SQLite database and query a table. Return the entire table
-    and the dates column as a pandas Dataframe and a list, respectively.
+def table_columns(database: str, table: str) -> list:
+    """Get the column names of a table.
 
     Args:
         * `database` (str): Database name.
         * `table` (str): Table name.
 
     Returns:
-        `tuple[pd.DataFrame, list]`: Pandas Dataframe with the all the queried data
-        and the list of all dates.
+        `list`: Column names in table order.
     """
 
     con = db_conn(db = database)
-    df = pd.read_sql_query("SELECT * from %s" %table, con)
-    dates = df.iloc[:, 1].to_list()
-    con.close()
-    return df, dates
+    return [row[1] for row in con.execute(f'PRAGMA table_info("{table}")')]
+
+def query_columns(database: str, table: str, columns: list | None = None, start: str | None = None,
+                end: str | None = None, dtypes: dict | None = None, arrays: bool = False,
+                date_col: str = 'Date', filters: dict | None = None) -> pd.DataFrame | dict[str, np.ndarray]:
+    """Query only the wanted columns and dates of a table. pandas builds the typed columns
+    straight from the cursor, a chunk of rows at a time.
+
+    Args:
+        * `database` (str): Database name.
+        * `table` (str): Table name.
+        * `columns` (list | None, optional): Columns to query. Defaults to None (all the columns).
+        * `start` (str | None, optional): First date, inclusive. Defaults to None.
+        * `end` (str | None, optional): Last date, inclusive. Defaults to None.
+        * `dtypes` (dict | None, optional): NumPy dtype of each column, the others are inferred. NULL values
+        become NaN in float columns. Defaults to None.
+        * `arrays` (bool, optional): Return a dictionary of arrays instead of a dataframe. Defaults to False.
+        * `date_col` (str, optional): Column of the date range, the rows are sorted by it. Defaults to Date.
+        * `filters` (dict | None, optional): Column to value equality conditions. Defaults to None.
+
+    Returns:
+        `pd.DataFrame | dict[str, np.ndarray]`: NumPy backed dataframe or a column name to array dictionary.
+    """
+
+    if columns is None:
+        columns = table_columns(database = database, table = table)
+    dtypes = {} if dtypes is None else dtypes
+
+    where, params = [], []
+    for col, value in ({} if filters is None else filters).items():
+        where.append(f'"{col}" = ?')
+        params.append(value)
+    if start is not None:
+        where.append(f'"{date_col}" >= ?')
+        params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    if end is not None:
+        where.append(f'"{date_col}" <= ?')
+        params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+    where = f' WHERE {" AND ".join(where)}' if where else ''
+    cols = ', '.join(f'"{c}"' for c in columns)
+
+    # Each chunk of rows is turned into typed columns by pandas, only one chunk of Python values exists at once.
+    chunks = pd.read_sql_query(f'SELECT {cols} FROM "{table}"{where} ORDER BY "{date_col}"', db_conn(db = database),
+                            params = params, dtype = dtypes or None, chunksize = QUERY_CHUNK_ROWS)
+    df = pd.concat(chunks, ignore_index = True)
+    if arrays:
+        return {col: df[col].to_numpy() for col in columns}
+    return df
 
 def get_column(db: str, table: str, col_n: str) -> list:
     """Parse specific column from SQLite3 database into a python list.
@@ -67,101 +223,482 @@ def get_column(db: str, table: str, col_n: str) -> list:
         * `col_n` (str): Column name.
 
     Returns:
-        `list`: List with all column values.
+        `list`: List with all the non NULL column values, with their SQLite types.
     """
 
     cursor = db_con_curr(db = db)[1]
-    cursor.execute("SELECT %s FROM '%s' WHERE %s IS NOT NULL" %(col_n, table, col_n))
-    dat_tmp = cursor.fetchall()
-    data = []
-    for i in dat_tmp:
-        if not i == None:
-            i = str(i)  # tuple to string.
-            i = i.replace('(',"").replace(')',"").replace(',',"").strip()
-            data.append(i)
-    return data
-
-class table_utils(dunders):
-    def __init__(self, dbname: str, asset_n: str) -> None:
-        self.dbname = dbname
-        self.asset_n = asset_n
-        super().__init__()
+    cursor.execute('SELECT "%s" FROM "%s" WHERE "%s" IS NOT NULL' %(col_n, table, col_n))
+    return [row[0] for row in cursor.fetchall()]
 
-    def table_parser(self, df: pd.DataFrame) -> bool:
-        """Send data from dataframe to a database.
+def model_lineage(db: str, key: str, parent: str | None, asset: str, model: str,
+                mode: str, rows_added: int | None) -> bool:
+    """Record the lineage of a trained model: the cached model it was fine-tuned from and
+    the number of rows added since.
 
-        Args:
-            * `df` (pd.Dataframe): Dataframe with the data.
-            * `dbname` (str): Database name (full or relative path).
-            * `asset_n` (str): Asset name as it is stored in the database table name.
+    Args:
+        * `db` (str): Database name.
+        * `key` (str): Model registry key of the trained model.
+        * `parent` (str | None): Model registry key of the parent model, None for a full training.
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+        * `mode` (str): Training mode, full or fine_tune.
+        * `rows_added` (int | None): Rows appended since the parent model was trained.
 
-        Returns:
-            `boolean`: True when operation finishes successfully.
-        """
+    Returns:
+        `boolean`: True when operation finishes successfully.
+    """
 
-        engine = db_conn(db = self.dbname)
-        cursor = db_curr(engine = engine)
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-        cursor.execute("SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name='%s'" %self.asset_n)
-        if cursor.fetchone()[0] == 1:
-            df.to_sql(self.asset_n, con = engine, if_exists = 'replace', index = True)
-            cursor.close()
-        else:
-            # might be a useless operation, while have to assess.
-            df.to_sql(self.asset_n, con = engine, if_exists = 'replace', index = True)
-            cursor.close()
+    engine = db_conn(db = db)
+    with engine:
+        engine.execute("CREATE TABLE IF NOT EXISTS model_lineage (key TEXT PRIMARY KEY, parent TEXT, "
+                    "asset TEXT, model TEXT, mode TEXT, rows_added INTEGER, created TEXT)")
+        engine.execute("INSERT OR REPLACE INTO model_lineage VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+                    (key, parent, asset, model, mode, rows_added))
+    return True
 
-        return True
+def record_trial(db: str, sweep_id: str, asset: str, strategy: str, trial: dict) -> bool:
+    """Insert or update a hyperparameter sweep trial in the sweep_trials table.
 
-    ## Potential depracation.
-    def table_renamer(self, rename: str) -> bool:
-        engine = db_conn(db = self.dbname)
-        cursor = db_curr(engine = engine)
-        cursor.execute("ALTER TABLE '%s' RENAME TO '%s'" %(self.asset_n, rename))
-        cursor.close()
-        return True
+    Args:
+        * `db` (str): Database name.
+        * `sweep_id` (str): Sweep identifier from new_run_id().
+        * `asset` (str): Asset name.
+        * `strategy` (str): Search strategy of the sweep.
+        * `trial` (dict): trial number, rung, params, epochs budget, epochs_run, val_loss, loss, wall_time,
+        status and error of the trial.
+
+    Returns:
+        `boolean`: True when operation finishes successfully.
+    """
 
-def get_entry(db: str, d: str, table: str) -> tuple:
-    """Get row from database, specified by the data column.
+    engine = db_conn(db = db)
+    with engine:
+        engine.execute("CREATE TABLE IF NOT EXISTS sweep_trials (sweep_id TEXT NOT NULL, trial INTEGER NOT NULL, "
+                    "rung INTEGER NOT NULL, asset TEXT, strategy TEXT, params TEXT, epochs INTEGER, epochs_run INTEGER, "
+                    "val_loss REAL, loss REAL, wall_time REAL, status TEXT, error TEXT, created TEXT, "
+                    "PRIMARY KEY (sweep_id, trial, rung))")
+        engine.execute("INSERT OR REPLACE INTO sweep_trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                    (sweep_id, trial['trial'], trial['rung'], asset, strategy, json.dumps(trial['params'], sort_keys = True),
+                    trial['epochs'], trial.get('epochs_run'), trial.get('val_loss'), trial.get('loss'), trial.get('wall_time'),
+                    trial['status'], trial.get('error')))
+    return True
+
+def sweep_trials(db: str, sweep_id: str) -> pd.DataFrame:
+    """Trials of a hyperparameter sweep, the best validation loss of the last rung first.
 
     Args:
         * `db` (str): Database name.
-        * `d` (str): Date as string.
-        * `table` (str): Table name.
+        * `sweep_id` (str): Sweep identifier.
 
-    Raises:
-        `EntryNotFoundError`: If date entry is not in the database.
+    Returns:
+        `pd.DataFrame`: Rows of the sweep_trials table, params decoded into dictionaries.
+    """
+
+    engine = db_conn(db = db)
+    cursor = engine.execute("SELECT * FROM sweep_trials WHERE sweep_id = ? ORDER BY rung DESC, val_loss IS NULL, val_loss",
+                            (sweep_id,))
+    df = pd.DataFrame(cursor.fetchall(), columns = [col[0] for col in cursor.description])
+    df['params'] = df['params'].map(json.loads)
+    return df
+
+def new_run_id() -> str:
+    """Identifier of an analysis run, sortable by start time.
 
     Returns:
-        `tuple`: Resulting row from query.
+        `str`: Run identifier.
     """
 
-    cursor = db_con_curr(db = db)[1]
-    cursor.execute("SELECT * FROM '%s' WHERE Dates='%s'" %(table, d))
-    tmp = cursor.fetchall()
-    all_data = []
-    for i in tmp:
-        if None in i:
+    return f'{datetime.datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+
+def _add_columns(engine: sqlite3.Connection, table: str, columns: dict[str, str]) -> list:
+    """Add the columns missing from a table created by an older version. CREATE TABLE IF NOT EXISTS
+    leaves existing tables untouched, so every column added to a schema later goes through here.
+
+    Args:
+        * `engine` (sqlite3.Connection): Database connection.
+        * `table` (str): Table name.
+        * `columns` (dict[str, str]): SQL type of each column added since the table was first created.
+
+    Returns:
+        `list`: Names of the added columns.
+    """
+
+    stored = {row[1] for row in engine.execute(f'PRAGMA table_info("{table}")')}
+    added = []
+    for col, sql_type in columns.items():
+        if col in stored:
+            continue
+        try:
+            with engine:
+                engine.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {sql_type}')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column' not in str(e):    # Otherwise added meanwhile by another process.
+                raise
             continue
-        else:
-            all_data.append(i)
-
-    if len(all_data) > 1:   # If there is more than one entry of the same date,
-                            # get the one with the best percent difference.
-        all_percent_diff = []
-        for k in all_data:
-            percent_diff = k[-1]
-            all_percent_diff.append(percent_diff)
-        all_percent_diff = [float(x) for x in all_percent_diff] # convert to list of floats.
-        smallest_diff = min(all_percent_diff)
-        for m in all_data:
-            if smallest_diff in m:
-                return tuple(m)
-            else:
-                continue
-
-    elif len(all_data) == 1:
-        return tuple(all_data[0])
+        added.append(col)
+    return added
+
+def _history_schema(engine: sqlite3.Connection) -> None:
+    """Create the runs, predictions, forecasts and streams tables of the prediction history.
+
+    Args:
+        * `engine` (sqlite3.Connection): Database connection.
+    """
+
+    with engine:
+        engine.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, asset TEXT NOT NULL, "
+                    "model TEXT NOT NULL, created TEXT NOT NULL, next_day REAL, volatility REAL, "
+                    "asset_type TEXT, currency TEXT)")
+        engine.execute("CREATE INDEX IF NOT EXISTS ix_runs_asset_model_created ON runs (asset, model, created)")
+        engine.execute("CREATE TABLE IF NOT EXISTS predictions (run_id TEXT NOT NULL, asset TEXT NOT NULL, "
+                    "model TEXT NOT NULL, date TEXT NOT NULL, predicted REAL, actual REAL, diff REAL, pct_diff REAL, "
+                    "PRIMARY KEY (run_id, asset, model, date))")
+        engine.execute("CREATE INDEX IF NOT EXISTS ix_predictions_asset_model_date ON predictions (asset, model, date)")
+        engine.execute("CREATE TABLE IF NOT EXISTS forecasts (run_id TEXT NOT NULL, step INTEGER NOT NULL, "
+                    "date TEXT NOT NULL, forecast REAL, mode TEXT, PRIMARY KEY (run_id, step))")
+        engine.execute("CREATE TABLE IF NOT EXISTS streams (run_id TEXT PRIMARY KEY, bars INTEGER NOT NULL, "
+                    "last_date TEXT, updated TEXT)")
+    _add_columns(engine = engine, table = 'runs', columns = {'asset_type': 'TEXT', 'currency': 'TEXT'})   # Since the dashboard server.
+
+def record_run(db: str, run_id: str, asset: str, model: str, next_day: float | None = None,
+            volatility: float | None = None, asset_type: str | None = None, currency: str | None = None) -> bool:
+    """Insert or update an analysis run in the runs table.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier from new_run_id().
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+        * `next_day` (float | None, optional): Next day prediction. Defaults to None.
+        * `volatility` (float | None, optional): Volatility percentage. Defaults to None.
+        * `asset_type` (str | None, optional): Asset type e.g. crypto. Defaults to None.
+        * `currency` (str | None, optional): Currency symbol of the asset. Defaults to None.
+
+    Returns:
+        `boolean`: True when operation finishes successfully.
+    """
+
+    engine = db_conn(db = db)
+    _history_schema(engine = engine)
+    with engine:
+        engine.execute("INSERT INTO runs (run_id, asset, model, created, next_day, volatility, asset_type, currency) "
+                    "VALUES (?, ?, ?, datetime('now'), ?, ?, ?, ?) ON CONFLICT(run_id) DO UPDATE SET "
+                    "next_day = excluded.next_day, volatility = excluded.volatility",
+                    (run_id, asset, model, next_day, volatility, asset_type, currency))
+    return True
+
+def record_predictions(db: str, run_id: str, asset: str, model: str, df: pd.DataFrame) -> int:
+    """Upsert the assessed test predictions of a run into the predictions table. Earlier runs are kept.
 
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier from new_run_id().
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+        * `df` (pd.DataFrame): Dates, Real_Values, Predicted_Values, Difference and Percent_Difference columns.
+
+    Returns:
+        `int`: Number of rows written.
+    """
+
+    _history_schema(engine = db_conn(db = db))
+    dates = pd.to_datetime(df['Dates']).dt.strftime(DATE_FORMAT)
+    values = df.loc[:, ['Predicted_Values', 'Real_Values', 'Difference', 'Percent_Difference']].astype('float64')
+    rows = [(run_id, asset, model, date, *vals) for date, vals in zip(dates, values.itertuples(index = False, name = None))]
+    return bulk_write(db = db, statement = "INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(run_id, asset, model, date) DO UPDATE SET predicted = excluded.predicted, "
+                    "actual = excluded.actual, diff = excluded.diff, pct_diff = excluded.pct_diff", rows = rows)
+
+def record_forecast(db: str, run_id: str, df: pd.DataFrame, mode: str) -> int:
+    """Upsert the forecast of the next days of a run into the forecasts table, one row per day.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier from new_run_id().
+        * `df` (pd.DataFrame): Date and Forecast columns, one row per forecast day.
+        * `mode` (str): Forecasting mode, direct or recursive.
+
+    Returns:
+        `int`: Number of rows written.
+    """
+
+    _history_schema(engine = db_conn(db = db))
+    dates = pd.to_datetime(df['Date']).dt.strftime(DATE_FORMAT)
+    rows = [(run_id, step, date, float(value), mode) for step, (date, value) in enumerate(zip(dates, df['Forecast']), start = 1)]
+    return bulk_write(db = db, statement = "INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?)", rows = rows)
+
+def copy_predictions(db: str, run_id: str, source: str) -> int:
+    """Copy the predictions of a run into another run.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier of the copy.
+        * `source` (str): Run identifier of the copied predictions.
+
+    Returns:
+        `int`: Number of rows copied.
+    """
+
+    engine = db_conn(db = db)
+    _history_schema(engine = engine)
+    with engine:
+        return engine.execute("INSERT OR REPLACE INTO predictions SELECT ?, asset, model, date, predicted, actual, diff, "
+                            "pct_diff FROM predictions WHERE run_id = ?", (run_id, source)).rowcount
+
+def record_stream(db: str, run_id: str, next_day: float, df: pd.DataFrame, mode: str, bars: int, last_date: str,
+                predicted: float | None = None, actual: float | None = None) -> int:
+    """Store the forecast of a streaming run after a new bar, in one transaction: the prediction of the
+    bar day, the next day prediction of the run, its forecast and the bar count and last date of the stream.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier, recorded with record_run().
+        * `next_day` (float): Next day prediction.
+        * `df` (pd.DataFrame): Date and Forecast columns, one row per forecast day.
+        * `mode` (str): Forecasting mode, direct or recursive.
+        * `bars` (int): Bars received by the stream so far.
+        * `last_date` (str): Date of the latest bar.
+        * `predicted` (float | None, optional): Prediction of the latest bar day, made on the previous bar. Defaults to None.
+        * `actual` (float | None, optional): Close of the latest bar. Defaults to None.
+
+    Returns:
+        `int`: Number of forecast rows written.
+    """
+
+    engine = db_conn(db = db)
+    _history_schema(engine = engine)
+    rows = [(run_id, step, date, float(value), mode) for step, (date, value) in enumerate(zip(df['Date'], df['Forecast']), start = 1)]
+    with engine:
+        if predicted is not None and actual is not None:
+            diff = predicted - actual
+            engine.execute("INSERT OR REPLACE INTO predictions SELECT run_id, asset, model, ?, ?, ?, ?, ? FROM runs "
+                        "WHERE run_id = ?", (last_date, predicted, actual, diff, diff / actual * 100, run_id))
+        engine.execute("UPDATE runs SET next_day = ? WHERE run_id = ?", (next_day, run_id))
+        engine.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?)", rows)
+        engine.execute("INSERT OR REPLACE INTO streams VALUES (?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+                    (run_id, bars, last_date))
+    return len(rows)
+
+def stream_version(db: str, run_id: str) -> str | None:
+    """Version of a streaming run, changes with every stored bar.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier.
+
+    Returns:
+        `str | None`: Bar count and update time, None for runs that are not streamed.
+    """
+
+    engine = db_conn(db = db)
+    if engine.execute("SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name='streams'").fetchone()[0] == 0:
+        return None
+    row = engine.execute("SELECT bars, updated FROM streams WHERE run_id = ?", (run_id,)).fetchone()
+    return None if row is None else f'{row[0]}@{row[1]}'
+
+def run_forecast(db: str, run_id: str) -> pd.DataFrame:
+    """Forecast of the next days of a run, sorted by date.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier.
+
+    Returns:
+        `pd.DataFrame`: date, forecast and mode columns, empty for runs without a stored forecast.
+    """
+
+    _history_schema(engine = db_conn(db = db))
+    return query_columns(database = db, table = 'forecasts', columns = ['date', 'forecast', 'mode'], date_col = 'date',
+                        filters = {'run_id': run_id}, dtypes = {'forecast': 'float64'})
+
+def latest_run(db: str, asset: str, model: str) -> str | None:
+    """Latest run of an asset and model.
+
+    Args:
+        * `db` (str): Database name.
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+
+    Returns:
+        `str | None`: Run identifier, None if the asset was never analysed.
+    """
+
+    engine = db_conn(db = db)
+    _history_schema(engine = engine)
+    row = engine.execute("SELECT run_id FROM runs WHERE asset = ? AND model = ? ORDER BY created DESC, run_id DESC LIMIT 1",
+                        (asset, model)).fetchone()
+    return None if row is None else row[0]
+
+def get_run(db: str, run_id: str) -> dict | None:
+    """Row of a run in the runs table.
+
+    Args:
+        * `db` (str): Database name.
+        * `run_id` (str): Run identifier.
+
+    Returns:
+        `dict | None`: The run, None if it is not stored.
+    """
+
+    engine = db_conn(db = db)
+    _history_schema(engine = engine)
+    cursor = engine.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+    row = cursor.fetchone()
+    return None if row is None else {col[0]: value for col, value in zip(cursor.description, row)}
+
+def latest_runs(db: str) -> list[dict]:
+    """Latest run of every asset and model stored in a database.
+
+    Args:
+        * `db` (str): Database name.
+
+    Returns:
+        `list[dict]`: Rows of the runs table, sorted by asset and model.
+    """
+
+    engine = db_conn(db = db)
+    if engine.execute("SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name='runs'").fetchone()[0] == 0:
+        return []
+    cursor = engine.execute("SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY asset, model "
+                            "ORDER BY created DESC, run_id DESC) AS rank FROM runs) WHERE rank = 1 ORDER BY asset, model")
+    cols = [col[0] for col in cursor.description]
+    return [{col: value for col, value in zip(cols, row) if col != 'rank'} for row in cursor.fetchall()]
+
+def prediction_history(db: str, asset: str, model: str, run_id: str | None = None,
+                    start: str | None = None, end: str | None = None) -> pd.DataFrame:
+    """Predictions of a run, sorted by date.
+
+    Args:
+        * `db` (str): Database name.
+        * `asset` (str): Asset name.
+        * `model` (str): Model name.
+        * `run_id` (str | None, optional): Run identifier. Defaults to None (latest run).
+        * `start` (str | None, optional): First date, inclusive. Defaults to None.
+        * `end` (str | None, optional): Last date, inclusive. Defaults to None.
+
+    Returns:
+        `pd.DataFrame`: date, predicted, actual, diff and pct_diff columns.
+    """
+
+    if run_id is None:
+        run_id = latest_run(db = db, asset = asset, model = model)
     else:
-        raise EntryNotFoundError(f"Unable to locate entry '{d}' in database: {db}")
\ No newline at end of file
+        _history_schema(engine = db_conn(db = db))
+    return query_columns(database = db, table = 'predictions', columns = ['date', 'predicted', 'actual', 'diff', 'pct_diff'],
+                        start = start, end = end, date_col = 'date', filters = {'run_id': run_id, 'asset': asset, 'model': model},
+                        dtypes = {'predicted': 'float64', 'actual': 'float64', 'diff': 'float64', 'pct_diff': 'float64'})
+
+def _risk_schema(engine: sqlite3.Connection) -> None:
+    """Create the risk_metrics table, one row per asset, rolling window and date.
+
+    Args:
+        * `engine` (sqlite3.Connection): Database connection.
+    """
+
+    with engine:
+        engine.execute("CREATE TABLE IF NOT EXISTS risk_metrics (asset TEXT NOT NULL, window INTEGER NOT NULL, "
+                    "date TEXT NOT NULL, volatility REAL, max_drawdown REAL, sharpe REAL, sortino REAL, beta REAL, "
+                    "var REAL, PRIMARY KEY (asset, window, date))")
+
+def record_risk(db: str, rows: list) -> int:
+    """Upsert rolling risk metrics into the risk_metrics table.
+
+    Args:
+        * `db` (str): Database name.
+        * `rows` (list): asset, window, date, volatility, max_drawdown, sharpe, sortino, beta and var of each row.
+
+    Returns:
+        `int`: Number of rows written.
+    """
+
+    _risk_schema(engine = db_conn(db = db))
+    return bulk_write(db = db, statement = "INSERT OR REPLACE INTO risk_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows = rows)
+
+def risk_last_dates(db: str, window: int) -> dict[str, str]:
+    """Last date with stored risk metrics of every asset.
+
+    Args:
+        * `db` (str): Database name.
+        * `window` (int): Rolling window in days.
+
+    Returns:
+        `dict[str, str]`: Last date by asset name.
+    """
+
+    engine = db_conn(db = db)
+    _risk_schema(engine = engine)
+    return dict(engine.execute("SELECT asset, MAX(date) FROM risk_metrics WHERE window = ? GROUP BY asset", (window,)).fetchall())
+
+def risk_history(db: str, asset: str, window: int, start: str | None = None, end: str | None = None) -> pd.DataFrame:
+    """Rolling risk metrics of an asset, sorted by date.
+
+    Args:
+        * `db` (str): Database name.
+        * `asset` (str): Asset name.
+        * `window` (int): Rolling window in days.
+        * `start` (str | None, optional): First date, inclusive. Defaults to None.
+        * `end` (str | None, optional): Last date, inclusive. Defaults to None.
+
+    Returns:
+        `pd.DataFrame`: date, volatility, max_drawdown, sharpe, sortino, beta and var columns.
+    """
+
+    _risk_schema(engine = db_conn(db = db))
+    metrics = ['volatility', 'max_drawdown', 'sharpe', 'sortino', 'beta', 'var']
+    return query_columns(database = db, table = 'risk_metrics', columns = ['date', *metrics], start = start, end = end,
+                        date_col = 'date', filters = {'asset': asset, 'window': window}, dtypes = dict.fromkeys(metrics, 'float64'))
+
+def _backtest_schema(engine: sqlite3.Connection) -> None:
+    """Create the backtests table, one row per configuration, and the backtest_folds table, one row per
+    fold and forecast day.
+
+    Args:
+        * `engine` (sqlite3.Connection): Database connection.
+    """
+
+    with engine:
+        engine.execute("CREATE TABLE IF NOT EXISTS backtests (config TEXT PRIMARY KEY, model TEXT NOT NULL, "
+                    "params TEXT, created TEXT)")
+        engine.execute("CREATE TABLE IF NOT EXISTS backtest_folds (config TEXT NOT NULL, asset TEXT NOT NULL, "
+                    "fold INTEGER NOT NULL, step INTEGER NOT NULL, train_start TEXT, train_end TEXT, date TEXT, "
+                    "last REAL, predicted REAL, actual REAL, fit_time REAL, PRIMARY KEY (config, asset, fold, step))")
+
+def record_backtest(db: str, config: str, model: str, params: dict, rows: list) -> int:
+    """Store the forecasts of backtest folds.
+
+    Args:
+        * `db` (str): Database name.
+        * `config` (str): Backtest configuration key.
+        * `model` (str): Model name.
+        * `params` (dict): Backtest configuration, stored once.
+        * `rows` (list): asset, fold, step, train_start, train_end, date, last, predicted, actual and fit_time of each row.
+
+    Returns:
+        `int`: Number of rows written.
+    """
+
+    engine = db_conn(db = db)
+    _backtest_schema(engine = engine)
+    with engine:
+        engine.execute("INSERT OR IGNORE INTO backtests VALUES (?, ?, ?, datetime('now'))",
+                    (config, model, json.dumps(params, sort_keys = True)))
+    return bulk_write(db = db, statement = f"INSERT OR REPLACE INTO backtest_folds VALUES ({', '.join('?' * 11)})",
+                    rows = [(config, *row) for row in rows])
+
+def backtest_folds(db: str, config: str) -> pd.DataFrame:
+    """Stored forecasts of the folds of a backtest configuration.
+
+    Args:
+        * `db` (str): Database name.
+        * `config` (str): Backtest configuration key.
+
+    Returns:
+        `pd.DataFrame`: asset, fold, step, train_start, train_end, date, last, predicted, actual and fit_time
+        columns, sorted by asset, fold and step.
+    """
+
+    engine = db_conn(db = db)
+    _backtest_schema(engine = engine)
+    cursor = engine.execute("SELECT asset, fold, step, train_start, train_end, date, last, predicted, actual, fit_time "
+                            "FROM backtest_folds WHERE config = ? ORDER BY asset, fold, step", (config,))
+    return pd.DataFrame(cursor.fetchall(), columns = [col[0] for col in cursor.description])
\ No newline at end of file
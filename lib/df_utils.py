@@ -95,7 +95,8 @@ class df_analyses(_df_ops, dunders):
         return self._get_col_numpy(idx = 2), self._get_col_numpy(idx = 1)
 
     def _row_subtract(self) -> np.ndarray:
-        return np.subtract(self._actual_pred_numpy()[0], self._actual_pred_numpy()[1])
+        pred, actual = self._actual_pred_numpy()
+        return np.subtract(pred, actual)
 
     def _percent_diff(self) -> np.ndarray:
         pred, actual = self._actual_pred_numpy()
@@ -103,9 +104,8 @@ class df_analyses(_df_ops, dunders):
         return np.true_divide(difference, actual)
 
     def assessment_df_parser(self) -> pd.DataFrame:
-        result_diff = self._row_subtract()
-        self.df['Difference'] = result_diff.tolist()
-        self.df['Percent_Difference'] =  self._percent_diff().tolist()
+        self.df['Difference'] = self._row_subtract()    # Arrays keep the dtype of the values.
+        self.df['Percent_Difference'] = self._percent_diff()
         return self.df
 
     @staticmethod
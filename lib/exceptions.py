@@ -93,6 +93,40 @@ class NoParameterError(Exception):
 
     __module__ = 'builtins'
 
+    def __init__(self, *args) -> None:
+        if args:
+            self.errmessage = args[0]
+        else:
+            self.errmessage = None
+
+    def __repr__(self) -> str:
+        if self.errmessage:
+            return '{0} '.format(self.errmessage)
+        else:
+            return f'{self.__class__.__name__} has been raised.'
+
+class SplitError(Exception):
+    """Custom exception class raised when the train/test split is invalid."""
+
+    __module__ = 'builtins'
+
+    def __init__(self, *args) -> None:
+        if args:
+            self.errmessage = args[0]
+        else:
+            self.errmessage = None
+
+    def __repr__(self) -> str:
+        if self.errmessage:
+            return '{0} '.format(self.errmessage)
+        else:
+            return f'{self.__class__.__name__} has been raised.'
+
+class FetchError(Exception):
+    """Custom exception class raised when asset data could not be downloaded."""
+
+    __module__ = 'builtins'
+
     def __init__(self, *args) -> None:
         if args:
             self.errmessage = args[0]
@@ -1,18 +1,28 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-from sklearn.preprocessing import MinMaxScaler
 from dataclasses import dataclass
-from lib.model_methods import models, test_preprocessing, plot_data, next_day_prediction, plot_volatility
-import yfinance as yf
-import datetime as dt
+from lib.model_methods import models, test_preprocessing, plot_data, horizon_prediction, next_day_message, plot_volatility
 import pandas as pd
 import numpy as np
 from lib.utils import dunders
+from lib.model_registry import model_registry
+from lib.db_utils import model_lineage
+from lib.inference import output_width
+from lib.risk import annualized_volatility, log_returns, TRADING_DAYS
+from lib.windows import window_dataset, window_targets
+from lib.instrument import stage
 from itertools import cycle
 from threading import Thread
 from time import sleep
 import sys
+from typing import Final, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import MinMaxScaler
+
+# Columns of the assessment table read back for the dashboard.
+ASSESSMENT_COLUMNS: Final[tuple] = ('Date', 'Adj_Close', 'Predicted_Values', 'Difference', 'Percent_Difference')
 
 class financial_assets(dunders):
     """Financial asset class for price predictions.
@@ -37,35 +47,51 @@ class financial_assets(dunders):
             `pd.DataFrame`: The 3 column DataFrame.
         """
 
-        real = np.ndarray.tolist(real)
-        pred = np.ndarray.tolist(pred)
-        pred = [val for vals in pred for val in vals]   # Flatten pred list of lists.
         cols = ['Dates', 'Real_Values', 'Predicted_Values']
-        return pd.DataFrame({cols[0]: d, cols[1]: real, cols[2]: pred})
+        return pd.DataFrame({cols[0]: d, cols[1]: np.asarray(real), cols[2]: np.reshape(pred, -1)})    # Dtypes are kept.
 
     def predictor(self, model: str, x: list, x_train: np.ndarray, y_train: np.ndarray,
                 asset_scaler: MinMaxScaler, tick: str, query_asset: pd.DataFrame, 
                 asset_currency_symbol: str, drop: float, optimizer: str,
                 loss: str, epoch: int, batch: int, dimensionality: int, 
                 closing: int, any_p: bool = False,
-                volat_p: bool = False) -> tuple[pd.DataFrame, float, str]:
+                volat_p: bool = False, track: bool = True,
+                registry: model_registry | None = None,
+                retrain: bool = False, finetune: dict | None = None,
+                db: str | None = None,
+                split_idx: int = 0, horizon_mode: str = 'direct') -> tuple[pd.DataFrame, float, str, np.ndarray]:
 
         """Financial asset predictor.
 
         Args:
-            * `x` (list): List of values for the x-axis.
+            * `x` (list): List of values for the x-axis, one per row of query_asset.
             * `x_train` (np.ndarray): Numpy array with x axis training set.
             * `y_train` (np.ndarray): Numpy array with y axis training set.
             * `asset_scaler` (MinMaxScaler): Feature scaler array containing numbers scaled to dataset range.
-            * `tick` (str): Asset name to download data for.
-            * `query_asset` (pd.DataFrame): Asset pandas dataframe.
+            Replaced by the scaler saved with a cached or warm started model, the scale the model learnt.
+            * `tick` (str): Asset name.
+            * `query_asset` (pd.DataFrame): Asset pandas dataframe, both the training and test rows.
             * `asset_currency_symbol` (str): Currency symbol of asset.
             * `volat_p` (bool, default = False): Plot the volatility log graph.
             * `drop` (int | float): Model Dropout. Default is 0.2.
+            * `track` (bool, default = True): Display the training progress animation. Disabled for batch runs
+            where several workers share the same terminal.
+            * `registry` (model_registry | None, default = None): Cache of trained models. A cached model trained
+            on the same data with the same hyperparameters is loaded instead of training a new one.
+            * `retrain` (bool, default = False): Ignore the cached models, the new model still replaces it.
+            * `finetune` (dict | None, default = None): Warm start settings: `max_rows`, the maximum number of days
+            appended since the cached model, `replay`, the number of older windows replayed and `epochs`.
+            When None, a new model is always trained on a cache miss.
+            * `db` (str | None, default = None): Database where the lineage of the trained model is recorded.
+            * `split_idx` (int, default = 0): First row of query_asset in the test set, the model was trained on the
+            rows before it. 0 when the model was trained on all the rows.
+            * `closing` (int): Days forecast after the last day.
+            * `horizon_mode` (str, default = 'direct'): direct, the model has one output per forecast day and
+            y_train one target per day, or recursive, the model predicts the next day and is rolled out.
 
         Returns:
-        `tuple[pd.DataFrame, float, str]`: All data output DataFrame, the prediction for the 
-        next day, the mean percentage volatility as a string.
+        `tuple[pd.DataFrame, float, str, np.ndarray]`: All data output DataFrame, the prediction for the 
+        next day, the mean percentage volatility as a string and the forecast prices of the next closing days.
         """
 
         training_complete = False
@@ -91,91 +117,178 @@ class financial_assets(dunders):
             print(LINE_UP, end = LINE_CLEAR)
             sys.stdout.write('\rTraining Complete!     ')
 
-        # Training starts.
-        training_message = 'Training the LSTM-RNN model'
-        training_track_thread = Thread(target = _training_tracking, kwargs = {'message':training_message})
-        training_track_thread.start()
-
-        models_instance = models(dropout = drop, loss_function = loss, epoch = epoch, batch = batch)
-
-        if model == 'RNN':
-            asset_model = models_instance.LSTM_RNN(x = x_train, y = y_train, units = dimensionality, closing_value = closing,
-                                    optimize = optimizer)
-
-        sleep(0.1)
-        training_complete = True
-
-        # Test data.
-        test_start = dt.datetime(2019, 11, 1)
-        test_end = dt.datetime.now().date().isoformat()   # Today.
-        test_data: pd.DataFrame = yf.download(tickers = tick, start = test_start,
-                                            end = test_end) # Get test data from Yahoo.
-
-        actual_prices = test_data['Close'].values   # Get closing prices.
-        asset_dataset = pd.concat((query_asset['Close'], test_data['Close']), axis = 0)
-        model_inputs = asset_dataset[len(asset_dataset) - len(test_data) - self.pred_days:].values
-        model_inputs = model_inputs.reshape(-1, 1)
-        model_inputs: np.ndarray = asset_scaler.transform(model_inputs) # Data scaled according to the scaler.
-
-        # Make predictions on test data.
-        x_test = test_preprocessing(self.pred_days, model_inputs)
-        pred_prices: np.ndarray = asset_model.predict(x_test, verbose = 0)
-        pred_prices: np.ndarray = asset_scaler.inverse_transform(pred_prices)
-        dates = plot_data(x_values = x, name = tick, dtype = self.asset_type, 
-                                actual = actual_prices, predicted = pred_prices, 
-                                colour_actual = "blue", colour_predicted = "red", plot = self.plot)
-
-        all_data = self.df_act_pred(real = actual_prices, pred = pred_prices, d = dates)
-
-        # Predict next day
-        next_day = next_day_prediction(input = model_inputs, name = tick, 
-                                        type = self.asset_type, prediction_days = self.pred_days,
-                                        currency = asset_currency_symbol, model = asset_model, 
-                                        scaler = asset_scaler)
-
-        # Volatility
-        asset_copy = query_asset.copy()   # Copy of dataframe to add a new column for volatility.
-
-        # Creates a column called 'Log returns' with the daily log return of the Close price.
-        asset_copy['Log returns'] = np.log(query_asset['Close']/query_asset['Close'].shift())
-        volatility: int | float = asset_copy['Log returns'].std() * 252 **.5   # 255 is the trading days per annum. **.5 is square root.
+        width = output_width(horizon = closing, mode = horizon_mode)   # Outputs of the model.
+        params = {'model': model, 'pred_days': self.pred_days, 'units': dimensionality, 'dropout': drop,
+                'optimizer': optimizer, 'loss': loss, 'epoch': epoch, 'batch': batch, 'closing': width}
+        with stage('fit') as fit_stage:
+            asset_model = None
+            cached = False
+            parent = None
+            if registry is not None:
+                train_asset = query_asset.iloc[:split_idx] if split_idx else query_asset
+                model_ident = registry.model_ident(asset = tick, df = train_asset, params = params)
+                model_key = registry.model_key(ident = model_ident)
+                if not retrain:
+                    meta = registry.metadata(key = model_key)
+                    stored_scaler = registry.load_scaler(meta = meta)
+                    # Fine-tuned models are on the scale of their parent, unusable without their saved scaler.
+                    if meta is not None and (stored_scaler is not None or meta.get('parent') is None):
+                        asset_model = registry.load(key = model_key)
+                    cached = asset_model is not None
+                    if cached and stored_scaler is not None:
+                        asset_scaler = stored_scaler
+                    if not cached and finetune is not None:     # Only new days since the last model, warm start it.
+                        parent = registry.warm_start(ident = model_ident, df = train_asset, max_rows = finetune['max_rows'])
+                        parent_scaler = registry.load_scaler(meta = parent)
+                        if parent_scaler is not None:   # Otherwise a full train, the model scale is unknown.
+                            asset_model = registry.load(key = parent['key'])
+                        if asset_model is None:
+                            parent = None
+
+            if cached:
+                print(f'Using the cached {model} model of {tick}, trained on the same data.')
+            else:
+                rows_added = None if parent is None else model_ident['rows'] - parent['rows']
+
+                # Training starts.
+                if parent is None:
+                    training_message = 'Training the LSTM-RNN model'
+                else:
+                    training_message = f'Fine-tuning the LSTM-RNN model on {rows_added} new days'
+                if track:
+                    training_track_thread = Thread(target = _training_tracking, kwargs = {'message':training_message})
+                    training_track_thread.start()
+
+                models_instance = models(dropout = drop, loss_function = loss, epoch = epoch, batch = batch)
+
+                if parent is not None:  # Windows on the scale the parent model learnt.
+                    asset_scaler = parent_scaler
+                    x_train, y_train = window_targets(asset_scaler.transform(train_asset['Close'].to_numpy().reshape(-1, 1)),
+                                                    window = self.pred_days, horizon = width)
+                    asset_model = models_instance.fine_tune(model = asset_model, x = x_train, y = y_train, new_windows = rows_added,
+                                                        replay = finetune['replay'], epochs = finetune['epochs'])
+                elif model == 'RNN':
+                    asset_model = models_instance.LSTM_RNN(x = x_train, y = y_train, units = dimensionality, closing_value = width,
+                                            optimize = optimizer)
+
+                sleep(0.1)
+                training_complete = True
+
+                if registry is not None:
+                    parent_key = None if parent is None else parent['key']
+                    registry.save(key = model_key, model = asset_model,
+                                meta = dict(model_ident, parent = parent_key, rows_added = rows_added,
+                                            scaler = registry.scaler_state(scaler = asset_scaler)))
+                    if db is not None:
+                        model_lineage(db = db, key = model_key, parent = parent_key, asset = tick, model = model,
+                                    mode = 'full' if parent is None else 'fine_tune', rows_added = rows_added)
+            fit_stage.count(rows = len(x_train), cached = int(cached))
+
+        with stage('predict') as predict_stage:
+            # Test data, taken from the already loaded frame. The first test day needs pred_days days before it.
+            test_start = max(split_idx, self.pred_days)
+            closing_prices: np.ndarray = query_asset['Close'].to_numpy()   # Pipeline precision, float32 by default.
+            actual_prices = closing_prices[test_start:]   # Get closing prices.
+            model_inputs = closing_prices[test_start - self.pred_days:].reshape(-1, 1)
+            model_inputs: np.ndarray = asset_scaler.transform(model_inputs) # Data scaled according to the scaler.
+
+            # Make predictions on test data.
+            x_test = test_preprocessing(self.pred_days, model_inputs)
+            pred_prices: np.ndarray = asset_model.predict(window_dataset(x = x_test, y = None, batch = batch, shuffle = False),
+                                                        verbose = 0)[:, :1]  # Next day output, the test windows are gathered per batch.
+            pred_prices: np.ndarray = asset_scaler.inverse_transform(pred_prices)
+            dates = plot_data(x_values = x[test_start:], name = tick, dtype = self.asset_type, 
+                                    actual = actual_prices, predicted = pred_prices, 
+                                    colour_actual = "blue", colour_predicted = "red", plot = self.plot)
+
+            all_data = self.df_act_pred(real = actual_prices, pred = pred_prices, d = dates)
+            all_data.index = query_asset.index[test_start:]     # Aligned with the queried rows.
+
+            # Predict the next days, the first one is the next day prediction.
+            forecast = horizon_prediction(input = model_inputs, prediction_days = self.pred_days, model = asset_model,
+                                        scaler = asset_scaler, horizon = closing, mode = horizon_mode)
+            print(next_day_message(name = tick, type = self.asset_type, currency = asset_currency_symbol,
+                                    prediction = forecast[0]))
+            if closing > 1:
+                print(f'{tick} {self.asset_type} {closing} day {horizon_mode} forecast: '
+                    + ', '.join(f'{asset_currency_symbol}{price:.2f}' for price in forecast))
+            predict_stage.count(rows = len(x_test) + closing)
+
+        # Annualised volatility of the daily log returns of the Close price, no copy of the queried rows.
+        volatility: float = annualized_volatility(prices = query_asset['Close'].to_numpy(), periods = TRADING_DAYS)
         percentage_vol: int | float = lambda x : round(x, 4) * 100 
         volat = str(percentage_vol(volatility))
         if volat_p:
-            plot_volatility(asset_copy['Log returns'], name = tick)
+            plot_volatility(pd.Series(log_returns(prices = query_asset['Close'].to_numpy())), name = tick)
         print(f'{tick} {self.asset_type} Volatility = {volat}%')
 
-        return all_data, next_day[0][0], volat
+        return all_data, forecast[0], volat, forecast
 
-def prediction_assessment(df_all: pd.DataFrame, df_pred_real: pd.DataFrame, db: str, asset: str, model_name: str) -> pd.DataFrame:
-    """Wrapper for table_parser().
+def prediction_assessment(df_all: pd.DataFrame, df_pred_real: pd.DataFrame, db: str, asset: str, model_name: str,
+                        run_id: str) -> pd.DataFrame:
+    """Assess the test predictions of a run and append them to the prediction history.
 
     Args:
         * `df_all` (pd.DataFrame): Dataframe input with all data.
         * `df_pred_real` (pd.DataFrame): Dataframe with real and predicted values.
-        * `db` (str): Database for table_parser().
+        * `db` (str): Database of the prediction history.
         * `asset` (str): Asset name.
+        * `model_name` (str): Model name.
+        * `run_id` (str): Run identifier from new_run_id().
 
     Returns:
-        `pd.DataFrame`: Queries the updated table in the database and get all values as a pandas DataFrame.
+        `pd.DataFrame`: Queries the run predictions from the database, joined with the actual prices of all dates.
     """
 
     from lib.df_utils import df_analyses
-    from lib.db_utils import table_utils, SQLite_Query
+    from lib.db_utils import record_predictions, prediction_history
 
     all_data_df = df_analyses(df = df_pred_real).assessment_df_parser()
-    all_data_df = all_data_df.drop(all_data_df.columns[[0, 1]], axis = 1)
-    merged_df = df_all.join(all_data_df)    # Combines original df with prediction operations df.
-
-    if "-" in asset:
-        asset = asset.replace('-', "_")
-    if " " in asset:
-        asset = asset.replace(' ', "")
-
-    new_table_name = f'{asset}_{model_name}'
-    table_instance = table_utils(dbname = db, asset_n = new_table_name)
-    table_instance.table_parser(df = merged_df)
-    return SQLite_Query(database = db, table = new_table_name)[0]
+    record_predictions(db = db, run_id = run_id, asset = asset, model = model_name, df = all_data_df)
+
+    history = prediction_history(db = db, asset = asset, model = model_name, run_id = run_id)
+    return assessment_frame(prices = df_all, history = history)
+
+def assessment_frame(prices: pd.DataFrame, history: pd.DataFrame) -> pd.DataFrame:
+    """Join the prediction history of a run with the actual prices of all the dates.
+
+    Args:
+        * `prices` (pd.DataFrame): Date and Adj_Close columns.
+        * `history` (pd.DataFrame): Predictions from prediction_history().
+
+    Returns:
+        `pd.DataFrame`: The ASSESSMENT_COLUMNS, NaN predictions on the training dates.
+    """
+
+    from lib.db_utils import DATE_FORMAT
+
+    history = history.rename(columns = {'date': 'Date', 'predicted': 'Predicted_Values',
+                                        'diff': 'Difference', 'pct_diff': 'Percent_Difference'})
+    prices = prices.loc[:, ['Date', 'Adj_Close']].assign(Date = pd.to_datetime(prices['Date']).dt.strftime(DATE_FORMAT))
+    merged_df = prices.merge(history, how = 'left', on = 'Date')    # Training dates have no predictions.
+    return merged_df.loc[:, list(ASSESSMENT_COLUMNS)]
+
+def forecast_frame(last_date: str, forecast: np.ndarray, asset_type: str) -> pd.DataFrame:
+    """Dates of a forecast, the trading days after the last known day. Cryptocurrencies trade every
+    day, the other assets on business days.
+
+    Args:
+        * `last_date` (str): Last day with a known price.
+        * `forecast` (np.ndarray): Forecast prices, one per day.
+        * `asset_type` (str): Type of asset.
+
+    Returns:
+        `pd.DataFrame`: Date and Forecast columns, the dates formatted like assessment_frame().
+    """
+
+    from lib.db_utils import DATE_FORMAT
+
+    start = pd.Timestamp(last_date).normalize() + pd.Timedelta(days = 1)
+    if asset_type.lower().startswith('crypto'):
+        dates = pd.date_range(start = start, periods = len(forecast), freq = 'D')
+    else:
+        dates = pd.bdate_range(start = start, periods = len(forecast))
+    return pd.DataFrame({'Date': dates.strftime(DATE_FORMAT), 'Forecast': np.asarray(forecast, dtype = np.float64)})
 
 @dataclass
 class prediction_comparison:
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Final, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import MinMaxScaler
+
+INPUT_DTYPE: Final[type] = np.float32   # Dtype of the model inputs.
+HORIZON_MODES: Final[tuple] = ('direct', 'recursive')   # direct: one output per day, recursive: next day outputs fed back.
+# Batches up to this size call the model directly. model.predict builds a tf.data pipeline on every call,
+# which dominates the time of a few windows.
+CALL_BATCH: Final[int] = 64
+
+@dataclass
+class inference_request:
+    """Dataclass holding the next day forecast request of one asset.
+
+    Args:
+        * `asset` (str): Asset name.
+        * `model` (Sequential): Trained model.
+        * `window` (np.ndarray): Last scaled days of the asset, shape (window,) or (window, features).
+        * `scaler` (MinMaxScaler): Scaler of the asset, maps the predictions back to prices.
+        * `model_name` (str, optional): Name reported in the forecasts. Defaults to the model name.
+    """
+
+    asset: str
+    model: Any
+    window: np.ndarray
+    scaler: MinMaxScaler
+    model_name: str = ''
+
+def last_window(inputs: np.ndarray, prediction_days: int) -> np.ndarray:
+    """Window the next day is predicted from: the last prediction_days scaled rows.
+
+    Args:
+        * `inputs` (np.ndarray): Scaled data of shape (time steps, features).
+        * `prediction_days` (int): Number of days the model predicts from.
+
+    Returns:
+        `np.ndarray`: View of shape (prediction_days, features).
+    """
+
+    if len(inputs) < prediction_days:
+        raise ValueError(f'{len(inputs)} rows are not enough for a {prediction_days} day window.')
+    return inputs[len(inputs) - prediction_days:]
+
+def _model_name(req: inference_request) -> str:
+    """Name of the model of a request.
+
+    Args:
+        * `req` (inference_request): Forecast request.
+
+    Returns:
+        `str`: model_name, or the Keras model name.
+    """
+
+    return req.model_name or str(getattr(req.model, 'name', type(req.model).__name__))
+
+def forecast_dtype(requests: list[inference_request], horizon: int | None = None) -> np.dtype:
+    """Dtype of the forecasts structured array.
+
+    Args:
+        * `requests` (list[inference_request]): Forecast requests.
+        * `horizon` (int | None, optional): Days of each forecast. Defaults to None (a single value).
+
+    Returns:
+        `np.dtype`: asset, model and forecast fields.
+    """
+
+    asset_len = max([len(req.asset) for req in requests] + [1])
+    model_len = max([len(_model_name(req)) for req in requests] + [1])
+    forecast = ('forecast', np.float64) if horizon is None else ('forecast', np.float64, (horizon,))
+    return np.dtype([('asset', f'U{asset_len}'), ('model', f'U{model_len}'), forecast])
+
+def output_width(horizon: int, mode: str) -> int:
+    """Number of model outputs a forecasting mode trains for.
+
+    Args:
+        * `horizon` (int): Days to forecast.
+        * `mode` (str): One of HORIZON_MODES.
+
+    Raises:
+        `ValueError`: Unknown mode or horizon that is not positive.
+
+    Returns:
+        `int`: horizon in direct mode, 1 in recursive mode.
+    """
+
+    if mode not in HORIZON_MODES:
+        raise ValueError(f'Forecast mode: {mode} is not valid. Valid modes are: {", ".join(HORIZON_MODES)}.')
+    if horizon < 1:
+        raise ValueError(f'Horizon ({horizon}) must be a positive integer.')
+    return horizon if mode == 'direct' else 1
+
+def _model_batches(requests: list[inference_request], pad: int = 0) -> Iterator[tuple[Any, list[int], np.ndarray]]:
+    """Group the requests by model and copy their windows into one preallocated float32 batch per model.
+
+    Args:
+        * `requests` (list[inference_request]): Forecast requests.
+        * `pad` (int, optional): Extra time steps allocated after each window. Defaults to 0.
+
+    Raises:
+        `ValueError`: Windows of the same model with different shapes.
+
+    Yields:
+        `tuple[Any, list[int], np.ndarray]`: Model, indices of its requests and batch of shape
+        (requests, window + pad, features).
+    """
+
+    groups: dict[int, list[int]] = {}
+    for i, req in enumerate(requests):
+        groups.setdefault(id(req.model), []).append(i)
+
+    for idx in groups.values():
+        shape = np.shape(requests[idx[0]].window)
+        window = (shape[0], shape[1] if len(shape) > 1 else 1)
+        batch = np.empty((len(idx), window[0] + pad, window[1]), dtype = INPUT_DTYPE)
+        for row, i in enumerate(idx):
+            if np.shape(requests[i].window) != shape:
+                raise ValueError(f'Window of {requests[i].asset} has shape {np.shape(requests[i].window)}, '
+                                f'the other windows of its model have shape {shape}.')
+            batch[row, :window[0]] = np.reshape(requests[i].window, window)
+        yield requests[idx[0]].model, idx, batch
+
+def _predict(model: Any, batch: np.ndarray) -> np.ndarray:
+    """Model outputs of a batch of windows.
+
+    Args:
+        * `model` (Sequential): Trained model.
+        * `batch` (np.ndarray): Windows of shape (windows, window, features).
+
+    Returns:
+        `np.ndarray`: Outputs of shape (windows, outputs).
+    """
+
+    if len(batch) <= CALL_BATCH and callable(model):
+        return np.asarray(model(batch, training = False))
+    return model.predict(batch, batch_size = len(batch), verbose = 0)
+
+def _inverse(scaler: MinMaxScaler, scaled: np.ndarray) -> np.ndarray:
+    """Map scaled predictions of one asset back to prices.
+
+    Args:
+        * `scaler` (MinMaxScaler): Scaler of the asset.
+        * `scaled` (np.ndarray): Scaled values.
+
+    Returns:
+        `np.ndarray`: 1-D array of prices.
+    """
+
+    return scaler.inverse_transform(np.reshape(scaled, (-1, 1)))[:, 0]
+
+def batch_predict(requests: list[inference_request]) -> np.ndarray:
+    """Next day forecasts of many assets. Requests are grouped by model and each model runs
+    a single predict over a preallocated float32 batch of all its windows.
+
+    Args:
+        * `requests` (list[inference_request]): Forecast requests.
+
+    Raises:
+        `ValueError`: Windows of the same model with different shapes.
+
+    Returns:
+        `np.ndarray`: Structured array with the asset, model and forecast price of each request, in
+        the request order.
+    """
+
+    out = np.zeros(len(requests), dtype = forecast_dtype(requests = requests))
+    out['asset'] = [req.asset for req in requests]
+    out['model'] = [_model_name(req) for req in requests]
+    for model, idx, batch in _model_batches(requests = requests):
+        scaled = _predict(model = model, batch = batch)[:, 0]
+        for row, i in enumerate(idx):   # Each asset has its own scaler.
+            out['forecast'][i] = _inverse(scaler = requests[i].scaler, scaled = scaled[row])[0]
+    return out
+
+def horizon_predict(requests: list[inference_request], horizon: int, mode: str = 'direct') -> np.ndarray:
+    """Forecasts of the next horizon days of many assets, one predict per model and day at most.
+
+    In direct mode each model outputs all the days at once, so it must have at least horizon outputs.
+    In recursive mode the next day output is written after the window and the window slides one day
+    forward, horizon times. The batch holds the windows and all the forecast days from the start, so
+    every step predicts from a view of it and nothing is allocated per step. Recursive forecasts need
+    single feature windows, the only feature that is predicted.
+
+    Args:
+        * `requests` (list[inference_request]): Forecast requests.
+        * `horizon` (int): Days to forecast.
+        * `mode` (str, optional): One of HORIZON_MODES. Defaults to 'direct'.
+
+    Raises:
+        `ValueError`: Unknown mode, windows of the same model with different shapes, a direct model with
+        fewer outputs than days or recursive windows with more than one feature.
+
+    Returns:
+        `np.ndarray`: Structured array with the asset, model and forecast prices (horizon,) of each request,
+        in the request order.
+    """
+
+    output_width(horizon = horizon, mode = mode)
+    out = np.zeros(len(requests), dtype = forecast_dtype(requests = requests, horizon = horizon))
+    out['asset'] = [req.asset for req in requests]
+    out['model'] = [_model_name(req) for req in requests]
+
+    for model, idx, batch in _model_batches(requests = requests, pad = 0 if mode == 'direct' else horizon):
+        if mode == 'direct':
+            scaled = _predict(model = model, batch = batch)
+            if scaled.shape[1] < horizon:
+                raise ValueError(f'{_model_name(requests[idx[0]])} has {scaled.shape[1]} outputs, '
+                                f'a direct forecast of {horizon} days needs {horizon}.')
+            scaled = scaled[:, :horizon]
+        else:
+            if batch.shape[2] != 1:
+                raise ValueError(f'Recursive forecasts need single feature windows, not {batch.shape[2]} features.')
+            window = batch.shape[1] - horizon
+            for step in range(horizon):
+                batch[:, window + step, 0] = _predict(model = model, batch = batch[:, step:step + window])[:, 0]
+            scaled = batch[:, window:, 0]
+
+        for row, i in enumerate(idx):
+            out['forecast'][i] = _inverse(scaler = requests[i].scaler, scaled = scaled[row])
+    return out
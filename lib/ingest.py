@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import random, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from time import monotonic, perf_counter, sleep
+import pandas as pd
+from typing import Final
+from lib.providers import _provider, PERMANENT_ERRORS
+from lib.storage import _storage, PRICE_COLUMNS
+from lib.utils import dunders
+
+FETCH_WORKERS: Final[int] = 8   # Downloads running at once.
+RATE_LIMIT: Final[float] = 2.0  # Provider requests per second, 0 for no limit.
+BURST: Final[int] = 4   # Requests let through at once after an idle spell.
+RETRIES: Final[int] = 4     # Retries of a download after its first failure.
+BACKOFF_BASE: Final[float] = 1.0    # Seconds, doubled on every retry.
+BACKOFF_CAP: Final[float] = 30.0    # Longest wait between two attempts in seconds.
+FLUSH_ROWS: Final[int] = 100_000    # Pending rows that make the writer flush.
+
+class token_bucket(dunders):
+    """Thread safe token bucket rate limiter. Tokens refill at a fixed rate up to a capacity
+    and every request takes one, waiting for it when the bucket is empty.
+
+    Args:
+        * `rate` (float): Tokens added per second, 0 for no limit.
+        * `capacity` (int): Most tokens held, the largest burst.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._stamp = monotonic()
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def acquire(self) -> float:
+        """Take a token, waiting for one if needed. The wait happens outside the lock.
+
+        Returns:
+            `float`: Seconds waited.
+        """
+
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+            waited += wait
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random) -> float:
+    """Exponential backoff with full jitter: a uniform wait up to base * 2^attempt seconds, capped.
+
+    Args:
+        * `attempt` (int): Failed attempts so far, minus one.
+        * `base` (float): Wait bound of the first retry in seconds.
+        * `cap` (float): Largest wait bound in seconds.
+        * `rng` (random.Random): Source of the jitter.
+
+    Returns:
+        `float`: Seconds to wait.
+    """
+
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+def price_frame(df: pd.DataFrame, after: str | None = None) -> pd.DataFrame:
+    """Provider bars in the storage layout.
+
+    Args:
+        * `df` (pd.DataFrame): Bars from a provider, Date index.
+        * `after` (str | None, optional): Only keep the rows after this date. Defaults to None (all the rows).
+
+    Returns:
+        `pd.DataFrame`: Rows with the PRICE_COLUMNS layout, Date as datetime.
+    """
+
+    df = df.rename(columns = {"Adj Close": "Adj_Close"}).reset_index()  # Numerical integer index instead of date index.
+    df = df.loc[:, list(PRICE_COLUMNS)]
+    return df if after is None else df[df['Date'] > pd.Timestamp(after)]
+
+@dataclass
+class fetch_job:
+    """Dataclass holding the download of one asset.
+
+    Args:
+        * `ticker` (str): Asset name.
+        * `start` (str): Start date, inclusive.
+        * `end` (str): End date, exclusive.
+        * `after` (str | None, optional): Last stored date, the rows are appended after it. Defaults to None
+        (the stored rows are replaced).
+    """
+
+    ticker: str
+    start: str
+    end: str
+    after: str | None = None
+
+@dataclass
+class ingest_result:
+    """Dataclass holding the outcome of one asset download.
+    """
+
+    ticker: str
+    status: str
+    attempts: int
+    elapsed: float
+    rows: int = 0
+    error: str | None = None
+
+class ingestion_engine(dunders):
+    """Download many assets in parallel and store them. Downloads run on a thread pool behind a
+    token bucket rate limiter and failed downloads are retried with exponential backoff and jitter,
+    up to a number of retries per asset and a retry budget shared by the whole run. The calling
+    thread is the single writer: appends are buffered and written in one transaction per flush,
+    while the other downloads go on.
+
+    Args:
+        * `provider` (_provider): Market data provider, called from many threads.
+        * `storage` (_storage): Price storage backend.
+        * `workers` (int, optional): Downloads running at once. Defaults to FETCH_WORKERS.
+        * `rate` (float, optional): Provider requests per second, 0 for no limit. Defaults to RATE_LIMIT.
+        * `burst` (int, optional): Largest burst of requests. Defaults to BURST.
+        * `retries` (int, optional): Retries of each asset. Defaults to RETRIES.
+        * `retry_budget` (int | None, optional): Retries of the whole run. Defaults to None (retries times the assets).
+        * `backoff_base` (float, optional): Wait bound of the first retry in seconds. Defaults to BACKOFF_BASE.
+        * `backoff_cap` (float, optional): Largest wait bound in seconds. Defaults to BACKOFF_CAP.
+        * `flush_rows` (int, optional): Buffered rows that make the writer flush. Defaults to FLUSH_ROWS.
+        * `seed` (int | None, optional): Seed of the jitter. Defaults to None.
+    """
+
+    def __init__(self, provider: _provider, storage: _storage, workers: int = FETCH_WORKERS,
+                rate: float = RATE_LIMIT, burst: int = BURST, retries: int = RETRIES,
+                retry_budget: int | None = None, backoff_base: float = BACKOFF_BASE,
+                backoff_cap: float = BACKOFF_CAP, flush_rows: int = FLUSH_ROWS, seed: int | None = None) -> None:
+        self.provider = provider
+        self.storage = storage
+        self.workers = max(1, workers)
+        self.bucket = token_bucket(rate = rate, capacity = burst)
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.flush_rows = flush_rows
+        self._rng = random.Random(seed)
+        self._budget_lock = threading.Lock()
+        self._budget = 0
+        super().__init__()
+
+    def _spend_retry(self) -> bool:
+        """Take a retry from the shared budget.
+
+        Returns:
+            `boolean`: False when the budget is spent.
+        """
+
+        with self._budget_lock:
+            if self._budget <= 0:
+                return False
+            self._budget -= 1
+            return True
+
+    def _fetch(self, job: fetch_job) -> tuple[fetch_job, pd.DataFrame | None, ingest_result]:
+        """Download one asset, retrying failures. Runs on the worker threads and never raises,
+        failures are reported in the result.
+
+        Args:
+            * `job` (fetch_job): Asset download.
+
+        Returns:
+            `tuple[fetch_job, pd.DataFrame | None, ingest_result]`: The job, its rows in the storage layout
+            (None on failure) and its result.
+        """
+
+        start = perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.bucket.acquire()
+            try:
+                df = self.provider.download(ticker = job.ticker, start = job.start, end = job.end)
+                df = price_frame(df = df, after = job.after)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if isinstance(e, PERMANENT_ERRORS) or attempt > self.retries or not self._spend_retry():
+                    return job, None, ingest_result(ticker = job.ticker, status = 'failed', attempts = attempt,
+                                                    elapsed = perf_counter() - start, error = error)
+                print(f'{job.ticker}: {error}, retry {attempt}/{self.retries}.')
+                sleep(backoff_delay(attempt = attempt - 1, base = self.backoff_base, cap = self.backoff_cap, rng = self._rng))
+                continue
+            return job, df, ingest_result(ticker = job.ticker, status = 'ok', attempts = attempt,
+                                        elapsed = perf_counter() - start)
+
+    def _flush(self, pending: dict[str, pd.DataFrame], results: dict[str, ingest_result]) -> None:
+        """Write the buffered appends in one go and empty the buffer.
+
+        Args:
+            * `pending` (dict[str, pd.DataFrame]): Buffered rows of each asset.
+            * `results` (dict[str, ingest_result]): Results of the assets, updated with the rows written.
+        """
+
+        if not pending:
+            return
+        try:
+            for ticker, rows in self.storage.append_many(frames = pending).items():
+                results[ticker].rows = rows
+        except Exception as e:
+            for ticker in pending:
+                results[ticker].status, results[ticker].error = 'failed', f'{type(e).__name__}: {e}'
+        pending.clear()
+
+    def run(self, jobs: list[fetch_job]) -> list[ingest_result]:
+        """Download and store the assets.
+
+        Args:
+            * `jobs` (list[fetch_job]): Asset downloads.
+
+        Returns:
+            `list[ingest_result]`: Result of each asset, in the job order.
+        """
+
+        self._budget = self.retries * len(jobs) if self.retry_budget is None else self.retry_budget
+        results: dict[str, ingest_result] = {}
+        pending: dict[str, pd.DataFrame] = {}
+        pending_rows = 0
+
+        with ThreadPoolExecutor(max_workers = min(self.workers, max(1, len(jobs)))) as executor:
+            futures = [executor.submit(self._fetch, job) for job in jobs]
+            for future in as_completed(futures):
+                job, df, result = future.result()
+                results[job.ticker] = result
+                if df is None:
+                    print(f'[{len(results)}/{len(jobs)}] {job.ticker}: failed after {result.attempts} attempts ({result.error})')
+                    continue
+
+                if job.after is None:   # Full rewrites are written on their own.
+                    try:
+                        result.rows = self.storage.replace(ticker = job.ticker, df = df)
+                    except Exception as e:
+                        result.status, result.error = 'failed', f'{type(e).__name__}: {e}'
+                else:
+                    pending[job.ticker] = df
+                    pending_rows += len(df)
+                    if pending_rows >= self.flush_rows:
+                        self._flush(pending = pending, results = results)
+                        pending_rows = 0
+                print(f'[{len(results)}/{len(jobs)}] {job.ticker}: {len(df)} rows fetched '
+                    f'({result.attempts} attempts, {result.elapsed:.1f}s)')
+            self._flush(pending = pending, results = results)
+
+        return [results[job.ticker] for job in jobs]
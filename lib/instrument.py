@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, sys, json, time, threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Final, Iterator
+from lib.utils import dunders
+
+PROFILERS: Final[tuple] = ('cprofile', 'pyinstrument')
+SAMPLE_INTERVAL: Final[float] = 0.05    # Seconds between two memory samples while stages run.
+METRIC_PREFIX: Final[str] = 'market_analysis'   # Prefix of the exported Prometheus metrics.
+STAGE_METRICS: Final[dict] = {'seconds': 'Wall time of the stage in seconds.',
+                            'cpu_seconds': 'CPU time of the process during the stage in seconds.',
+                            'peak_rss_bytes': 'Peak resident memory of the process during the stage.',
+                            'calls': 'Times the stage ran.',
+                            'failures': 'Times the stage raised.'}
+
+def rss_bytes() -> int:
+    """Resident memory of the process. Where /proc is missing, the peak resident memory so far.
+
+    Returns:
+        `int`: Bytes.
+    """
+
+    try:
+        with open('/proc/self/statm', 'r') as fl_stream:
+            return int(fl_stream.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024    # Bytes on macOS, KB on Linux.
+
+@dataclass
+class stage_record:
+    """Dataclass holding the measures of one run of a stage.
+
+    Args:
+        * `path` (str): Names of the enclosing stages and of the stage, joined by /.
+        * `labels` (dict): Labels of the stage and of the enclosing stages, e.g. asset.
+        * `start` (float): Start time, seconds since the epoch.
+        * `pid` (int): Process that ran the stage.
+    """
+
+    path: str
+    labels: dict
+    start: float
+    pid: int
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rss_start: int = 0
+    peak_rss_bytes: int = 0
+    counters: dict = field(default_factory = dict)
+    status: str = 'ok'
+    profile: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def depth(self) -> int:
+        return self.path.count('/')
+
+    def count(self, **counters: int | float) -> None:
+        """Add to the counters of the stage, e.g. rows and bytes.
+
+        Args:
+            * `counters` (int | float): Amount added to each counter.
+        """
+
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+class instrument(dunders):
+    """Nested stage timers of a run. Each stage records its wall and CPU time, its counters and the
+    peak resident memory of the process while it runs, sampled by a background thread. Stages opened
+    inside another stage of the same thread are nested under it. Selected stages can be profiled with
+    cProfile or pyinstrument, one profile at a time. Runs are exported as json and as a Prometheus
+    textfile.
+
+    Args:
+        * `run_id` (str): Run identifier.
+        * `profile` (tuple, optional): Names of the profiled stages, all for every stage. Defaults to () (none).
+        * `profiler` (str, optional): One of PROFILERS. Defaults to 'cprofile'.
+        * `profile_dir` (str | None, optional): Directory of the profiles. Defaults to None (current directory).
+        * `sample` (float, optional): Seconds between two memory samples. Defaults to SAMPLE_INTERVAL.
+
+    Raises:
+        `ValueError`: Unknown profiler.
+        `ImportError`: pyinstrument profiler without pyinstrument installed.
+    """
+
+    def __init__(self, run_id: str, profile: tuple = (), profiler: str = 'cprofile',
+                profile_dir: str | None = None, sample: float = SAMPLE_INTERVAL) -> None:
+        if profiler not in PROFILERS:
+            raise ValueError(f'Profiler: {profiler} is not valid. Valid profilers are: {", ".join(PROFILERS)}.')
+        if profile and profiler == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                raise ImportError('The pyinstrument profiler needs the pyinstrument package: pip install pyinstrument.')
+
+        self.run_id = run_id
+        self.profile = tuple(profile)
+        self.profiler = profiler
+        self.profile_dir = profile_dir or os.getcwd()
+        self.sample = sample
+        self.records: list[stage_record] = []
+        self.started = time.time()
+        self._open: list[stage_record] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiling = False
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        super().__init__()
+
+    def _sample(self) -> None:
+        """Update the peak memory of the open stages until stopped.
+        """
+
+        while not self._stop.wait(self.sample):
+            rss = rss_bytes()
+            with self._lock:
+                for record in self._open:
+                    record.peak_rss_bytes = max(record.peak_rss_bytes, rss)
+
+    @contextmanager
+    def activate(self) -> Iterator[instrument]:
+        """Make the instrument the target of the module level stage() calls and sample the memory meanwhile.
+
+        Yields:
+            `instrument`: The instrument.
+        """
+
+        global _ACTIVE
+        previous, _ACTIVE = _ACTIVE, self
+        self._stop.clear()
+        self._sampler = threading.Thread(target = self._sample, daemon = True)
+        self._sampler.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            self._sampler.join()
+            _ACTIVE = previous
+
+    def _profiled(self, record: stage_record) -> bool:
+        """Whether a stage is profiled.
+
+        Args:
+            * `record` (stage_record): The stage.
+
+        Returns:
+            `boolean`: True when it is selected and no other stage is being profiled.
+        """
+
+        return bool(self.profile) and not self._profiling and ('all' in self.profile or record.name in self.profile)
+
+    @contextmanager
+    def _profile(self, record: stage_record) -> Iterator[None]:
+        """Profile a stage and save the profile next to the run.
+
+        Args:
+            * `record` (stage_record): The stage, its profile path is set.
+        """
+
+        self._profiling = True
+        os.makedirs(os.path.join(self.profile_dir, self.run_id), exist_ok = True)
+        stem = os.path.join(self.profile_dir, self.run_id, '.'.join([record.path.replace('/', '.'),
+                                                                    *record.labels.values(), str(len(self.records))]))
+        if self.profiler == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        try:
+            yield
+        finally:
+            if self.profiler == 'cprofile':
+                profiler.disable()
+                record.profile = stem + '.prof'     # Read with python -m pstats or snakeviz.
+                profiler.dump_stats(record.profile)
+            else:
+                profiler.stop()
+                record.profile = stem + '.html'
+                with open(record.profile, 'w') as fl_stream:
+                    fl_stream.write(profiler.output_html())
+            self._profiling = False
+
+    @contextmanager
+    def stage(self, name: str, **labels: str) -> Iterator[stage_record]:
+        """Time a stage. Stages raising are recorded as failed and the exception goes on.
+
+        Args:
+            * `name` (str): Stage name.
+            * `labels` (str): Labels of the stage, inherited by the stages nested in it.
+
+        Yields:
+            `stage_record`: The stage, to add to its counters.
+        """
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        rss = rss_bytes()
+        record = stage_record(path = name if parent is None else f'{parent.path}/{name}',
+                            labels = {**(parent.labels if parent else {}), **labels}, start = time.time(),
+                            pid = os.getpid(), rss_start = rss, peak_rss_bytes = rss)
+        stack.append(record)
+        with self._lock:
+            self._open.append(record)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            if self._profiled(record = record):
+                with self._profile(record = record):
+                    yield record
+            else:
+                yield record
+        except BaseException:
+            record.status = 'failed'
+            raise
+        finally:
+            record.seconds = time.perf_counter() - wall
+            record.cpu_seconds = time.process_time() - cpu
+            stack.pop()
+            with self._lock:
+                self._open.remove(record)
+                record.peak_rss_bytes = max(record.peak_rss_bytes, rss_bytes())
+                self.records.append(record)
+
+    def merge(self, records: list[stage_record], **labels: str) -> None:
+        """Add the stages of another instrument, e.g. of a worker process, under the open stage of this thread.
+
+        Args:
+            * `records` (list[stage_record]): Stages of the other instrument.
+            * `labels` (str): Labels added to the stages.
+        """
+
+        stack = self._local.__dict__.get('stack', [])
+        parent = stack[-1] if stack else None
+        with self._lock:
+            for record in records:
+                record.path = record.path if parent is None else f'{parent.path}/{record.path}'
+                record.labels = {**(parent.labels if parent else {}), **record.labels, **labels}
+                self.records.append(record)
+
+    @property
+    def status(self) -> str:
+        """Status of the run, failed when one of its outer stages raised.
+
+        Returns:
+            `str`: 'ok' or 'failed'.
+        """
+
+        return 'failed' if any(record.status != 'ok' for record in self.records if record.depth == 0) else 'ok'
+
+    @property
+    def failed_stage(self) -> stage_record | None:
+        """Stage that raised in a failed run, the innermost of the failed stages of the run process.
+
+        Returns:
+            `stage_record | None`: The stage, None when the run did not fail.
+        """
+
+        outer = next((record for record in self.records if record.depth == 0 and record.status != 'ok'), None)
+        if outer is None:
+            return None
+        # Stages are recorded when they end, the one that raised ends before the stages around it.
+        return next(record for record in self.records if record.status != 'ok' and record.pid == outer.pid
+                    and (record.path + '/').startswith(outer.path + '/'))
+
+    def _aggregate(self) -> dict[tuple, dict]:
+        """Measures summed by stage path and labels.
+
+        Returns:
+            `dict[tuple, dict]`: STAGE_METRICS and counters of each stage path and sorted labels.
+        """
+
+        out = {}
+        for record in sorted(self.records, key = lambda record: record.start):
+            key = (record.path, tuple(sorted(record.labels.items())))
+            agg = out.setdefault(key, {'seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_bytes': 0, 'calls': 0,
+                                    'failures': 0, 'counters': {}})
+            agg['seconds'] += record.seconds
+            agg['cpu_seconds'] += record.cpu_seconds
+            agg['peak_rss_bytes'] = max(agg['peak_rss_bytes'], record.peak_rss_bytes)
+            agg['calls'] += 1
+            agg['failures'] += record.status != 'ok'
+            for counter, value in record.counters.items():
+                agg['counters'][counter] = agg['counters'].get(counter, 0) + value
+        return out
+
+    def summary(self) -> str:
+        """Format the stages as a tree, in start order.
+
+        Returns:
+            `str`: The summary table.
+        """
+
+        total = sum(record.seconds for record in self.records if record.depth == 0) or 1.0
+        shown = set()   # Labels are shown on the first stage that has them.
+        lines = [f'{"Stage":<36}{"Time (s)":>10}{"Share":>8}{"CPU (s)":>10}{"Peak RSS (MB)":>15}  Counters']
+        for (path, labels), agg in self._aggregate().items():
+            name = '  ' * path.count('/') + path.rsplit('/', 1)[-1] + ''.join(f' [{value}]' for label in labels
+                                                                            if label not in shown for value in label[1:])
+            shown.update(labels)
+            counters = ', '.join(f'{key}={value:,.0f}' for key, value in agg['counters'].items())
+            calls = '' if agg['calls'] == 1 else f' x{agg["calls"]}'
+            lines.append(f'{(name + calls)[:35]:<36}{agg["seconds"]:>10.3f}{agg["seconds"] / total:>8.1%}'
+                        f'{agg["cpu_seconds"]:>10.2f}{agg["peak_rss_bytes"] / 1e6:>15.1f}  {counters}')
+        profiles = [record.profile for record in self.records if record.profile]
+        if profiles:
+            lines.append(f'\n{len(profiles)} profiles saved in {os.path.dirname(profiles[0])}.')
+        failed = self.failed_stage
+        if failed is not None:
+            lines.append(f'\nRun failed in stage {failed.path}' + ''.join(f' [{value}]' for value in failed.labels.values()) + '.')
+        return '\n'.join(lines)
+
+    def to_json(self, path: str) -> str:
+        """Save the run and its stages as json.
+
+        Args:
+            * `path` (str): json file.
+
+        Returns:
+            `str`: Path of the file.
+        """
+
+        stages = [dict(asdict(record), start = record.start - self.started)
+                for record in sorted(self.records, key = lambda record: record.start)]
+        failed = self.failed_stage
+        run = {'run_id': self.run_id, 'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'status': self.status, 'failed_stage': None if failed is None else failed.path,
+            'seconds': sum(stage['seconds'] for stage in stages if '/' not in stage['path']),
+            'peak_rss_bytes': max([stage['peak_rss_bytes'] for stage in stages], default = 0), 'stages': stages}
+        _atomic_write(path = path, text = json.dumps(run, indent = 2))
+        return path
+
+    def to_prometheus(self, path: str) -> str:
+        """Save the run in the Prometheus text format, for the node exporter textfile collector.
+        The file is replaced atomically, so the collector never reads it half written.
+
+        Args:
+            * `path` (str): .prom file.
+
+        Returns:
+            `str`: Path of the file.
+        """
+
+        aggregated = self._aggregate()
+        metrics: dict[str, list[str]] = {}
+        for (stage, labels), agg in aggregated.items():
+            label_str = _labels(stage = stage, **dict(labels))
+            for metric in STAGE_METRICS:
+                metrics.setdefault(metric, []).append(f'{METRIC_PREFIX}_stage_{metric}{label_str} {agg[metric]}')
+            for counter, value in agg['counters'].items():
+                metrics.setdefault(counter, []).append(f'{METRIC_PREFIX}_stage_{counter}{label_str} {value}')
+
+        lines = []
+        for metric, samples in metrics.items():
+            help_text = STAGE_METRICS.get(metric, f'{metric.replace("_", " ").capitalize()} counted by the stage.')
+            lines += [f'# HELP {METRIC_PREFIX}_stage_{metric} {help_text}', f'# TYPE {METRIC_PREFIX}_stage_{metric} gauge', *samples]
+        end = max([record.start + record.seconds for record in self.records], default = self.started)
+        failed = self.failed_stage
+        lines += [f'# HELP {METRIC_PREFIX}_run_info Identifier, status and failed stage of the last run.',
+                f'# TYPE {METRIC_PREFIX}_run_info gauge',
+                f'{METRIC_PREFIX}_run_info{_labels(run_id = self.run_id, status = self.status, failed_stage = "" if failed is None else failed.path)} 1',
+                f'# HELP {METRIC_PREFIX}_run_failed Whether the last run failed.', f'# TYPE {METRIC_PREFIX}_run_failed gauge',
+                f'{METRIC_PREFIX}_run_failed {int(failed is not None)}',
+                f'# HELP {METRIC_PREFIX}_run_end_timestamp_seconds End of the last run, seconds since the epoch.',
+                f'# TYPE {METRIC_PREFIX}_run_end_timestamp_seconds gauge', f'{METRIC_PREFIX}_run_end_timestamp_seconds {end}']
+        _atomic_write(path = path, text = '\n'.join(lines) + '\n')
+        return path
+
+def _labels(**labels: str) -> str:
+    """Prometheus label set, values escaped.
+
+    Args:
+        * `labels` (str): Label values.
+
+    Returns:
+        `str`: {name="value",...}.
+    """
+
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+def _atomic_write(path: str, text: str) -> None:
+    """Write a text file through a temporary file.
+
+    Args:
+        * `path` (str): File path.
+        * `text` (str): Content.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    with open(path + '.tmp', 'w') as fl_stream:
+        fl_stream.write(text)
+    os.replace(path + '.tmp', path)
+
+_ACTIVE: instrument | None = None   # Target of stage(), set by instrument.activate().
+
+@contextmanager
+def stage(name: str, **labels: str) -> Iterator[stage_record]:
+    """Time a stage with the active instrument. Without one, only an unrecorded stage is yielded.
+
+    Args:
+        * `name` (str): Stage name.
+        * `labels` (str): Labels of the stage.
+
+    Yields:
+        `stage_record`: The stage, to add to its counters.
+    """
+
+    if _ACTIVE is None:
+        yield stage_record(path = name, labels = labels, start = 0.0, pid = 0)
+    else:
+        with _ACTIVE.stage(name, **labels) as record:
+            yield record
+
+def active() -> instrument | None:
+    """The active instrument.
+
+    Returns:
+        `instrument | None`: The instrument, None when the run is not instrumented.
+    """
+
+    return _ACTIVE
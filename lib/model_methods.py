@@ -2,67 +2,99 @@
 from __future__ import annotations
 
 import numpy as np
-import matplotlib.pyplot as plt
 import datetime as dt
 
-import seaborn as sns
-sns.set()   # Set seaborn graphs as default.
-
 import logging
 logging.getLogger('tensorflow').disabled = True     # Disable Tensorflow warning messages.
 
-from sklearn.preprocessing import MinMaxScaler
-from keras.models import Sequential
 import pandas as pd
-from keras.layers import Dense, Dropout, LSTM
+from typing import TYPE_CHECKING
 from lib.utils import dunders
+from lib.exceptions import SplitError
+from lib.windows import sliding_windows, window_targets, window_dataset
+
+if TYPE_CHECKING:   # Keras, sklearn and matplotlib are only imported when a model is trained or a plot is drawn.
+    from sklearn.preprocessing import MinMaxScaler
+    from keras.models import Sequential
+
+def _pyplot():
+    """Import matplotlib with the seaborn graph style, on the first plot only.
+
+    Returns:
+        `module`: matplotlib.pyplot.
+    """
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set()   # Set seaborn graphs as default.
+    return plt
 
-def preprocessing(data: pd.DataFrame, prediction_days: int) -> tuple[np.ndarray, np.ndarray, MinMaxScaler]:
+def preprocessing(data: pd.DataFrame, prediction_days: int, stride: int = 1,
+                horizon: int = 1) -> tuple[np.ndarray, np.ndarray, MinMaxScaler]:
     """Data preprocessing for training the model.
 
     Args:
         * `data` (pd.Dataframe): Dataframe containing the data to train on.
         * `prediction_days` (int): Number of days to predict the data for training.
+        * `stride` (int, optional): Days between the starts of two consecutive training windows. Defaults to 1.
+        * `horizon` (int, optional): Following days each window is trained to predict, the model outputs. Defaults to 1.
 
     Returns:
-        `tuple[np.ndarray, np.ndarray, MinMaxScaler]`: x and y axis training data and the scaler.
+        `tuple[np.ndarray, np.ndarray, MinMaxScaler]`: x and y axis training data and the scaler. x and y
+        are read-only views of the scaled data, with the dtype of the Close column.
     """
 
+    from sklearn.preprocessing import MinMaxScaler
     scaler = MinMaxScaler(feature_range = (0, 1))
-    scaled_data = scaler.fit_transform(data['Close'].values.reshape(-1, 1))
+    scaled_data = scaler.fit_transform(data['Close'].to_numpy().reshape(-1, 1))  # Keeps the float32 or float64 dtype of the column.
+    x_train, y_train = window_targets(scaled_data, window = prediction_days, stride = stride, horizon = horizon)
 
-    x_train = []
-    y_train = []
+    return x_train, y_train, scaler
+
+def split_index(data: pd.DataFrame, split: float | str | None, prediction_days: int) -> int:
+    """Row where the test set starts. The model trains on the rows before it and is
+    evaluated on the rows from it onwards.
 
-    for i in range(prediction_days, len(scaled_data)):  # Loop over data according to the prediction days integer.
-        x_train.append(scaled_data[i - prediction_days:i, 0])
-        y_train.append(scaled_data[i, 0])
+    Args:
+        * `data` (pd.Dataframe): Dataframe with a Date column.
+        * `split` (float | str | None): Fraction of the rows used for training or first test date (YYYY-MM-DD).
+        None trains on all the rows and evaluates in-sample.
+        * `prediction_days` (int): Days used for each prediction.
 
-    x_train, y_train = np.array(x_train), np.array(y_train)
-    x_train = np.reshape(x_train, (x_train.shape[0], x_train.shape[1], 1))
+    Raises:
+        `SplitError`: When the training or test set would be empty.
 
-    return x_train, y_train, scaler
+    Returns:
+        `int`: Index of the first test row, 0 when split is None.
+    """
+
+    if split is None:
+        return 0
 
-def test_preprocessing(prediction_days: int, inputs: np.ndarray) -> np.ndarray:
+    if isinstance(split, float):
+        idx = int(len(data) * split)
+    else:
+        dates = pd.to_datetime(data['Date']).values
+        idx = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(split))))
+
+    if idx <= prediction_days or idx >= len(data):
+        raise SplitError(f'Split {split} leaves {idx} training rows and {len(data) - idx} test rows. '
+                        f'More than {prediction_days} training rows and at least 1 test row are needed.')
+    return idx
+
+def test_preprocessing(prediction_days: int, inputs: np.ndarray, stride: int = 1) -> np.ndarray:
     """Preprocess the test data.
 
     Args:
         * `prediction_days` (int): Number of days that the model will train on for the prediction.
-        * `inputs` (np.ndarray): Numpy array with the test dataset.
+        * `inputs` (np.ndarray): Numpy array with the test dataset, one column per feature.
+        * `stride` (int, optional): Days between the starts of two consecutive windows. Defaults to 1.
 
     Returns:
-        `np.ndarray`: The trained dataset.
+        `np.ndarray`: The test windows as a read-only view of the inputs.
     """
 
-    x_test = []
-
-    for i in range(prediction_days, len(inputs)):
-        x_test.append(inputs[i-prediction_days:i, 0])
-
-    x_test = np.array(x_test)
-    x_test = np.reshape(x_test, (x_test.shape[0], x_test.shape[1], 1))
-
-    return x_test
+    return sliding_windows(inputs[:-1], window = prediction_days, stride = stride)
 
 class models(dunders):
     """Class containing all the AI/ML models of the application.
@@ -77,20 +109,24 @@ class models(dunders):
         self.loss_function = loss_function
         self.epoch = epoch
         self.batch = batch
+        self.history = None     # Keras History of the last training.
         super().__init__()
 
     def LSTM_RNN(self, x: np.ndarray, y: np.ndarray, units: int, closing_value: int, 
-                optimize: str) -> Sequential:
+                optimize: str, validation: float = 0.0, patience: int | None = None) -> Sequential:
 
         """Build and train a Long Short-Term Memory Reccurent Neural Network (`LSTM-RNN`) 
         using the `Keras Sequential API`.
 
         Args:
-            * `x` (np.ndarray): Training set x.
+            * `x` (np.ndarray): Training set x, batches are gathered from it by window_dataset().
             * `y` (np.ndarray): Training set y.
             * `units` (int): Dimensionality of the output space.
             * `closing_value` (int): Number of prediction days i.e. if it is equal to 1 then just the next day will be predicted.
             * `optimize` (str): Optimization algorithm.
+            * `validation` (float, optional): Fraction of the latest windows held out for validation. Defaults to 0.0.
+            * `patience` (int | None, optional): Epochs without improvement of the validation loss (training loss
+            without validation) before training stops, the best weights are restored. Defaults to None (all the epochs).
             * `dropout` (int | float): BaseRandomLayer.
             * `loss_function` (str): The loss function for error prediction.
             * `epoch` (int): Number of epochs to train.
@@ -100,8 +136,10 @@ class models(dunders):
             `Sequential`: The Sequential layers as a class.
         """
 
+        from keras.models import Sequential
+        from keras.layers import Dense, Dropout, LSTM
         model = Sequential()
-        model.add(LSTM(units = units, return_sequences = True, input_shape = (x.shape[1], 1)))
+        model.add(LSTM(units = units, return_sequences = True, input_shape = (x.shape[1], x.shape[2])))
         model.add(Dropout(self.dropout))
         model.add(LSTM(units = units, return_sequences = True))
         model.add(Dropout(self.dropout))
@@ -109,7 +147,47 @@ class models(dunders):
         model.add(Dropout(self.dropout))
         model.add(Dense(units = closing_value)) # Predict a closing value. 1 is the next closing value.
         model.compile(optimizer = optimize, loss = self.loss_function)
-        model.fit(x, y, epochs = self.epoch, batch_size = self.batch, verbose = 0)
+
+        # The validation windows are the latest ones, the model never trains on days after them.
+        val_windows = int(len(x) * validation)
+        train_idx = np.arange(len(x) - val_windows)
+        fit_args = {}
+        if val_windows > 0:
+            fit_args['validation_data'] = window_dataset(x = x, y = y, batch = self.batch, shuffle = False,
+                                                        idx = np.arange(len(x) - val_windows, len(x)))
+        if patience is not None:
+            from keras.callbacks import EarlyStopping
+            fit_args['callbacks'] = [EarlyStopping(monitor = 'val_loss' if val_windows > 0 else 'loss', patience = patience,
+                                                restore_best_weights = True)]
+        self.history = model.fit(window_dataset(x = x, y = y, batch = self.batch, idx = train_idx), epochs = self.epoch,
+                                verbose = 0, **fit_args)
+
+        return model
+
+    def fine_tune(self, model: Sequential, x: np.ndarray, y: np.ndarray, new_windows: int,
+                replay: int, epochs: int, seed: int = 0) -> Sequential:
+        """Warm start a trained model on the newest windows plus a replay sample of older
+        windows, so the model learns the new days without forgetting the rest of the series.
+
+        Args:
+            * `model` (Sequential): Previously trained model.
+            * `x` (np.ndarray): Training set x, the newest windows last.
+            * `y` (np.ndarray): Training set y.
+            * `new_windows` (int): Number of windows whose target is a newly appended day.
+            * `replay` (int): Number of older windows sampled along with the new ones.
+            * `epochs` (int): Number of epochs to train.
+            * `seed` (int, optional): Seed of the replay sample. Defaults to 0.
+
+        Returns:
+            `Sequential`: The fine-tuned model.
+        """
+
+        new_windows = min(new_windows, len(x))
+        old_windows = len(x) - new_windows
+        rng = np.random.default_rng(seed)
+        replay_idx = rng.choice(old_windows, size = min(replay, old_windows), replace = False)
+        idx = np.concatenate((np.sort(replay_idx), np.arange(old_windows, len(x))))
+        model.fit(window_dataset(x = x, y = y, batch = self.batch, seed = seed, idx = idx), epochs = epochs, verbose = 0)
 
         return model
 
@@ -144,6 +222,7 @@ def plot_data(x_values: list, name: str, dtype: str, actual: np.ndarray,
         x_values_year.append(date)
 
     if plot:
+        plt = _pyplot()
         plt.plot(x_values_year, actual, color = colour_actual, label = f'{name} Actual Price')
         plt.plot(x_values_year, predicted, color = colour_predicted, label = f'{name} Predicted Price')
         plt.title(f'{name} {dtype} Price')
@@ -168,6 +247,7 @@ def plot_volatility(dataframe: pd.DataFrame, name: str) -> bool:
         `boolean`: True when operation finishes successfully.
     """
 
+    plt = _pyplot()
     fig, ax = plt.subplots()    # fig is placeholder, ax is used to set axis on graph.
     dataframe.hist(ax = ax, bins = 50, alpha = 0.6, color = "blue")
     ax.set_xlabel("Log Volatility")
@@ -176,42 +256,73 @@ def plot_volatility(dataframe: pd.DataFrame, name: str) -> bool:
 
     return True
 
-def next_day_prediction(input: np.ndarray, name: str, type: str, prediction_days: int, model: Sequential, 
-                        scaler: MinMaxScaler, currency: str, today = True, year = "", month = "", day = "") -> np.ndarray:
-    """Predict the closing value that the array will have on the next day.
+def next_day_prediction(input: np.ndarray, prediction_days: int, model: Sequential, scaler: MinMaxScaler) -> np.ndarray:
+    """Predict the closing value that the array will have on the next day. Nothing is printed,
+    see next_day_message().
 
     Args:
-        * `input` (np.ndarray): Numpy array with all the data to analyse.
-        * `name` (str): Name of financial asset.
-        * `type` (str): Type of financial asset.
+        * `input` (np.ndarray): Numpy array with all the scaled data to analyse.
         * `prediction_days` (int): Days to use for prediction.
         * `model` (Sequential): Linear model layer stack.
         * `scaler` (MinMaxScaler): Model scaler.
+
+    Returns:
+        `np.ndarray`: Prediction of the price of the financial asset on the next day after the specified date,
+        of shape (1, 1).
+    """
+
+    from lib.inference import inference_request, batch_predict, last_window
+    window = last_window(inputs = np.reshape(input, (len(input), -1))[:, :1], prediction_days = prediction_days)  # The models predict from one feature.
+    forecast = batch_predict(requests = [inference_request(asset = '', model = model, window = window, scaler = scaler)])
+    return forecast['forecast'].reshape(1, 1)
+
+def horizon_prediction(input: np.ndarray, prediction_days: int, model: Sequential, scaler: MinMaxScaler,
+                    horizon: int, mode: str = 'direct') -> np.ndarray:
+    """Predict the closing values of the next horizon days. Nothing is printed.
+
+    Args:
+        * `input` (np.ndarray): Numpy array with all the scaled data to analyse.
+        * `prediction_days` (int): Days to use for prediction.
+        * `model` (Sequential): Linear model layer stack.
+        * `scaler` (MinMaxScaler): Model scaler.
+        * `horizon` (int): Days to predict.
+        * `mode` (str, optional): direct, one model output per day, or recursive, next day predictions
+        fed back into the window. Defaults to 'direct'.
+
+    Returns:
+        `np.ndarray`: Predicted prices of the next horizon days, shape (horizon,).
+    """
+
+    from lib.inference import inference_request, horizon_predict, last_window
+    window = last_window(inputs = np.reshape(input, (len(input), -1))[:, :1], prediction_days = prediction_days)
+    forecast = horizon_predict(requests = [inference_request(asset = '', model = model, window = window, scaler = scaler)],
+                            horizon = horizon, mode = mode)
+    return forecast['forecast'][0]
+
+def next_day_message(name: str, type: str, currency: str, prediction: float, today = True,
+                    year = "", month = "", day = "") -> str:
+    """Describe the next day prediction and its date.
+
+    Args:
+        * `name` (str): Name of financial asset.
+        * `type` (str): Type of financial asset.
+        * `currency` (str): Currency symbol of the asset.
+        * `prediction` (float): Predicted price.
         * `today` (bool, optional): Today's date. Defaults to True.
         * `year` (str, optional): Year. Defaults to "".
         * `month` (str, optional): Month. Defaults to "".
         * `day` (str, optional): Day. Defaults to "".
 
     Returns:
-        `np.ndarray`: Prediction of the price of the financial asset on the next day after the specified date.
+        `str`: The message.
     """
 
-    next_day = [input[len(input) + 1 - prediction_days:len(input + 1), 0]]  # Calculate the next day.
-    next_day = np.array(next_day, dtype=object) # Hold result in an array.
-    next_day = np.reshape(next_day, (next_day.shape[0], next_day.shape[1], 1))  # Reshape array into a single column.
-    next_day = np.asarray(next_day).astype(np.float)
-    prediction: np.ndarray = model.predict(next_day)
-    prediction: np.ndarray = scaler.inverse_transform(prediction)
-
-    # Print the result and the prediction date.
     tomorrow = dt.date.today() + dt.timedelta(days = 1)   # Today.
     if today == True:
-        print(f"{name} {type} Adj.Close price prediction for {tomorrow}: {currency}{prediction[0][0]}")
+        return f"{name} {type} Adj.Close price prediction for {tomorrow}: {currency}{prediction}"
     elif today == False and year != "" and month != "" and day != "":
-        print(f"{name} {type} Adj.Close price prediction ({day}/{month}/{year}): {currency}{prediction[0][0]}")
+        return f"{name} {type} Adj.Close price prediction ({day}/{month}/{year}): {currency}{prediction}"
     elif today == True and year != "" and month != "" and day != "":
-        print(f"\n{name} {type} Adj.Close price prediction ({day}/{month}/{year}): {currency}{prediction[0][0]}")
+        return f"\n{name} {type} Adj.Close price prediction ({day}/{month}/{year}): {currency}{prediction}"
     else:
-        print(f"\n{name} {type} Adj.Close price prediction for {tomorrow}: {currency}{prediction[0][0]}")
-
-    return prediction
+        return f"\n{name} {type} Adj.Close price prediction for {tomorrow}: {currency}{prediction}"
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, json, hashlib, datetime
+import numpy as np
+import pandas as pd
+from typing import Any, Final, TYPE_CHECKING
+from lib.utils import dunders
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import MinMaxScaler
+
+MODEL_EXT: Final[str] = '.keras'
+META_EXT: Final[str] = '.json'
+
+class model_registry(dunders):
+    """On-disk cache of trained models. Each entry is a saved Keras model plus a json
+    sidecar with its metadata. The least recently used entries are evicted when the
+    cache grows over its entry or size budget.
+
+    Args:
+        * `root` (str): Directory of the registry.
+        * `max_entries` (int): Maximum number of cached models.
+        * `max_mb` (int | float): Maximum size of the cached models in MB.
+    """
+
+    def __init__(self, root: str, max_entries: int, max_mb: int | float) -> None:
+        self.root = root
+        self.max_entries = int(max_entries)
+        self.max_mb = float(max_mb)
+        super().__init__()
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame) -> str:
+        """Fingerprint of the last row of a dataframe. Changes whenever the latest stored values change.
+
+        Args:
+            * `df` (pd.DataFrame): Input dataframe.
+
+        Returns:
+            `str`: sha256 hex digest of the last row.
+        """
+
+        return hashlib.sha256(df.iloc[-1].to_json(date_format = 'iso').encode()).hexdigest()
+
+    @classmethod
+    def model_ident(cls, asset: str, df: pd.DataFrame, params: dict) -> dict:
+        """Everything that identifies a model trained on a dataframe with the specified hyperparameters.
+
+        Args:
+            * `asset` (str): Asset name.
+            * `df` (pd.DataFrame): Training data, must have a Date column.
+            * `params` (dict): Model name and hyperparameters.
+
+        Returns:
+            `dict`: Asset, data range, last row fingerprint and hyperparameters.
+        """
+
+        return {'asset': asset,
+                'first_date': str(df['Date'].iloc[0]),
+                'last_date': str(df['Date'].iloc[-1]),
+                'rows': len(df),
+                'fingerprint': cls.fingerprint(df = df),
+                'params': {key: str(value) for key, value in params.items()}}
+
+    @staticmethod
+    def family_key(ident: dict) -> str:
+        """Key shared by all the models of an asset trained with the same hyperparameters, whatever their data.
+
+        Args:
+            * `ident` (dict): Model identity from model_ident().
+
+        Returns:
+            `str`: sha256 hex digest of the asset and hyperparameters.
+        """
+
+        family = {'asset': ident['asset'], 'params': ident['params']}
+        return hashlib.sha256(json.dumps(family, sort_keys = True).encode()).hexdigest()
+
+    @staticmethod
+    def model_key(ident: dict) -> str:
+        """Cache key of a model.
+
+        Args:
+            * `ident` (dict): Model identity from model_ident().
+
+        Returns:
+            `str`: sha256 hex digest of the identity.
+        """
+
+        return hashlib.sha256(json.dumps(ident, sort_keys = True).encode()).hexdigest()
+
+    @staticmethod
+    def scaler_state(scaler: MinMaxScaler) -> dict:
+        """Fitted state of the scaler a model was trained with, saved in the json sidecar.
+
+        Args:
+            * `scaler` (MinMaxScaler): Fitted single feature scaler.
+
+        Returns:
+            `dict`: Feature range and minimum and maximum of the training data.
+        """
+
+        return {'feature_range': [float(bound) for bound in scaler.feature_range],
+                'data_min': float(scaler.data_min_[0]), 'data_max': float(scaler.data_max_[0])}
+
+    @staticmethod
+    def load_scaler(meta: dict | None) -> MinMaxScaler | None:
+        """Scaler a cached model was trained with. A fine-tuned model keeps the scaler of its parent,
+        the scale it learnt, so it is not fitted again on its training rows.
+
+        Args:
+            * `meta` (dict | None): Metadata of the model.
+
+        Returns:
+            `MinMaxScaler | None`: The fitted scaler, None when it was not saved with the model.
+        """
+
+        state = None if meta is None else meta.get('scaler')
+        if state is None:
+            return None
+
+        from sklearn.preprocessing import MinMaxScaler
+        return MinMaxScaler(feature_range = tuple(state['feature_range'])).fit(np.array([[state['data_min']],
+                                                                                        [state['data_max']]]))
+
+    def _path(self, key: str, ext: str) -> str:
+        """Path of a registry file.
+
+        Args:
+            * `key` (str): Cache key.
+            * `ext` (str): File extension.
+
+        Returns:
+            `str`: Path of the file.
+        """
+
+        return os.path.join(self.root, key + ext)
+
+    def load(self, key: str) -> Any | None:
+        """Load a cached model and mark it as recently used.
+
+        Args:
+            * `key` (str): Cache key.
+
+        Returns:
+            `Sequential | None`: The model, None on a cache miss.
+        """
+
+        model_fl = self._path(key = key, ext = MODEL_EXT)
+        if not os.path.isfile(model_fl):
+            return None
+
+        from keras.models import load_model
+        try:
+            model = load_model(model_fl)
+        except Exception:   # Evicted or partially written by another process.
+            return None
+
+        for fl in (model_fl, self._path(key = key, ext = META_EXT)):
+            try:
+                os.utime(fl)
+            except OSError:
+                pass
+        return model
+
+    def save(self, key: str, model: Any, meta: dict) -> str:
+        """Save a model in the registry and evict the least recently used entries if needed.
+
+        Args:
+            * `key` (str): Cache key.
+            * `model` (Sequential): Trained model.
+            * `meta` (dict): Metadata saved in the json sidecar, starting from the model_ident() identity.
+
+        Returns:
+            `str`: Path of the saved model.
+        """
+
+        os.makedirs(self.root, exist_ok = True)
+        model_fl = self._path(key = key, ext = MODEL_EXT)
+        tmp_fl = self._path(key = f'{key}.{os.getpid()}.tmp', ext = MODEL_EXT)
+        model.save(tmp_fl)
+        os.replace(tmp_fl, model_fl)    # Atomic, parallel runs never load a half written model.
+
+        meta = dict(meta, key = key, family = self.family_key(ident = meta),
+                    created = datetime.datetime.now().isoformat())
+        meta_fl = self._path(key = key, ext = META_EXT)
+        with open(meta_fl + '.tmp', 'w') as fl_stream:
+            json.dump(meta, fl_stream, indent = 2, default = str)
+        os.replace(meta_fl + '.tmp', meta_fl)
+
+        self.evict()
+        return model_fl
+
+    def metadata(self, key: str) -> dict | None:
+        """Metadata of a cached model.
+
+        Args:
+            * `key` (str): Cache key.
+
+        Returns:
+            `dict | None`: Content of the json sidecar, None if the model is not cached.
+        """
+
+        try:
+            with open(self._path(key = key, ext = META_EXT), 'r') as fl_stream:
+                return json.load(fl_stream)
+        except (OSError, ValueError):
+            return None
+
+    def warm_start(self, ident: dict, df: pd.DataFrame, max_rows: int) -> dict | None:
+        """Find the latest cached model of the same family whose training data is a prefix of the
+        current data, i.e. only new days were appended since it was trained.
+
+        Args:
+            * `ident` (dict): Identity of the model to train, from model_ident().
+            * `df` (pd.DataFrame): Current training data.
+            * `max_rows` (int): Maximum number of appended rows, past it a full retrain is preferred.
+
+        Returns:
+            `dict | None`: Metadata of the parent model, None when no model can be warm started.
+        """
+
+        family = self.family_key(ident = ident)
+        candidates = []
+        for key, _, _ in self.entries():
+            meta = self.metadata(key = key)
+            if meta is None or meta.get('family') != family or meta['first_date'] != ident['first_date']:
+                continue
+            if not 0 < len(df) - meta['rows'] <= max_rows:
+                continue
+            candidates.append(meta)
+
+        for meta in sorted(candidates, key = lambda meta: meta['rows'], reverse = True):
+            prefix = df.iloc[:meta['rows']]
+            if str(prefix['Date'].iloc[-1]) == meta['last_date'] and self.fingerprint(df = prefix) == meta['fingerprint']:
+                return meta
+        return None
+
+    def latest(self, family: str) -> dict | None:
+        """Metadata of the most recently trained cached model of a family.
+
+        Args:
+            * `family` (str): Family key from family_key().
+
+        Returns:
+            `dict | None`: Content of the json sidecar, None when no model of the family is cached.
+        """
+
+        metas = [meta for meta in (self.metadata(key = key) for key, _, _ in self.entries())
+                if meta is not None and meta.get('family') == family]
+        return max(metas, key = lambda meta: (meta['created'], meta['rows']), default = None)
+
+    def entries(self) -> list[tuple[str, float, int]]:
+        """All the cached models, the least recently used first.
+
+        Returns:
+            `list[tuple[str, float, int]]`: Key, last use time and size in bytes of each model.
+        """
+
+        if not os.path.isdir(self.root):
+            return []
+
+        out = []
+        for fl in os.listdir(self.root):
+            if not fl.endswith(MODEL_EXT) or '.tmp' in fl:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, fl))
+            except OSError:
+                continue
+            out.append((fl[:-len(MODEL_EXT)], stat.st_mtime, stat.st_size))
+        return sorted(out, key = lambda entry: entry[1])
+
+    def evict(self) -> list:
+        """Remove the least recently used models until the registry fits in its budget.
+
+        Returns:
+            `list`: Keys of the evicted models.
+        """
+
+        entries = self.entries()
+        total = sum(entry[2] for entry in entries)
+        evicted = []
+        while entries and (len(entries) > self.max_entries or total > self.max_mb * 1e6):
+            key, _, size = entries.pop(0)
+            for ext in (MODEL_EXT, META_EXT):
+                try:
+                    os.remove(self._path(key = key, ext = ext))
+                except OSError:
+                    pass
+            total -= size
+            evicted.append(key)
+        return evicted
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+def thread_budget(workers: int, threads: int | None = None) -> int:
+    """CPU threads of each worker process.
+
+    Args:
+        * `workers` (int): Worker processes running at once.
+        * `threads` (int | None, optional): Threads asked for. Defaults to None (the CPUs shared by the workers).
+
+    Returns:
+        `int`: Threads of each worker, at least 1.
+    """
+
+    if threads is not None:
+        return max(1, int(threads))
+    return max(1, (os.cpu_count() or 1) // max(1, int(workers)))
+
+def init_worker(threads: int) -> None:
+    """Limit the CPU threads of a worker process, before Tensorflow starts.
+
+    Args:
+        * `threads` (int): Threads of the worker.
+    """
+
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def process_pool(workers: int, threads: int | None = None) -> ProcessPoolExecutor:
+    """Pool of worker processes for the training jobs. Workers are spawned instead of forked,
+    Tensorflow is not fork safe once initialised.
+
+    Args:
+        * `workers` (int): Worker processes.
+        * `threads` (int | None, optional): CPU threads of each worker, set by init_worker(). Defaults to None
+        (no limit).
+
+    Returns:
+        `ProcessPoolExecutor`: The pool.
+    """
+
+    if threads is None:
+        return ProcessPoolExecutor(max_workers = workers, mp_context = mp.get_context('spawn'))
+    return ProcessPoolExecutor(max_workers = workers, mp_context = mp.get_context('spawn'),
+                            initializer = init_worker, initargs = (threads,))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, time, zlib, threading
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import Final
+from lib.utils import dunders
+
+OHLCV_COLUMNS: Final[tuple] = ('Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume')
+PROVIDERS: Final[tuple] = ('yahoo', 'local', 'synthetic', 'faulty')
+FAULTY_LATENCY: Final[float] = 0.5     # Mean seconds the faulty provider waits before each download.
+FAULTY_FAILURE_RATE: Final[float] = 0.3    # Share of the faulty provider downloads that fail.
+PERMANENT_ERRORS: Final[tuple] = (FileNotFoundError, ValueError, KeyError)     # Deterministic, retrying does not help.
+
+class _provider(ABC):
+    """Abstract class for all the market data providers.
+
+    Every provider returns the same layout as yfinance.download: a DatetimeIndex named
+    Date and the Open, High, Low, Close, Adj Close and Volume columns. Errors that the same
+    request would raise again, a missing file or an unknown ticker, are PERMANENT_ERRORS and
+    are never retried. Any other error is transient.
+    """
+
+    @abstractmethod
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        """Get the daily bars of an asset.
+
+        Args:
+            * `ticker` (str): Asset name e.g. BTC-USD.
+            * `start` (str): Start date, inclusive.
+            * `end` (str): End date, exclusive.
+
+        Raises:
+            `PERMANENT_ERRORS`: The request can not succeed, e.g. FileNotFoundError for a missing asset file.
+
+        Returns:
+            `pd.DataFrame`: Bars of the asset.
+        """
+        pass
+
+    @staticmethod
+    def _date_range(df: pd.DataFrame, start: str, end: str) -> pd.DataFrame:
+        """Select the [start, end) rows of a bars dataframe.
+
+        Args:
+            * `df` (pd.DataFrame): Bars dataframe.
+            * `start` (str): Start date, inclusive.
+            * `end` (str): End date, exclusive.
+
+        Returns:
+            `pd.DataFrame`: The selected rows.
+        """
+
+        return df.loc[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+class yahoo_provider(_provider, dunders):
+    """Bars downloaded from Yahoo Finance.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        import yfinance as yf
+        df: pd.DataFrame = yf.download(tickers = ticker, start = start, end = end, auto_adjust = False)
+        if isinstance(df.columns, pd.MultiIndex):   # Newer yfinance versions add a ticker level.
+            df.columns = df.columns.get_level_values(0)
+        df.index.name = 'Date'
+        return df
+
+class local_provider(_provider, dunders):
+    """Bars read from a local directory holding one <ticker>.parquet or <ticker>.csv file per asset.
+
+    Args:
+        * `root` (str): Directory with the files.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        super().__init__()
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        parquet_fl = os.path.join(self.root, f'{ticker}.parquet')
+        csv_fl = os.path.join(self.root, f'{ticker}.csv')
+        if os.path.isfile(parquet_fl):
+            df = pd.read_parquet(parquet_fl)
+        elif os.path.isfile(csv_fl):
+            df = pd.read_csv(csv_fl)
+        else:
+            raise FileNotFoundError(f'No {ticker}.parquet or {ticker}.csv file in {self.root}.')
+
+        if 'Date' in df.columns:
+            df = df.set_index('Date')
+        df.index = pd.to_datetime(df.index)
+        df.index.name = 'Date'
+        df = df.rename(columns = {'Adj_Close': 'Adj Close'})
+        missing = [col for col in OHLCV_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f'{ticker} file in {self.root} has no {", ".join(missing)} columns.')
+        return self._date_range(df = df.sort_index(), start = start, end = end)
+
+class synthetic_provider(_provider, dunders):
+    """Deterministic synthetic bars, a geometric Brownian motion seeded by the ticker name.
+    A date always gets the same bar whatever range is requested, so offline runs and
+    benchmarks are reproducible and incremental updates line up.
+
+    Args:
+        * `seed` (int, optional): Seed shared by all tickers. Defaults to 0.
+        * `anchor` (str, optional): First date of every series. Defaults to 2000-01-01.
+        * `freq` (str, optional): Bar frequency as a pandas offset alias. Defaults to D.
+    """
+
+    def __init__(self, seed: int = 0, anchor: str = '2000-01-01', freq: str = 'D') -> None:
+        self.seed = seed
+        self.anchor = anchor
+        self.freq = freq
+        super().__init__()
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        index = pd.date_range(start = self.anchor, end = pd.Timestamp(end), freq = self.freq, name = 'Date')
+        index = index[index < pd.Timestamp(end)]
+        # One stream per field, drawn date by date, so the bar of a date does not depend on the range length.
+        returns_rng, spread_rng, volume_rng = (np.random.default_rng([zlib.crc32(ticker.encode()), self.seed, field])
+                                            for field in range(3))
+        n = len(index)
+
+        log_returns = returns_rng.normal(loc = 0.0003, scale = 0.02, size = n)
+        close = 100.0 * np.exp(np.cumsum(log_returns))
+        open_ = np.concatenate(([100.0], close[:-1]))
+        spread = np.abs(spread_rng.normal(loc = 0.0, scale = 0.01, size = (n, 2))).T
+        df = pd.DataFrame({'Open': open_,
+                        'High': np.maximum(open_, close) * (1 + spread[0]),
+                        'Low': np.minimum(open_, close) * (1 - spread[1]),
+                        'Close': close,
+                        'Adj Close': close,
+                        'Volume': volume_rng.integers(1e5, 1e7, size = n)}, index = index)
+        return self._date_range(df = df, start = start, end = end)
+
+class faulty_provider(_provider, dunders):
+    """Provider with injected latency and failures in front of another provider, to exercise the
+    ingestion retries and rate limits offline. Downloads wait an exponentially distributed time and
+    a share of them raise ConnectionError. Safe to call from many threads.
+
+    Args:
+        * `provider` (_provider): Provider of the bars of the successful downloads.
+        * `latency` (float, optional): Mean wait in seconds. Defaults to FAULTY_LATENCY.
+        * `failure_rate` (float, optional): Probability of a download failing. Defaults to FAULTY_FAILURE_RATE.
+        * `seed` (int, optional): Seed of the waits and failures. Defaults to 0.
+    """
+
+    def __init__(self, provider: _provider, latency: float = FAULTY_LATENCY,
+                failure_rate: float = FAULTY_FAILURE_RATE, seed: int = 0) -> None:
+        self.provider = provider
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_lock']     # Locks do not pickle, each process gets its own.
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        with self._lock:
+            wait = self._rng.exponential(self.latency) if self.latency > 0 else 0.0
+            fail = self._rng.random() < self.failure_rate
+            self.calls += 1
+            self.failures += fail
+        time.sleep(wait)
+        if fail:
+            raise ConnectionError(f'Injected failure downloading {ticker}.')
+        return self.provider.download(ticker = ticker, start = start, end = end)
+
+class cached_provider(_provider, dunders):
+    """Read-through cache in front of a provider. Each ticker and date range is fetched once
+    per run, and, with a store directory, once across runs.
+
+    Args:
+        * `provider` (_provider): Provider to fetch from on a miss.
+        * `store` (str | None, optional): Directory of the on-disk cache. Defaults to None (memory only).
+    """
+
+    def __init__(self, provider: _provider, store: str | None = None) -> None:
+        self.provider = provider
+        self.store = store
+        self._memory = {}
+        super().__init__()
+
+    def _store_path(self, ticker: str, start: str, end: str) -> str:
+        """Path of a cached range in the store.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `start` (str): Start date.
+            * `end` (str): End date.
+
+        Returns:
+            `str`: Path of the csv file.
+        """
+
+        start, end = pd.Timestamp(start).date().isoformat(), pd.Timestamp(end).date().isoformat()
+        return os.path.join(self.store, ticker, f'{start}_{end}.csv')
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        key = (ticker, pd.Timestamp(start), pd.Timestamp(end))
+        if key in self._memory:
+            return self._memory[key].copy()
+
+        store_fl = None if self.store is None else self._store_path(ticker = ticker, start = start, end = end)
+        if store_fl is not None and os.path.isfile(store_fl):
+            df = pd.read_csv(store_fl, index_col = 'Date', parse_dates = ['Date'])
+        else:
+            df = self.provider.download(ticker = ticker, start = start, end = end)
+            if store_fl is not None and len(df):
+                os.makedirs(os.path.dirname(store_fl), exist_ok = True)
+                df.to_csv(store_fl + '.tmp')
+                os.replace(store_fl + '.tmp', store_fl)
+
+        self._memory[key] = df
+        return df.copy()
+
+def get_provider(name: str, root: str | None = None, seed: int = 0, store: str | None = None) -> cached_provider:
+    """Build a provider behind a read-through cache.
+
+    Args:
+        * `name` (str): Provider name: yahoo, local, synthetic or faulty (synthetic bars with injected latency and failures).
+        * `root` (str | None, optional): Directory of the local provider. Defaults to None.
+        * `seed` (int, optional): Seed of the synthetic and faulty providers. Defaults to 0.
+        * `store` (str | None, optional): Directory of the on-disk cache. Defaults to None.
+
+    Raises:
+        `ValueError`: Unknown provider or local provider without a directory.
+
+    Returns:
+        `cached_provider`: The cached provider.
+    """
+
+    if name == 'yahoo':
+        provider = yahoo_provider()
+    elif name == 'local':
+        if root is None:
+            raise ValueError('The local provider needs a directory with the asset files.')
+        provider = local_provider(root = root)
+    elif name == 'synthetic':
+        provider = synthetic_provider(seed = seed)
+    elif name == 'faulty':
+        provider = faulty_provider(provider = synthetic_provider(seed = seed), seed = seed)
+    else:
+        raise ValueError(f'Provider: {name} is not valid. Valid providers are: {", ".join(PROVIDERS)}.')
+
+    return cached_provider(provider = provider, store = store)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Callable, Final
+from lib.db_utils import record_risk, risk_last_dates
+from lib.storage import _storage
+from lib.utils import dunders
+
+RISK_METRICS: Final[tuple] = ('volatility', 'max_drawdown', 'sharpe', 'sortino', 'beta', 'var')   # Columns of the risk_metrics table.
+RISK_WINDOWS: Final[tuple] = (21, 63, 252)  # One month, one quarter and one year of trading days.
+TRADING_DAYS: Final[int] = 252  # Periods per year used to annualise.
+VAR_LEVEL: Final[float] = 0.95  # Confidence of the historical value at risk.
+WINDOW_CHUNK: Final[int] = 1 << 24     # Most values of the window views reduced at once.
+
+def log_returns(prices: np.ndarray) -> np.ndarray:
+    """Log returns of price columns, NaN on the first row.
+
+    Args:
+        * `prices` (np.ndarray): Prices of shape (days,) or (days, assets).
+
+    Returns:
+        `np.ndarray`: Float64 log returns of the same shape.
+    """
+
+    prices = np.asarray(prices, dtype = np.float64)
+    out = np.full(prices.shape, np.nan)
+    out[1:] = np.log(prices[1:] / prices[:-1])
+    return out
+
+def annualized_volatility(prices: np.ndarray, periods: int = TRADING_DAYS) -> float:
+    """Annualised standard deviation of the log returns over the whole series.
+
+    Args:
+        * `prices` (np.ndarray): Prices of shape (days,).
+        * `periods` (int, optional): Periods per year. Defaults to TRADING_DAYS.
+
+    Returns:
+        `float`: The volatility, a fraction.
+    """
+
+    return float(np.nanstd(log_returns(prices = prices), ddof = 1) * periods ** .5)
+
+def _rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """Sum of the trailing windows of every column from cumulative sums, one pass whatever the window.
+
+    Args:
+        * `x` (np.ndarray): Values of shape (days, assets), NaN where missing.
+        * `window` (int): Window length in rows.
+
+    Returns:
+        `np.ndarray`: Sums of the same shape, NaN for windows that are not full or hold a NaN.
+    """
+
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    valid = np.isfinite(x)
+    zero = np.zeros((1, *x.shape[1:]))
+    sums = np.concatenate((zero, np.cumsum(np.where(valid, x, 0.0), axis = 0)))
+    counts = np.concatenate((zero, np.cumsum(valid, axis = 0)))
+    out[window - 1:] = sums[window:] - sums[:-window]
+    out[window - 1:][counts[window:] - counts[:-window] < window] = np.nan
+    return out
+
+def _window_reduce(x: np.ndarray, window: int, func: Callable[[np.ndarray], np.ndarray],
+                chunk: int = WINDOW_CHUNK) -> np.ndarray:
+    """Reduce the trailing windows of every column with a function that needs the whole window.
+    The windows are strided views, reduced a block of days at a time so at most chunk values
+    are materialised.
+
+    Args:
+        * `x` (np.ndarray): Values of shape (days, assets).
+        * `window` (int): Window length in rows.
+        * `func` (Callable[[np.ndarray], np.ndarray]): Reduction over the last axis of a (days, assets, window) block.
+        * `chunk` (int, optional): Most values reduced at once. Defaults to WINDOW_CHUNK.
+
+    Returns:
+        `np.ndarray`: Results of shape (days, assets), NaN before the first full window.
+    """
+
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    views = sliding_window_view(x, window, axis = 0)
+    step = max(1, chunk // (x.shape[1] * window))
+    for start in range(0, len(views), step):
+        out[window - 1 + start:window + start + step - 1] = func(views[start:start + step])
+    return out
+
+def _drawdown(block: np.ndarray) -> np.ndarray:
+    """Largest fall from a running peak within each price window.
+
+    Args:
+        * `block` (np.ndarray): Price windows of shape (days, assets, window).
+
+    Returns:
+        `np.ndarray`: Maximum drawdowns, negative fractions.
+    """
+
+    return (block / np.maximum.accumulate(block, axis = -1) - 1).min(axis = -1)
+
+def rolling_risk(prices: np.ndarray, window: int, market: np.ndarray | None = None, periods: int = TRADING_DAYS,
+                risk_free: float = 0.0, level: float = VAR_LEVEL) -> dict[str, np.ndarray]:
+    """Rolling risk metrics of a whole panel of assets at once. Means, deviations and covariances
+    come from cumulative sums, the drawdowns and quantiles from chunked window views, so no
+    per-asset or per-day Python loop runs.
+
+    Args:
+        * `prices` (np.ndarray): Aligned prices of shape (days, assets), NaN where an asset has no price.
+        * `window` (int): Window length in returns.
+        * `market` (np.ndarray | None, optional): Log returns of the beta benchmark, shape (days,). Defaults to
+        None (equal weighted mean of the panel returns).
+        * `periods` (int, optional): Periods per year. Defaults to TRADING_DAYS.
+        * `risk_free` (float, optional): Annual risk free rate. Defaults to 0.0.
+        * `level` (float, optional): Value at risk confidence. Defaults to VAR_LEVEL.
+
+    Raises:
+        `ValueError`: Window shorter than two returns.
+
+    Returns:
+        `dict[str, np.ndarray]`: Each of RISK_METRICS, shape (days, assets) and NaN where the window is not
+        full. Volatility, Sharpe and Sortino ratios are annualised, the max drawdown is a negative fraction of
+        the peak over window + 1 prices and the value at risk a positive fraction of the daily log return.
+    """
+
+    if window < 2:
+        raise ValueError(f'Window ({window}) must be at least 2 returns.')
+
+    prices = np.asarray(prices, dtype = np.float64)
+    prices = prices.reshape(len(prices), -1)
+    returns = log_returns(prices = prices)
+    if market is None:
+        valid = np.isfinite(returns)
+        with np.errstate(invalid = 'ignore'):
+            market = np.where(valid, returns, 0.0).sum(axis = 1) / valid.sum(axis = 1)
+    market = np.asarray(market, dtype = np.float64).reshape(-1, 1)
+
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        excess = returns - risk_free / periods
+        s1 = _rolling_sum(x = returns, window = window)
+        mean = s1 / window
+        var = np.maximum(_rolling_sum(x = returns ** 2, window = window) - s1 * mean, 0.0) / (window - 1)
+        std = np.sqrt(var)
+        downside = np.sqrt(_rolling_sum(x = np.minimum(excess, 0.0) ** 2, window = window) / window)
+
+        m1 = _rolling_sum(x = market, window = window)
+        m_var = (_rolling_sum(x = market ** 2, window = window) - m1 * m1 / window) / (window - 1)
+        cov = (_rolling_sum(x = returns * market, window = window) - s1 * m1 / window) / (window - 1)
+
+        mean_excess = mean - risk_free / periods
+        return {'volatility': std * periods ** .5,
+                'max_drawdown': _window_reduce(x = prices, window = window + 1, func = _drawdown),
+                'sharpe': np.where(std > 0, mean_excess / std, np.nan) * periods ** .5,
+                'sortino': np.where(downside > 0, mean_excess / downside, np.nan) * periods ** .5,
+                'beta': np.where(m_var > 0, cov / m_var, np.nan),
+                'var': -_window_reduce(x = returns, window = window,
+                                    func = lambda block: np.quantile(block, 1 - level, axis = -1))}
+
+def price_panel(storage: _storage, assets: list, start: str | None = None, column: str = 'Adj_Close') -> pd.DataFrame:
+    """Prices of many assets aligned on their dates. Gaps inside the history of an asset are
+    forward filled, no price is made up before its first or after its last stored day.
+
+    Args:
+        * `storage` (_storage): Price storage backend.
+        * `assets` (list): Asset names.
+        * `start` (str | None, optional): First date, inclusive. Defaults to None.
+        * `column` (str, optional): Price column. Defaults to Adj_Close.
+
+    Returns:
+        `pd.DataFrame`: Float64 prices, one column per asset, indexed by the sorted dates.
+    """
+
+    series = {}
+    for asset in assets:
+        df = storage.read(ticker = asset, columns = ['Date', column], start = start, dtypes = {column: 'float64'})
+        series[asset] = pd.Series(df[column].to_numpy(), index = df['Date'].to_numpy())
+    panel = pd.DataFrame(series, columns = list(assets)).sort_index()
+    return panel.ffill().where(panel.bfill().notna())
+
+class risk_engine(dunders):
+    """Rolling risk metrics of a panel of assets, stored in the risk_metrics table. Every update only
+    reads the prices needed for the days after the last stored metrics and only writes those days.
+
+    Args:
+        * `db` (str): Database of the risk_metrics table.
+        * `storage` (_storage): Price storage backend.
+        * `windows` (tuple, optional): Window lengths in days. Defaults to RISK_WINDOWS.
+        * `benchmark` (str | None, optional): Asset the betas are measured against. Defaults to None (equal
+        weighted panel).
+        * `periods` (int, optional): Periods per year. Defaults to TRADING_DAYS.
+        * `risk_free` (float, optional): Annual risk free rate. Defaults to 0.0.
+        * `level` (float, optional): Value at risk confidence. Defaults to VAR_LEVEL.
+    """
+
+    def __init__(self, db: str, storage: _storage, windows: tuple = RISK_WINDOWS, benchmark: str | None = None,
+                periods: int = TRADING_DAYS, risk_free: float = 0.0, level: float = VAR_LEVEL) -> None:
+        self.db = db
+        self.storage = storage
+        self.windows = windows
+        self.benchmark = benchmark
+        self.periods = periods
+        self.risk_free = risk_free
+        self.level = level
+        super().__init__()
+
+    def _lookback(self, window: int, last: dict[str, str], assets: list) -> str | None:
+        """First date to read so the first new window of every asset is full.
+
+        Args:
+            * `window` (int): Window length in days.
+            * `last` (dict[str, str]): Last stored date by asset.
+            * `assets` (list): Asset names.
+
+        Returns:
+            `str | None`: The date, None when an asset has no stored metrics and its whole history is needed.
+        """
+
+        if any(asset not in last for asset in assets):
+            return None
+        # Calendar days spanning window + 1 trading days, with room for weekends and holidays.
+        return (pd.Timestamp(min(last[asset] for asset in assets)) - pd.Timedelta(days = int(window * 1.5) + 10)).isoformat(' ')
+
+    def update(self, assets: list, full: bool = False) -> dict[int, int]:
+        """Compute and store the metrics of the days after the last stored ones.
+
+        Args:
+            * `assets` (list): Asset names.
+            * `full` (bool, optional): Recompute the whole history. Defaults to False.
+
+        Returns:
+            `dict[int, int]`: Rows written by window.
+        """
+
+        assets = list(dict.fromkeys(assets))
+        panel_assets = assets if self.benchmark is None or self.benchmark in assets else [*assets, self.benchmark]
+        written = {}
+        for window in self.windows:
+            last = {} if full else risk_last_dates(db = self.db, window = window)
+            panel = price_panel(storage = self.storage, assets = panel_assets,
+                                start = self._lookback(window = window, last = last, assets = assets))
+            market = None if self.benchmark is None else log_returns(prices = panel[self.benchmark].to_numpy())
+            prices = panel.loc[:, assets].to_numpy()
+            metrics = rolling_risk(prices = prices, window = window, market = market, periods = self.periods,
+                                risk_free = self.risk_free, level = self.level)
+
+            dates = panel.index.to_numpy().astype(str)
+            stacked = np.stack([metrics[name] for name in RISK_METRICS], axis = -1)    # (days, assets, metrics)
+            new = dates[:, None] > np.array([last.get(asset, '') for asset in assets])[None, :]
+            days, cols = np.nonzero(new & np.isfinite(stacked).any(axis = -1))
+            values = np.where(np.isfinite(stacked[days, cols]), stacked[days, cols], None).tolist()    # NULL for NaN.
+            rows = [(assets[col], window, dates[day], *vals) for day, col, vals in zip(days.tolist(), cols.tolist(), values)]
+            written[window] = record_risk(db = self.db, rows = rows)
+        return written
+
+def risk_summary(db: str, assets: list, windows: tuple = RISK_WINDOWS) -> str:
+    """Format the latest stored metrics of the assets as a table.
+
+    Args:
+        * `db` (str): Database of the risk_metrics table.
+        * `assets` (list): Asset names.
+        * `windows` (tuple, optional): Window lengths in days. Defaults to RISK_WINDOWS.
+
+    Returns:
+        `str`: The summary table.
+    """
+
+    from lib.db_utils import risk_history
+
+    lines = [f'{"Asset":<12}{"Window":>7}{"Date":>12}{"Vol %":>9}{"MaxDD %":>9}{"Sharpe":>8}{"Sortino":>9}'
+            f'{"Beta":>7}{"VaR %":>8}']
+    for asset in assets:
+        for window in windows:
+            df = risk_history(db = db, asset = asset, window = window)
+            if len(df) == 0:
+                continue
+            row = df.iloc[-1]
+            lines.append(f'{asset:<12}{window:>7}{str(row["date"])[:10]:>12}{row["volatility"] * 100:>9.2f}'
+                        f'{row["max_drawdown"] * 100:>9.2f}{row["sharpe"]:>8.2f}{row["sortino"]:>9.2f}'
+                        f'{row["beta"]:>7.2f}{row["var"] * 100:>8.2f}')
+    return '\n'.join(lines)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, sqlite3, shutil, uuid
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import Final
+from lib.db_utils import db_conn, bulk_write, query_columns, DATE_FORMAT
+from lib.utils import dunders
+
+PRICE_COLUMNS: Final[tuple] = ('Date', 'Open', 'High', 'Low', 'Close', 'Adj_Close', 'Volume')
+STORAGES: Final[tuple] = ('sqlite', 'parquet')
+ASSET_TABLES: Final[str] = 'asset_tables'   # SQLite table of the ticker of each price table, table names lose the - of tickers.
+
+class _storage(ABC):
+    """Abstract class for the price storage backends. Prices are stored per asset with the
+    PRICE_COLUMNS layout and only new rows are ever appended.
+    """
+
+    @abstractmethod
+    def stored_range(self, ticker: str) -> tuple[str, str] | None:
+        """Get the stored date range of an asset.
+
+        Args:
+            * `ticker` (str): Asset name e.g. BTC-USD.
+
+        Returns:
+            `tuple[str, str] | None`: First and last stored dates. None when nothing usable is stored
+            and the asset has to be written from scratch.
+        """
+        pass
+
+    @abstractmethod
+    def replace(self, ticker: str, df: pd.DataFrame) -> int:
+        """Replace all the stored rows of an asset.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `df` (pd.DataFrame): Rows with the PRICE_COLUMNS layout, Date as datetime.
+
+        Returns:
+            `int`: Number of rows written.
+        """
+        pass
+
+    @abstractmethod
+    def append(self, ticker: str, df: pd.DataFrame) -> int:
+        """Append rows to an asset. Rows with a stored date are dropped.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `df` (pd.DataFrame): Rows with the PRICE_COLUMNS layout, Date as datetime.
+
+        Returns:
+            `int`: Number of rows written.
+        """
+        pass
+
+    def append_many(self, frames: dict[str, pd.DataFrame]) -> dict[str, int]:
+        """Append rows to many assets at once. Backends that can write them in a single
+        transaction override it.
+
+        Args:
+            * `frames` (dict[str, pd.DataFrame]): Rows of each asset, as in append().
+
+        Returns:
+            `dict[str, int]`: Number of rows written for each asset.
+        """
+
+        return {ticker: self.append(ticker = ticker, df = df) for ticker, df in frames.items()}
+
+    @abstractmethod
+    def read(self, ticker: str, columns: list | None = None, start: str | None = None,
+            end: str | None = None, dtypes: dict | None = None) -> pd.DataFrame:
+        """Read the rows of an asset, sorted by date.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `columns` (list | None, optional): Columns to read. Defaults to None (all the columns).
+            * `start` (str | None, optional): First date, inclusive. Defaults to None.
+            * `end` (str | None, optional): Last date, inclusive. Defaults to None.
+            * `dtypes` (dict | None, optional): NumPy dtype of each column. Defaults to None.
+
+        Returns:
+            `pd.DataFrame`: The rows, with Date formatted as DATE_FORMAT strings.
+        """
+        pass
+
+    @abstractmethod
+    def assets(self) -> list:
+        """All the stored assets.
+
+        Returns:
+            `list`: Asset names.
+        """
+        pass
+
+class sqlite_storage(_storage, dunders):
+    """Prices stored in one SQLite table per asset, named <asset>_<model>. The ASSET_TABLES table
+    keeps the ticker of every price table, since the table names replace - with _.
+
+    Args:
+        * `db` (str): Database name.
+        * `model_name` (str): Model name, part of the table names.
+    """
+
+    def __init__(self, db: str, model_name: str) -> None:
+        self.db = db
+        self.model_name = model_name
+        super().__init__()
+
+    def table_name(self, ticker: str) -> str:
+        """Name of the table holding the asset data.
+
+        Args:
+            * `ticker` (str): Asset name e.g. BTC-USD.
+
+        Returns:
+            `str`: Table name.
+        """
+
+        return ticker.replace("-", "_") + f'_{self.model_name}'
+
+    @staticmethod
+    def _asset_tables(engine: sqlite3.Connection) -> None:
+        """Create the ASSET_TABLES table.
+
+        Args:
+            * `engine` (sqlite3.Connection): Database connection.
+        """
+
+        engine.execute(f'CREATE TABLE IF NOT EXISTS {ASSET_TABLES} (ticker TEXT NOT NULL, model TEXT NOT NULL, '
+                    'table_name TEXT NOT NULL, PRIMARY KEY (ticker, model))')
+
+    def _register(self, engine: sqlite3.Connection, tickers: list) -> None:
+        """Record the tickers of asset tables in the ASSET_TABLES table, inside the open transaction.
+
+        Args:
+            * `engine` (sqlite3.Connection): Database connection.
+            * `tickers` (list): Asset names.
+        """
+
+        self._asset_tables(engine = engine)
+        engine.executemany(f'INSERT OR IGNORE INTO {ASSET_TABLES} VALUES (?, ?, ?)',
+                        [(ticker, self.model_name, self.table_name(ticker = ticker)) for ticker in tickers])
+
+    @staticmethod
+    def _date_guard(engine: sqlite3.Connection, table: str) -> bool:
+        """Create the unique Date index used to drop duplicate rows on appends.
+
+        Args:
+            * `engine` (sqlite3.Connection): Database connection.
+            * `table` (str): Table name.
+
+        Returns:
+            `boolean`: True if the index exists, False if the table already holds duplicate dates.
+        """
+
+        try:
+            with engine:
+                engine.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_Date" ON "{table}" (Date)')
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def stored_range(self, ticker: str) -> tuple[str, str] | None:
+        table = self.table_name(ticker = ticker)
+        engine = db_conn(db = self.db)
+        cur = engine.cursor()
+        cur.execute("SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        if cur.fetchone()[0] == 0:
+            return None
+
+        cols = [row[1] for row in cur.execute(f'PRAGMA table_info("{table}")')]
+        if cols != ['index', *PRICE_COLUMNS] or not self._date_guard(engine = engine, table = table):
+            return None     # Not the price table layout or duplicate dates, rebuild it.
+
+        cur.execute(f'SELECT MIN(Date), MAX(Date) FROM "{table}"')
+        first, last = cur.fetchone()
+        return None if last is None else (first, last)
+
+    def replace(self, ticker: str, df: pd.DataFrame) -> int:
+        table = self.table_name(ticker = ticker)
+        engine = db_conn(db = self.db)
+        with engine:    # Drop, create and insert in a single transaction.
+            df.loc[:, list(PRICE_COLUMNS)].reset_index(drop = True).to_sql(table, con = engine, if_exists = 'replace', index = True)
+            self._register(engine = engine, tickers = [ticker])
+        self._date_guard(engine = engine, table = table)
+        return len(df)
+
+    def _append_rows(self, ticker: str, df: pd.DataFrame) -> tuple[str, list]:
+        """Insert statement and parameters appending rows to an asset table.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `df` (pd.DataFrame): Rows with the PRICE_COLUMNS layout, Date as datetime.
+
+        Returns:
+            `tuple[str, list]`: Statement, rows with a stored Date are ignored, and the parameters of each row.
+        """
+
+        table = self.table_name(ticker = ticker)
+        last_idx = db_conn(db = self.db).execute(f'SELECT MAX("index") FROM "{table}"').fetchone()[0]
+        df = df.loc[:, list(PRICE_COLUMNS)].copy()
+        df.index = range(last_idx + 1, last_idx + 1 + len(df))
+        df['Date'] = df['Date'].map(lambda ts: ts.isoformat(' '))  # Same format as pandas.to_sql.
+        cols = ', '.join(f'"{c}"' for c in ('index', *PRICE_COLUMNS))
+        return (f'INSERT OR IGNORE INTO "{table}" ({cols}) VALUES ({", ".join("?" * (len(PRICE_COLUMNS) + 1))})',
+                list(df.itertuples(index = True, name = None)))
+
+    def append(self, ticker: str, df: pd.DataFrame) -> int:
+        statement, rows = self._append_rows(ticker = ticker, df = df)
+        engine = db_conn(db = self.db)
+        with engine:    # Tables written before ASSET_TABLES are registered on their next update.
+            self._register(engine = engine, tickers = [ticker])
+        return bulk_write(db = self.db, statement = statement, rows = rows)    # Single transaction.
+
+    def append_many(self, frames: dict[str, pd.DataFrame]) -> dict[str, int]:
+        writes = {ticker: self._append_rows(ticker = ticker, df = df) for ticker, df in frames.items()}
+        engine = db_conn(db = self.db)
+        with engine:    # One transaction for all the assets, rolled back together on error.
+            self._register(engine = engine, tickers = list(writes))
+            return {ticker: engine.executemany(statement, rows).rowcount for ticker, (statement, rows) in writes.items()}
+
+    def read(self, ticker: str, columns: list | None = None, start: str | None = None,
+            end: str | None = None, dtypes: dict | None = None) -> pd.DataFrame:
+        return query_columns(database = self.db, table = self.table_name(ticker = ticker), columns = columns,
+                            start = start, end = end, dtypes = dtypes)
+
+    def assets(self) -> list:
+        engine = db_conn(db = self.db)
+        with engine:
+            self._asset_tables(engine = engine)
+        cursor = engine.execute(f"SELECT a.ticker FROM {ASSET_TABLES} AS a JOIN sqlite_master AS m "
+                                "ON m.type = 'table' AND m.name = a.table_name WHERE a.model = ? ORDER BY a.ticker",
+                                (self.model_name,))
+        return [row[0] for row in cursor.fetchall()]
+
+class parquet_storage(_storage, dunders):
+    """Prices stored in a Parquet dataset, one per asset type, partitioned by ticker and year.
+    Writes only add new files and reads only load the requested columns and partitions.
+
+    Args:
+        * `root` (str): Directory of the dataset.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        super().__init__()
+
+    def _dataset(self):
+        """Open the dataset with its hive partitioning.
+
+        Returns:
+            `pyarrow.dataset.Dataset`: The dataset.
+        """
+
+        import pyarrow.dataset as ds
+        return ds.dataset(self.root, format = 'parquet', partitioning = 'hive')
+
+    def _ticker_dir(self, ticker: str) -> str:
+        """Directory of the ticker partition.
+
+        Args:
+            * `ticker` (str): Asset name.
+
+        Returns:
+            `str`: Path of the partition.
+        """
+
+        return os.path.join(self.root, f'ticker={ticker}')
+
+    def _filter(self, ticker: str, start: str | None = None, end: str | None = None):
+        """Predicate on the partition and Date columns, pushed down to the file scan.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `start` (str | None, optional): First date, inclusive. Defaults to None.
+            * `end` (str | None, optional): Last date, inclusive. Defaults to None.
+
+        Returns:
+            `pyarrow.dataset.Expression`: The predicate.
+        """
+
+        import pyarrow.dataset as ds
+        expr = ds.field('ticker') == ticker
+        if start is not None:
+            start = pd.Timestamp(start)
+            expr = expr & (ds.field('year') >= start.year) & (ds.field('Date') >= start.to_pydatetime())
+        if end is not None:
+            end = pd.Timestamp(end)
+            expr = expr & (ds.field('year') <= end.year) & (ds.field('Date') <= end.to_pydatetime())
+        return expr
+
+    def stored_range(self, ticker: str) -> tuple[str, str] | None:
+        if not os.path.isdir(self._ticker_dir(ticker = ticker)):
+            return None
+
+        import pyarrow.compute as pc
+        dates = self._dataset().to_table(columns = ['Date'], filter = self._filter(ticker = ticker))['Date']
+        if len(dates) == 0:
+            return None
+        bounds = pc.min_max(dates)
+        return (pd.Timestamp(bounds['min'].as_py()).strftime(DATE_FORMAT),
+                pd.Timestamp(bounds['max'].as_py()).strftime(DATE_FORMAT))
+
+    def replace(self, ticker: str, df: pd.DataFrame) -> int:
+        shutil.rmtree(self._ticker_dir(ticker = ticker), ignore_errors = True)
+        return self.append(ticker = ticker, df = df)
+
+    def _stored_dates(self, ticker: str, years: list) -> pd.Series:
+        """Stored dates of an asset in some years, only their partitions are scanned.
+
+        Args:
+            * `ticker` (str): Asset name.
+            * `years` (list): Years of the partitions.
+
+        Returns:
+            `pd.Series`: The stored dates as datetime.
+        """
+
+        if not os.path.isdir(self._ticker_dir(ticker = ticker)):
+            return pd.Series([], dtype = 'datetime64[ns]')
+
+        import pyarrow.dataset as ds
+        expr = (ds.field('ticker') == ticker) & ds.field('year').isin(years)
+        return self._dataset().to_table(columns = ['Date'], filter = expr)['Date'].to_pandas()
+
+    def append(self, ticker: str, df: pd.DataFrame) -> int:
+        if len(df) == 0:
+            return 0
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        df = df.loc[:, list(PRICE_COLUMNS)].copy()
+        df['Date'] = pd.to_datetime(df['Date'])
+        df = df.drop_duplicates(subset = 'Date')    # The first row of a date is kept, as INSERT OR IGNORE does.
+        stored = self._stored_dates(ticker = ticker, years = df['Date'].dt.year.unique().tolist())
+        df = df[~df['Date'].isin(stored)]
+        if len(df) == 0:
+            return 0
+        df['ticker'] = ticker
+        df['year'] = df['Date'].dt.year
+        table = pa.Table.from_pandas(df, preserve_index = False)
+        pq.write_to_dataset(table, root_path = self.root, partition_cols = ['ticker', 'year'],
+                            basename_template = f'part-{uuid.uuid4().hex}-{{i}}.parquet')
+        return len(df)
+
+    def read(self, ticker: str, columns: list | None = None, start: str | None = None,
+            end: str | None = None, dtypes: dict | None = None) -> pd.DataFrame:
+        columns = list(PRICE_COLUMNS) if columns is None else list(columns)
+        scan_cols = columns if 'Date' in columns else ['Date', *columns]
+        if not os.path.isdir(self._ticker_dir(ticker = ticker)):
+            return pd.DataFrame(columns = columns)
+
+        table = self._dataset().to_table(columns = scan_cols, filter = self._filter(ticker = ticker, start = start, end = end))
+        df = table.to_pandas().sort_values('Date').reset_index(drop = True)
+        df['Date'] = df['Date'].dt.strftime(DATE_FORMAT)
+        df = df.loc[:, columns]
+        return df if dtypes is None else df.astype({col: dtype for col, dtype in dtypes.items() if col in columns})
+
+    def assets(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(fl.split('=', 1)[1] for fl in os.listdir(self.root) if fl.startswith('ticker='))
+
+def get_storage(name: str, db: str, model_name: str, root: str | None = None) -> _storage:
+    """Build a price storage backend.
+
+    Args:
+        * `name` (str): Backend name: sqlite or parquet.
+        * `db` (str): SQLite database name.
+        * `model_name` (str): Model name, part of the SQLite table names.
+        * `root` (str | None, optional): Directory of the Parquet dataset. Defaults to None.
+
+    Raises:
+        `ValueError`: Unknown backend or Parquet backend without a directory.
+
+    Returns:
+        `_storage`: The storage backend.
+    """
+
+    if name == 'sqlite':
+        return sqlite_storage(db = db, model_name = model_name)
+    elif name == 'parquet':
+        if root is None:
+            raise ValueError('The parquet storage needs a dataset directory.')
+        return parquet_storage(root = root)
+    raise ValueError(f'Storage: {name} is not valid. Valid storages are: {", ".join(STORAGES)}.')
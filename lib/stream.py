@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, json, queue, shutil, socketserver, threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from time import perf_counter, sleep
+import numpy as np
+import pandas as pd
+from typing import Any, Final
+from lib.utils import dunders
+from lib.storage import _storage, PRICE_COLUMNS
+from lib.model_registry import model_registry
+from lib.inference import inference_request, horizon_predict, INPUT_DTYPE
+from lib.db_utils import new_run_id, latest_run, record_run, copy_predictions, record_stream, DATE_FORMAT
+
+STREAM_POLL: Final[float] = 0.05   # Seconds between two scans of a watched directory.
+STREAM_HOST: Final[str] = '127.0.0.1'   # The socket source only listens locally.
+PROCESSED_DIR: Final[str] = 'processed'     # Subdirectory the read bar files are moved to.
+
+def parse_bar(bar: dict, ticker: str | None = None) -> dict:
+    """Bar in the storage layout. Only the Date and Close fields are required, the missing prices
+    default to Close and the missing volume to 0.
+
+    Args:
+        * `bar` (dict): Bar fields, Ticker, Date, Open, High, Low, Close, Adj Close or Adj_Close and Volume.
+        * `ticker` (str | None, optional): Asset of bars without a Ticker field. Defaults to None.
+
+    Raises:
+        `ValueError`: Bar without an asset, a date or a close price.
+
+    Returns:
+        `dict`: ticker and the PRICE_COLUMNS, Date as a Timestamp.
+    """
+
+    fields = {str(key).strip().replace(' ', '_').lower(): value for key, value in bar.items()}
+    ticker = fields.get('ticker', ticker)
+    if not ticker or fields.get('date') is None or fields.get('close') is None:
+        raise ValueError(f'A bar needs a ticker, a date and a close price: {bar}.')
+
+    close = float(fields['close'])
+    out = {'ticker': str(ticker), 'Date': pd.Timestamp(fields['date'])}
+    for col in PRICE_COLUMNS[1:]:
+        value = fields.get(col.lower())
+        out[col] = (0.0 if col == 'Volume' else close) if value is None or pd.isna(value) else float(value)
+    return out
+
+class _bar_source(ABC):
+    """Abstract class for all the sources of live bars.
+    """
+
+    @abstractmethod
+    def poll(self, timeout: float) -> list[tuple[dict, float]]:
+        """Wait for new bars.
+
+        Args:
+            * `timeout` (float): Longest wait in seconds.
+
+        Returns:
+            `list[tuple[dict, float]]`: Bars from parse_bar() in arrival order, each with its perf_counter() arrival
+            time. Empty when nothing arrived.
+        """
+        pass
+
+    def close(self) -> None:
+        """Release the resources of the source.
+        """
+        pass
+
+class directory_source(_bar_source, dunders):
+    """Bars dropped as csv files in a watched directory, one bar per row. Files without a Ticker
+    column are named <ticker>.<anything>.csv. New files are read oldest first and moved to the
+    processed subdirectory. Writers should write under another name and rename the file into the
+    directory, so that a file is never read half written.
+
+    Args:
+        * `root` (str): Watched directory.
+        * `poll` (float, optional): Seconds between two scans. Defaults to STREAM_POLL.
+    """
+
+    def __init__(self, root: str, poll: float = STREAM_POLL) -> None:
+        self.root = root
+        self.interval = poll
+        os.makedirs(os.path.join(root, PROCESSED_DIR), exist_ok = True)
+        super().__init__()
+
+    def _read(self, fl: str) -> list[dict]:
+        """Bars of a dropped file.
+
+        Args:
+            * `fl` (str): File name.
+
+        Returns:
+            `list[dict]`: Bars from parse_bar(), empty when the file is not a valid bar file.
+        """
+
+        try:
+            df = pd.read_csv(os.path.join(self.root, fl))
+            return [parse_bar(bar = row, ticker = fl.split('.', 1)[0]) for row in df.to_dict(orient = 'records')]
+        except (OSError, ValueError, pd.errors.ParserError) as e:
+            print(f'Skipped bar file {fl}: {e}')
+            return []
+
+    def poll(self, timeout: float) -> list[tuple[dict, float]]:
+        waited = 0.0
+        while True:
+            with os.scandir(self.root) as it:
+                drops = sorted((entry.stat().st_mtime, entry.name) for entry in it
+                            if entry.is_file() and entry.name.endswith('.csv') and not entry.name.startswith('.'))
+            if drops or waited >= timeout:
+                break
+            sleep(min(self.interval, timeout - waited))
+            waited += self.interval
+
+        bars = []
+        for _, fl in drops:
+            arrived = perf_counter()
+            bars.extend((bar, arrived) for bar in self._read(fl = fl))
+            shutil.move(os.path.join(self.root, fl), os.path.join(self.root, PROCESSED_DIR, fl))
+        return bars
+
+class socket_source(_bar_source, dunders):
+    """Local stand-in for a market data feed: a TCP server that receives newline delimited json bars,
+    from any number of clients.
+
+    Args:
+        * `port` (int): Listening port, 0 for any free port.
+        * `host` (str, optional): Listening address. Defaults to STREAM_HOST.
+    """
+
+    def __init__(self, port: int, host: str = STREAM_HOST) -> None:
+        self._queue = queue.Queue()
+        bars = self._queue
+
+        class _handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        bars.put((parse_bar(bar = json.loads(line)), perf_counter()))
+                    except ValueError as e:     # Malformed bars are dropped, the connection stays open.
+                        print(f'Skipped bar: {e}')
+
+        self._server = socketserver.ThreadingTCPServer((host, port), _handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        threading.Thread(target = self._server.serve_forever, daemon = True).start()
+        super().__init__()
+
+    def poll(self, timeout: float) -> list[tuple[dict, float]]:
+        try:
+            bars = [self._queue.get(timeout = timeout)]
+        except queue.Empty:
+            return []
+        while True:     # Drain whatever arrived with it.
+            try:
+                bars.append(self._queue.get_nowait())
+            except queue.Empty:
+                return bars
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+class ring_window(dunders):
+    """Sliding window of the latest values with O(1) pushes. Values are written twice, size apart,
+    in a buffer of twice the window, so the window is always a contiguous view of the buffer and
+    is never copied or rebuilt.
+
+    Args:
+        * `size` (int): Window length.
+        * `values` (np.ndarray): Initial values, at least size of them, the last size are kept.
+    """
+
+    def __init__(self, size: int, values: np.ndarray) -> None:
+        if len(values) < size:
+            raise ValueError(f'{len(values)} values are not enough for a {size} day window.')
+        self.size = size
+        self._buf = np.empty(2 * size, dtype = INPUT_DTYPE)
+        self._buf[:size] = self._buf[size:] = values[len(values) - size:]
+        self._pos = 0   # Oldest value, overwritten by the next push.
+        super().__init__()
+
+    def push(self, value: float) -> None:
+        """Append a value, the oldest one leaves the window.
+
+        Args:
+            * `value` (float): New value.
+        """
+
+        self._buf[self._pos] = self._buf[self._pos + self.size] = value
+        self._pos = (self._pos + 1) % self.size
+
+    def view(self) -> np.ndarray:
+        """The window, oldest value first.
+
+        Returns:
+            `np.ndarray`: View of shape (size,), valid until the next push.
+        """
+
+        return self._buf[self._pos:self._pos + self.size]
+
+@dataclass
+class live_asset:
+    """Dataclass holding the streaming state of one asset.
+    """
+
+    asset: str
+    model: Any
+    scaler: Any
+    window: ring_window
+    run_id: str
+    last_date: pd.Timestamp
+    currency: str = ''
+    bars: int = 0
+    next_day: float | None = None
+
+class stream_engine(dunders):
+    """Streaming predictions. Each new bar is appended to the price storage and slid into the model
+    window of its asset, and the cached model forecasts the next days from the window. The forecast
+    is stored under a streaming run as soon as it is made, so the dashboard picks it up. A streaming
+    run starts with the predictions of the latest analysis run of its asset, and every bar adds the
+    prediction of its day made on the previous bar.
+
+    Models are not trained here: each asset uses the latest cached model trained with the same
+    hyperparameters and the scaler saved with it. Models cached without a scaler were trained from
+    scratch, their scaler is fitted again on the rows they were trained on.
+
+    Args:
+        * `db` (str): Database of the runs and forecasts.
+        * `storage` (_storage): Price storage backend.
+        * `registry` (model_registry): Cache of trained models.
+        * `params` (dict): Model name and hyperparameters, as in financial_assets.predictor().
+        * `pred_days` (int): Days used for each prediction.
+        * `horizon` (int): Days forecast after the last bar.
+        * `asset_type` (str): Type of the assets.
+        * `mode` (str, optional): Forecasting mode, direct or recursive. Defaults to 'direct'.
+        * `precision` (str, optional): Dtype of the prices the scaler is fitted on. Defaults to 'float32'.
+    """
+
+    def __init__(self, db: str, storage: _storage, registry: model_registry, params: dict, pred_days: int,
+                horizon: int, asset_type: str, mode: str = 'direct', precision: str = 'float32') -> None:
+        self.db = db
+        self.storage = storage
+        self.registry = registry
+        self.params = params
+        self.pred_days = pred_days
+        self.horizon = horizon
+        self.asset_type = asset_type
+        self.mode = mode
+        self.precision = precision
+        self.live: dict[str, live_asset] = {}
+        super().__init__()
+
+    def add(self, asset: str, currency: str = '') -> bool:
+        """Load the cached model of an asset and fill its window with the stored prices.
+
+        Args:
+            * `asset` (str): Asset name.
+            * `currency` (str, optional): Currency symbol of the asset. Defaults to ''.
+
+        Returns:
+            `boolean`: False when the asset has no cached model or its training rows are not stored anymore.
+        """
+
+        from sklearn.preprocessing import MinMaxScaler
+        from lib.risk import annualized_volatility, TRADING_DAYS
+
+        family = self.registry.family_key(ident = {'asset': asset,
+                                                    'params': {key: str(value) for key, value in self.params.items()}})
+        meta = self.registry.latest(family = family)
+        if meta is None:
+            print(f'{asset}: no cached {self.params["model"]} model with these hyperparameters, analyse it first.')
+            return False
+
+        prices = self.storage.read(ticker = asset, columns = ['Date', 'Close'], dtypes = {'Close': self.precision})
+        start = np.flatnonzero(prices['Date'].astype(str).to_numpy() == meta['first_date'])
+        if not len(start) or len(prices) < start[0] + meta['rows'] or len(prices) < self.pred_days:
+            print(f'{asset}: the training rows of its cached model are not stored anymore, analyse it again.')
+            return False
+        closes = prices['Close'].to_numpy()
+        scaler = self.registry.load_scaler(meta = meta)
+        if scaler is None and meta.get('parent') is not None:   # Fine-tuned on the unknown scale of its parent.
+            print(f'{asset}: the cached model {meta["key"][:12]} has no saved scaler, analyse it again.')
+            return False
+        if scaler is None:
+            scaler = MinMaxScaler(feature_range = (0, 1)).fit(closes[start[0]:start[0] + meta['rows']].reshape(-1, 1))
+        model = self.registry.load(key = meta['key'])
+        if model is None:
+            print(f'{asset}: the cached model {meta["key"][:12]} could not be loaded, analyse it again.')
+            return False
+        analysis_run = latest_run(db = self.db, asset = asset, model = self.params['model'])
+        run_id = new_run_id()
+        record_run(db = self.db, run_id = run_id, asset = asset, model = self.params['model'],
+                volatility = round(annualized_volatility(prices = closes, periods = TRADING_DAYS), 4) * 100,
+                asset_type = self.asset_type, currency = currency)
+        if analysis_run is not None:
+            copy_predictions(db = self.db, run_id = run_id, source = analysis_run)
+
+        state = live_asset(asset = asset, model = model, scaler = scaler, run_id = run_id,
+                        window = ring_window(size = self.pred_days,
+                                            values = scaler.transform(closes[-self.pred_days:].reshape(-1, 1))[:, 0]),
+                        last_date = pd.Timestamp(prices['Date'].iloc[-1]), currency = currency)
+        self._forecast(state = state)
+        self.live[asset] = state
+        print(f'{asset}: streaming with model {meta["key"][:12]} trained up to {meta["last_date"]}, run {run_id}.')
+        return True
+
+    def _forecast(self, state: live_asset, actual: float | None = None) -> np.ndarray:
+        """Forecast the next days from the window of an asset and store them.
+
+        Args:
+            * `state` (live_asset): Streaming state of the asset, its next day prediction is updated.
+            * `actual` (float | None, optional): Close of the latest bar, stored with the prediction of its day.
+            Defaults to None.
+
+        Returns:
+            `np.ndarray`: Forecast prices of the next horizon days.
+        """
+
+        from lib.fin_asset import forecast_frame
+
+        request = inference_request(asset = state.asset, model = state.model, window = state.window.view(),
+                                    scaler = state.scaler, model_name = self.params['model'])
+        forecast = horizon_predict(requests = [request], horizon = self.horizon, mode = self.mode)['forecast'][0]
+        df = forecast_frame(last_date = str(state.last_date), forecast = forecast, asset_type = self.asset_type)
+        record_stream(db = self.db, run_id = state.run_id, next_day = float(forecast[0]), df = df, mode = self.mode,
+                    bars = state.bars, last_date = state.last_date.strftime(DATE_FORMAT),
+                    predicted = state.next_day, actual = actual)
+        state.next_day = float(forecast[0])
+        return forecast
+
+    def on_bar(self, bar: dict) -> np.ndarray | None:
+        """Store a bar, slide its window and store the new forecast.
+
+        Args:
+            * `bar` (dict): Bar from parse_bar().
+
+        Returns:
+            `np.ndarray | None`: Forecast prices of the next horizon days, None for bars of other assets
+            and bars not newer than the last one.
+        """
+
+        state = self.live.get(bar['ticker'])
+        if state is None or bar['Date'] <= state.last_date:
+            return None
+
+        self.storage.append(ticker = state.asset, df = pd.DataFrame([{col: bar[col] for col in PRICE_COLUMNS}]))
+        state.window.push(bar['Close'] * state.scaler.scale_[0] + state.scaler.min_[0])    # MinMaxScaler.transform of one value.
+        state.last_date = bar['Date']
+        state.bars += 1
+        return self._forecast(state = state, actual = bar['Close'])
+
+    def run(self, source: _bar_source, max_bars: int | None = None, timeout: float = 1.0) -> dict:
+        """Process the bars of a source until it is interrupted.
+
+        Args:
+            * `source` (_bar_source): Source of the live bars.
+            * `max_bars` (int | None, optional): Stop after this many processed bars. Defaults to None (Ctrl+C).
+            * `timeout` (float, optional): Longest wait for new bars in seconds, between two checks. Defaults to 1.
+
+        Returns:
+            `dict`: bars processed, skipped bars and the mean and max latency in ms from arrival to stored forecast.
+        """
+
+        processed, skipped, total_ms, max_ms = 0, 0, 0.0, 0.0
+        try:
+            while max_bars is None or processed < max_bars:
+                for bar, arrived in source.poll(timeout = timeout):
+                    forecast = self.on_bar(bar = bar)
+                    if forecast is None:
+                        skipped += 1
+                        continue
+                    latency = (perf_counter() - arrived) * 1e3
+                    processed += 1
+                    total_ms, max_ms = total_ms + latency, max(max_ms, latency)
+                    state = self.live[bar['ticker']]
+                    print(f'{bar["ticker"]} {bar["Date"]:%Y-%m-%d %H:%M}: close {state.currency}{bar["Close"]:.2f}, '
+                        f'next day {state.currency}{forecast[0]:.2f} ({latency:.1f} ms)')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            source.close()
+
+        return {'bars': processed, 'skipped': skipped,
+                'mean_ms': total_ms / processed if processed else None, 'max_ms': max_ms if processed else None}
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import math, random, itertools
+from concurrent.futures import Executor, as_completed
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from typing import Final
+from lib.utils import dunders, yml_parser
+from lib.db_utils import new_run_id, record_trial, sweep_trials
+from lib.pool import process_pool
+
+SWEEP_STRATEGIES: Final[tuple] = ('grid', 'random', 'halving')
+SPACE_KEYS: Final[tuple] = ('units', 'dropout', 'optimizer', 'loss', 'epoch', 'batch')  # Hyperparameters a search space can set.
+VALIDATION: Final[float] = 0.2  # Fraction of the latest training windows held out to score the trials.
+PATIENCE: Final[int] = 3    # Epochs without a better validation loss before a trial stops.
+ETA: Final[int] = 3     # Successive halving keeps the best 1/ETA trials of a rung and gives them ETA times the epochs.
+
+def load_space(f: str) -> dict[str, list]:
+    """Parse a search space .yml file, one list of values per hyperparameter.
+
+    Args:
+        * `f` (str): .yml file, keys from SPACE_KEYS. A single value fixes the hyperparameter.
+
+    Raises:
+        `ValueError`: Unknown hyperparameter or empty list of values.
+
+    Returns:
+        `dict[str, list]`: Values of each hyperparameter.
+    """
+
+    space = {}
+    for key, values in yml_parser(f = f).items():
+        if key not in SPACE_KEYS:
+            raise ValueError(f'Unknown hyperparameter: {key}. Valid hyperparameters are: {", ".join(SPACE_KEYS)}.')
+        space[key] = list(values) if isinstance(values, (list, tuple)) else [values]
+        if not space[key]:
+            raise ValueError(f'Hyperparameter {key} has no values.')
+    return space
+
+def grid_trials(space: dict[str, list], defaults: dict) -> list[dict]:
+    """Every combination of the search space.
+
+    Args:
+        * `space` (dict[str, list]): Values of each hyperparameter.
+        * `defaults` (dict): Values of the hyperparameters missing from the space.
+
+    Returns:
+        `list[dict]`: Hyperparameters of each trial.
+    """
+
+    keys = list(space)
+    return [dict(defaults, **dict(zip(keys, values))) for values in itertools.product(*(space[key] for key in keys))]
+
+def random_trials(space: dict[str, list], defaults: dict, n: int, seed: int = 0) -> list[dict]:
+    """n distinct random combinations of the search space, the whole grid when it is smaller.
+
+    Args:
+        * `space` (dict[str, list]): Values of each hyperparameter.
+        * `defaults` (dict): Values of the hyperparameters missing from the space.
+        * `n` (int): Number of trials.
+        * `seed` (int, optional): Seed of the sample. Defaults to 0.
+
+    Returns:
+        `list[dict]`: Hyperparameters of each trial.
+    """
+
+    keys = list(space)
+    size = math.prod(len(space[key]) for key in keys)
+    if size <= n:
+        return grid_trials(space = space, defaults = defaults)
+
+    trials = []
+    for idx in random.Random(seed).sample(range(size), n):     # Grid positions, decoded without building the grid.
+        params = dict(defaults)
+        for key in reversed(keys):
+            idx, pos = divmod(idx, len(space[key]))
+            params[key] = space[key][pos]
+        trials.append(params)
+    return trials
+
+def run_trial(prices: pd.DataFrame, pred_days: int, horizon: int, params: dict, validation: float,
+            patience: int, seed: int) -> dict:
+    """Train one trial with early stopping and score it on the validation windows. Never raises,
+    failures are reported in the status.
+
+    Args:
+        * `prices` (pd.DataFrame): Training rows with a Close column.
+        * `pred_days` (int): Days used for each prediction.
+        * `horizon` (int): Model outputs.
+        * `params` (dict): Hyperparameters, the SPACE_KEYS.
+        * `validation` (float): Fraction of the latest windows held out for validation.
+        * `patience` (int): Early stopping patience in epochs.
+        * `seed` (int): Seed of the weights and the shuffles.
+
+    Returns:
+        `dict`: epochs_run, the val_loss and loss of the best epoch, wall_time, status and error.
+    """
+
+    start = perf_counter()
+    try:
+        import keras
+        from lib.model_methods import models, preprocessing
+        keras.utils.set_random_seed(seed)
+
+        x, y, _ = preprocessing(data = prices, prediction_days = pred_days, horizon = horizon)
+        trainer = models(dropout = float(params['dropout']), loss_function = params['loss'],
+                        epoch = int(params['epoch']), batch = int(params['batch']))
+        trainer.LSTM_RNN(x = x, y = y, units = int(params['units']), closing_value = horizon,
+                        optimize = params['optimizer'], validation = validation, patience = patience)
+    except Exception as e:
+        return {'wall_time': perf_counter() - start, 'status': 'failed', 'error': f'{type(e).__name__}: {e}'}
+
+    history = trainer.history.history
+    scores = history.get('val_loss', history['loss'])
+    best = int(np.argmin(scores))
+    return {'epochs_run': len(history['loss']), 'val_loss': float(scores[best]), 'loss': float(history['loss'][best]),
+            'wall_time': perf_counter() - start, 'status': 'ok'}
+
+class hyper_sweep(dunders):
+    """Hyperparameter sweep of the model of one asset. Trials run in parallel worker processes with
+    a CPU thread budget each, stop early on a validation slice and are recorded in the sweep_trials
+    table as they finish.
+
+    Args:
+        * `db` (str): Database of the sweep_trials table.
+        * `asset` (str): Asset name.
+        * `prices` (pd.DataFrame): Training rows with a Close column.
+        * `pred_days` (int): Days used for each prediction.
+        * `defaults` (dict): Values of the hyperparameters missing from the search space.
+        * `workers` (int): Trials running at once.
+        * `threads` (int): CPU threads of each trial.
+        * `horizon` (int, optional): Model outputs. Defaults to 1.
+        * `validation` (float, optional): Fraction of the latest windows held out. Defaults to VALIDATION.
+        * `patience` (int, optional): Early stopping patience in epochs. Defaults to PATIENCE.
+        * `seed` (int, optional): Seed of the random search and of the trials. Defaults to 0.
+    """
+
+    def __init__(self, db: str, asset: str, prices: pd.DataFrame, pred_days: int, defaults: dict,
+                workers: int, threads: int, horizon: int = 1, validation: float = VALIDATION,
+                patience: int = PATIENCE, seed: int = 0) -> None:
+        self.db = db
+        self.asset = asset
+        self.prices = prices
+        self.pred_days = pred_days
+        self.defaults = defaults
+        self.workers = workers
+        self.threads = threads
+        self.horizon = horizon
+        self.validation = validation
+        self.patience = patience
+        self.seed = seed
+        self.sweep_id = new_run_id()
+        super().__init__()
+
+    def _rung(self, executor: Executor, trials: dict[int, dict], rung: int, strategy: str) -> dict[int, dict]:
+        """Run a set of trials in parallel and record each one as it finishes.
+
+        Args:
+            * `executor` (Executor): Pool of trial workers.
+            * `trials` (dict[int, dict]): Hyperparameters by trial number.
+            * `rung` (int): Successive halving rung, 0 for the other strategies.
+            * `strategy` (str): Search strategy.
+
+        Returns:
+            `dict[int, dict]`: Recorded trial by trial number.
+        """
+
+        futures = {executor.submit(run_trial, self.prices, self.pred_days, self.horizon, params, self.validation,
+                                self.patience, self.seed + num): num for num, params in trials.items()}
+        done = {}
+        for future in as_completed(futures):
+            num = futures[future]
+            params = trials[num]
+            done[num] = dict(future.result(), trial = num, rung = rung, params = params, epochs = int(params['epoch']))
+            record_trial(db = self.db, sweep_id = self.sweep_id, asset = self.asset, strategy = strategy, trial = done[num])
+            score = '' if done[num].get('val_loss') is None else f' val_loss {done[num]["val_loss"]:.6f}'
+            print(f'[rung {rung}, {len(done)}/{len(trials)}] trial {num}: {done[num]["status"]}{score} '
+                f'({done[num]["wall_time"]:.1f}s)')
+        return done
+
+    def run(self, strategy: str, space: dict[str, list], n: int | None = None, eta: int = ETA) -> pd.DataFrame:
+        """Run the sweep.
+
+        Args:
+            * `strategy` (str): grid, every combination, random, n random combinations, or halving, successive
+            halving of n random combinations (the whole grid when n is None) from 1/eta^k of the largest epoch budget.
+            * `space` (dict[str, list]): Values of each hyperparameter, from load_space().
+            * `n` (int | None, optional): Number of trials of the random and halving strategies. Defaults to None.
+            * `eta` (int, optional): Successive halving reduction factor. Defaults to ETA.
+
+        Raises:
+            `ValueError`: Unknown strategy or random search without a number of trials.
+
+        Returns:
+            `pd.DataFrame`: The recorded trials, from sweep_trials().
+        """
+
+        if strategy not in SWEEP_STRATEGIES:
+            raise ValueError(f'Sweep strategy: {strategy} is not valid. Valid strategies are: {", ".join(SWEEP_STRATEGIES)}.')
+        if strategy == 'grid' or (strategy == 'halving' and n is None):
+            configs = grid_trials(space = space, defaults = self.defaults)
+        elif n is None:
+            raise ValueError('A random sweep needs a number of trials.')
+        else:
+            configs = random_trials(space = space, defaults = self.defaults, n = n, seed = self.seed)
+        trials = dict(enumerate(configs))
+        print(f'Sweeping {len(trials)} {self.asset} trials ({strategy}) with {self.workers} workers '
+            f'of {self.threads} threads, sweep {self.sweep_id}...\n')
+
+        with process_pool(workers = self.workers, threads = self.threads) as executor:
+            if strategy != 'halving':
+                self._rung(executor = executor, trials = trials, rung = 0, strategy = strategy)
+            else:
+                rungs = int(math.log(len(trials), eta) + 1e-9) + 1 if len(trials) > 1 else 1
+                max_epoch = max(int(params['epoch']) for params in trials.values())
+                for rung in range(rungs):
+                    epochs = max(1, round(max_epoch / eta ** (rungs - 1 - rung)))
+                    rung_trials = {num: dict(params, epoch = epochs) for num, params in trials.items()}
+                    done = self._rung(executor = executor, trials = rung_trials, rung = rung, strategy = strategy)
+                    ranked = sorted((num for num in done if done[num]['status'] == 'ok'), key = lambda num: done[num]['val_loss'])
+                    trials = {num: trials[num] for num in ranked[:max(1, math.ceil(len(trials) / eta))]}
+                    if not trials:  # Every trial of the rung failed.
+                        break
+
+        return sweep_trials(db = self.db, sweep_id = self.sweep_id)
+
+def sweep_summary(df: pd.DataFrame, top: int = 10) -> str:
+    """Format the best trials of a sweep as a table.
+
+    Args:
+        * `df` (pd.DataFrame): Trials from sweep_trials().
+        * `top` (int, optional): Number of trials shown. Defaults to 10.
+
+    Returns:
+        `str`: The summary table.
+    """
+
+    lines = [f'{"Trial":>6}{"Rung":>6}{"Epochs":>8}{"Val loss":>14}{"Time (s)":>10}  Hyperparameters']
+    for row in df.head(top).itertuples(index = False):
+        val_loss = '' if pd.isna(row.val_loss) else f'{row.val_loss:.6f}'
+        epochs = '' if pd.isna(row.epochs_run) else f'{int(row.epochs_run)}/{row.epochs}'
+        params = ', '.join(f'{key}={value}' for key, value in row.params.items() if key != 'epoch')
+        lines.append(f'{row.trial:>6}{row.rung:>6}{epochs:>8}{val_loss:>14}{row.wall_time:>10.1f}  {params}')
+
+    failed = int((df['status'] != 'ok').sum())
+    lines.append(f'\n{len(df) - failed}/{len(df)} trials completed, {df["wall_time"].sum():.0f}s of training.')
+    return '\n'.join(lines)
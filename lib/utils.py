@@ -21,6 +21,26 @@ def yml_parser(f: str) -> dict:
         except yaml.YAMLError as exc:
             print(exc)
 
+def watchlist_parser(f: str) -> list:
+    """Parser for a watchlist file. Tickers can be separated by new lines,
+    white space or commas. Lines starting with # are ignored.
+
+    Args:
+        * `f` (str): Watchlist file.
+
+    Returns:
+        `list`: Tickers in the order they appear in the file, without duplicates.
+    """
+
+    tickers = []
+    with open(f, 'r') as fl_stream:
+        for line in fl_stream:
+            line = line.split('#', 1)[0]    # Strip comments.
+            for tick in line.replace(',', ' ').split():
+                if tick not in tickers:
+                    tickers.append(tick)
+    return tickers
+
 # Boilerplate
 def toml_parser():
     pass
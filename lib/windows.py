@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view, as_strided
+from typing import Any
+
+def sliding_windows(data: np.ndarray, window: int, stride: int = 1) -> np.ndarray:
+    """Build the model input windows as a strided view of the data. No values are copied,
+    every window points to the memory of the input array.
+
+    Args:
+        * `data` (np.ndarray): 1-D series or 2-D array of shape (time steps, features).
+        * `window` (int): Number of time steps in each window.
+        * `stride` (int, optional): Time steps between the starts of two consecutive windows. Defaults to 1.
+
+    Raises:
+        `ValueError`: When window or stride are not positive or the data has more than 2 dimensions.
+
+    Returns:
+        `np.ndarray`: Read-only view of shape (windows, window, features).
+    """
+
+    if window < 1 or stride < 1:
+        raise ValueError(f'Window ({window}) and stride ({stride}) must be positive integers.')
+
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    elif data.ndim != 2:
+        raise ValueError(f'Data must be 1-D or 2-D, not {data.ndim}-D.')
+
+    if len(data) < window:
+        return np.empty((0, window, data.shape[1]), dtype = data.dtype)
+
+    windows = sliding_window_view(data, window_shape = window, axis = 0)    # (windows, features, window)
+    return windows[::stride].swapaxes(1, 2)
+
+def window_targets(data: np.ndarray, window: int, stride: int = 1, column: int = 0,
+                horizon: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Windows and the values that follow each of them, for supervised training.
+
+    Args:
+        * `data` (np.ndarray): 1-D series or 2-D array of shape (time steps, features).
+        * `window` (int): Number of time steps in each window.
+        * `stride` (int, optional): Time steps between two consecutive windows. Defaults to 1.
+        * `column` (int, optional): Feature used as the target. Defaults to 0.
+        * `horizon` (int, optional): Number of following values used as targets. Defaults to 1.
+
+    Raises:
+        `ValueError`: When the horizon is not positive.
+
+    Returns:
+        `tuple[np.ndarray, np.ndarray]`: Read-only views of the windows (windows, window, features)
+        and of the targets, (windows,) for a horizon of 1 and (windows, horizon) otherwise.
+    """
+
+    if horizon < 1:
+        raise ValueError(f'Horizon ({horizon}) must be a positive integer.')
+
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+
+    x = sliding_windows(data[:len(data) - horizon], window = window, stride = stride)
+    if horizon == 1:
+        y = data[window::stride, column]
+    else:   # Each window is followed by horizon values, the last windows without all of them are dropped.
+        y = sliding_window_view(data[window:, column], window_shape = horizon)[::stride][:len(x)]
+    y.flags.writeable = False
+    return x, y
+
+def _window_rows(x: np.ndarray) -> tuple[np.ndarray, int]:
+    """Rows the windows are read from and the number of rows between two consecutive window starts.
+    The views of sliding_windows() give back their input data, other arrays are made contiguous first.
+
+    Args:
+        * `x` (np.ndarray): Windows of shape (windows, window, features).
+
+    Returns:
+        `tuple[np.ndarray, int]`: 2-D rows (time steps, features) sharing the memory of x, and the step.
+    """
+
+    if len(x) == 0 or x.strides[1] <= 0 or x.strides[0] % x.strides[1] != 0:
+        x = np.ascontiguousarray(x)
+    step = x.strides[0] // x.strides[1] if len(x) > 1 else 1
+    rows = (len(x) - 1) * step + x.shape[1] if len(x) else 0     # No window reads no row.
+    return as_strided(x, shape = (rows, x.shape[2]), strides = (x.strides[1], x.strides[2]), writeable = False), step
+
+def window_dataset(x: np.ndarray, y: np.ndarray | None, batch: int, shuffle: bool = True, seed: int = 0,
+                idx: np.ndarray | None = None) -> Any:
+    """Training input pipeline over strided windows. The series behind the windows is copied once into a
+    float32 tensor and every batch of windows is gathered from it when Keras asks for it, prefetched while
+    the previous batch trains. The full window tensor never exists in memory.
+
+    Args:
+        * `x` (np.ndarray): Windows of shape (windows, window, features), e.g. from window_targets().
+        * `y` (np.ndarray | None): Targets of shape (windows,) or (windows, horizon). None for prediction inputs.
+        * `batch` (int): Batch size.
+        * `shuffle` (bool, optional): Shuffle the windows on every epoch. Defaults to True.
+        * `seed` (int, optional): Seed of the shuffle. Defaults to 0.
+        * `idx` (np.ndarray | None, optional): Windows to train on. Defaults to None (all the windows).
+
+    Returns:
+        `tf.data.Dataset`: Batches of (windows, targets), or of windows when y is None.
+    """
+
+    import tensorflow as tf
+
+    rows, step = _window_rows(x = x)
+    window = x.shape[1]
+    series = tf.constant(rows, dtype = tf.float32)
+    targets = None if y is None else tf.constant(np.asarray(y, dtype = np.float32))    # One value per window and forecast day, small.
+    offsets = tf.range(window, dtype = tf.int64)
+
+    idx = np.arange(len(x), dtype = np.int64) if idx is None else np.asarray(idx, dtype = np.int64)
+    ds = tf.data.Dataset.from_tensor_slices(idx).cache()  # Only the window indices are cached, not the windows.
+    if shuffle:
+        ds = ds.shuffle(buffer_size = max(len(idx), 1), seed = seed, reshuffle_each_iteration = True)
+    ds = ds.batch(batch)
+    if targets is None:
+        ds = ds.map(lambda i: tf.gather(series, i[:, None] * step + offsets), num_parallel_calls = tf.data.AUTOTUNE,
+                    deterministic = True)
+    else:
+        ds = ds.map(lambda i: (tf.gather(series, i[:, None] * step + offsets), tf.gather(targets, i)),
+                    num_parallel_calls = tf.data.AUTOTUNE, deterministic = True)
+    return ds.prefetch(tf.data.AUTOTUNE)
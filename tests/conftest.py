@@ -0,0 +1,4 @@
+#!/usr/bin/env python3
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))     # Import lib from the repository root.
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import pytest
+from lib.backtest import walk_forward_folds
+
+def test_expanding_folds_train_from_the_first_row():
+    folds = walk_forward_folds(rows = 100, train_rows = 50, horizon = 10)
+
+    assert [(f.train_start, f.train_end, f.test_end) for f in folds] == [(0, end, end + 10) for end in range(50, 91, 10)]
+    assert [f.fold for f in folds] == list(range(5))
+
+def test_rolling_folds_keep_the_training_length():
+    folds = walk_forward_folds(rows = 100, train_rows = 30, horizon = 7, step = 5, scheme = 'rolling')
+
+    assert all(f.train_end - f.train_start == 30 for f in folds)
+    assert all(f.test_end - f.train_end == 7 for f in folds)
+    assert folds[-1].test_end <= 100 < folds[-1].test_end + 5
+
+def test_folds_stay_the_same_when_rows_are_appended():
+    before = walk_forward_folds(rows = 120, train_rows = 40, horizon = 5, scheme = 'rolling')
+    after = walk_forward_folds(rows = 133, train_rows = 40, horizon = 5, scheme = 'rolling')
+
+    assert after[:len(before)] == before
+    assert len(after) > len(before)
+
+def test_series_too_short_has_no_folds():
+    assert walk_forward_folds(rows = 50, train_rows = 45, horizon = 10) == []
+
+def test_unknown_scheme():
+    with pytest.raises(ValueError, match = 'not valid'):
+        walk_forward_folds(rows = 100, train_rows = 50, horizon = 10, scheme = 'sliding')
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from lib.db_utils import query_columns
+
+@pytest.fixture
+def db(tmp_path):
+    database = str(tmp_path / 'prices.db')
+    dates = pd.date_range('2021-01-01', periods = 10, freq = 'D')
+    df = pd.DataFrame({'Date': dates[::-1], 'Open': np.arange(10.0), 'Close': np.arange(10.0) + 0.5,
+                    'Volume': np.arange(10) * 100})
+    engine = sqlite3.connect(database)
+    df.to_sql('AAA', engine, index = False)
+    engine.close()
+    return database
+
+def test_projects_the_columns(db):
+    df = query_columns(database = db, table = 'AAA', columns = ['Date', 'Close'])
+
+    assert list(df.columns) == ['Date', 'Close']
+    assert len(df) == 10
+
+def test_date_range_is_inclusive_and_sorted(db):
+    df = query_columns(database = db, table = 'AAA', columns = ['Date', 'Close'], start = '2021-01-03', end = '2021-01-06')
+
+    assert list(df['Date']) == [f'2021-01-0{day} 00:00:00' for day in range(3, 7)]
+    assert df['Close'].is_monotonic_decreasing    # Written in reverse date order.
+
+def test_dtypes_and_arrays(db):
+    out = query_columns(database = db, table = 'AAA', columns = ['Close', 'Volume'], dtypes = {'Close': 'float32'},
+                        arrays = True)
+
+    assert set(out) == {'Close', 'Volume'}
+    assert out['Close'].dtype == np.float32
+    assert out['Volume'].dtype.kind == 'i'
+    np.testing.assert_allclose(out['Close'], np.arange(10.0)[::-1] + 0.5)
+
+def test_empty_range_keeps_the_columns(db):
+    df = query_columns(database = db, table = 'AAA', columns = ['Date', 'Close'], start = '2022-01-01')
+
+    assert list(df.columns) == ['Date', 'Close']
+    assert len(df) == 0
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from dashboard.plots.downsample import lttb, downsample, visible_rows, relayout_range
+
+def _series(n: int = 1000, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    y = np.cumsum(np.random.default_rng(seed).normal(size = n))
+    return np.arange(n, dtype = np.float64), y
+
+def test_lttb_keeps_the_ends_and_the_extremes():
+    x, y = _series()
+    y[400], y[700] = 100.0, -100.0
+    idx = lttb(x = x, y = y, threshold = 50)
+
+    assert len(idx) == 50
+    assert (idx[0], idx[-1]) == (0, len(x) - 1)
+    assert 400 in idx and 700 in idx
+    assert np.all(np.diff(idx) > 0)
+
+@pytest.mark.parametrize('threshold', [2, 1000, 5000])
+def test_lttb_keeps_everything_below_the_threshold(threshold):
+    x, y = _series()
+    np.testing.assert_array_equal(lttb(x = x, y = y, threshold = threshold), np.arange(len(x)))
+
+def test_downsample_drops_nan_and_caps_the_points():
+    x, y = _series(n = 500)
+    dates = pd.Series(pd.date_range('2020-01-01', periods = 500, freq = 'D'))
+    values = pd.Series(y)
+    values.iloc[10:20] = np.nan
+
+    kept_x, kept_y = downsample(x = dates, y = values, max_points = 100)
+    assert len(kept_x) == len(kept_y) == 100
+    assert kept_y.notna().all()
+    assert (kept_x.iloc[0], kept_x.iloc[-1]) == (dates.iloc[0], dates.iloc[-1])
+
+    kept_x, kept_y = downsample(x = dates, y = values, max_points = 1000)
+    assert len(kept_x) == 490
+
+def test_visible_rows_pads_one_row_each_side():
+    df = pd.DataFrame({'Date': pd.date_range('2020-01-01', periods = 30, freq = 'D'), 'Close': np.arange(30)})
+
+    assert visible_rows(df = df, x = 'Date', x_range = None) is df
+    rows = visible_rows(df = df, x = 'Date', x_range = ('2020-01-10', '2020-01-12 12:00'))
+    assert list(rows['Close']) == [8, 9, 10, 11, 12]
+
+def test_relayout_range():
+    assert relayout_range(relayout = None) is None
+    assert relayout_range(relayout = {'xaxis.autorange': True}) is None
+    assert relayout_range(relayout = {'xaxis.range[0]': 'a', 'xaxis.range[1]': 'b'}) == ('a', 'b')
+    assert relayout_range(relayout = {'xaxis.range': ['a', 'b']}) == ('a', 'b')
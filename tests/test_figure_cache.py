@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import dashboard.plots.figure_cache as figure_cache_module
+from dashboard.plots.figure_cache import figure_cache
+from dashboard.plots.lines import line_plotter
+
+def _frame(close: float = 1.0) -> pd.DataFrame:
+    return pd.DataFrame({'Date': pd.date_range('2021-01-01', periods = 5, freq = 'D'),
+                        'Close': np.full(5, close)})
+
+def test_fingerprint_follows_the_content():
+    assert figure_cache.fingerprint(df = _frame()) == figure_cache.fingerprint(df = _frame())
+    assert figure_cache.fingerprint(df = _frame()) != figure_cache.fingerprint(df = _frame(close = 2.0))
+    assert figure_cache.fingerprint(df = _frame()) != figure_cache.fingerprint(df = _frame().rename(columns = {'Close': 'Open'}))
+
+def test_key_changes_with_the_fingerprint_config_and_version(monkeypatch):
+    fingerprint = figure_cache.fingerprint(df = _frame())
+    key = figure_cache.key(fingerprint = fingerprint, config = {'asset': 'BTC-USD'})
+
+    assert key == figure_cache.key(fingerprint = fingerprint, config = {'asset': 'BTC-USD'})
+    assert key != figure_cache.key(fingerprint = fingerprint, config = {'asset': 'ETH-USD'})
+    assert key != figure_cache.key(fingerprint = figure_cache.fingerprint(df = _frame(close = 2.0)),
+                                config = {'asset': 'BTC-USD'})
+    monkeypatch.setattr(figure_cache_module, 'CACHE_VERSION', figure_cache_module.CACHE_VERSION + 1)
+    assert key != figure_cache.key(fingerprint = fingerprint, config = {'asset': 'BTC-USD'})
+
+def test_put_and_get(tmp_path):
+    pytest.importorskip('plotly')
+    cache = figure_cache(root = str(tmp_path))
+    figure = {'data': [{'x': pd.Series(pd.date_range('2021-01-01', periods = 2)), 'y': np.array([1.0, 2.0])}]}
+
+    assert cache.get(key = 'a') is None
+    stored = cache.put(key = 'a', figure = figure)
+    assert cache.get(key = 'a') == stored
+    assert stored['data'][0]['y'] == [1.0, 2.0]
+
+def test_evicts_the_least_recently_used(tmp_path):
+    pytest.importorskip('plotly')
+    cache = figure_cache(root = str(tmp_path), max_files = 10)
+    for age, key in enumerate(['c', 'b', 'a']):
+        cache.put(key = key, figure = {'data': []})
+        os.utime(cache._path(key = key), (100 - age, 100 - age))
+    cache.get(key = 'c')    # Used now, the most recent.
+
+    cache.max_files = 1
+    assert sorted(cache.evict()) == ['a', 'b']
+    assert os.listdir(tmp_path) == ['c.json']
+
+def test_line_colours_are_deterministic():
+    lines = {'Close': 'Price', 'Prediction': 'Prediction', 'SMA': 'Moving average'}
+    df = _frame().assign(Prediction = 1.0, SMA = 1.0)
+    colours = [line['line']['color'] for line in line_plotter(df = df, x_name = 'Date', all_y = lines).plot_generator()]
+
+    assert colours == [line['line']['color'] for line in line_plotter(df = df, x_name = 'Date', all_y = lines).plot_generator()]
+    assert len(set(colours)) == 3
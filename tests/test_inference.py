@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+from lib.inference import inference_request, batch_predict, horizon_predict, last_window, output_width
+
+class fake_model:
+    """Predicts the last value of each window plus step, outputs days in a row, and counts the predict calls."""
+
+    def __init__(self, name: str, outputs: int = 1, step: float = 0.0) -> None:
+        self.name = name
+        self.outputs = outputs
+        self.step = step
+        self.calls = []
+
+    def predict(self, batch: np.ndarray, batch_size: int, verbose: int) -> np.ndarray:
+        self.calls.append(batch.shape)
+        return batch[:, -1, :1] + self.step * np.arange(1, self.outputs + 1)
+
+def _scaler(low: float, high: float) -> MinMaxScaler:
+    return MinMaxScaler().fit(np.array([[low], [high]]))
+
+def test_batch_predict_groups_by_model():
+    lstm, gru = fake_model(name = 'lstm'), fake_model(name = 'gru')
+    requests = [inference_request(asset = 'AAA', model = lstm, window = np.full(4, 0.5), scaler = _scaler(0, 100)),
+                inference_request(asset = 'BBB', model = gru, window = np.full(4, 1.0), scaler = _scaler(0, 10)),
+                inference_request(asset = 'CCC', model = lstm, window = np.full(4, 0.25), scaler = _scaler(10, 20))]
+    out = batch_predict(requests = requests)
+
+    assert lstm.calls == [(2, 4, 1)] and gru.calls == [(1, 4, 1)]
+    assert list(out['asset']) == ['AAA', 'BBB', 'CCC']
+    assert list(out['model']) == ['lstm', 'gru', 'lstm']
+    np.testing.assert_allclose(out['forecast'], [50.0, 10.0, 12.5])
+
+def test_batch_predict_rejects_mismatched_windows():
+    model = fake_model(name = 'lstm')
+    requests = [inference_request(asset = 'AAA', model = model, window = np.zeros(4), scaler = _scaler(0, 1)),
+                inference_request(asset = 'BBB', model = model, window = np.zeros(5), scaler = _scaler(0, 1))]
+    with pytest.raises(ValueError):
+        batch_predict(requests = requests)
+
+def test_last_window():
+    inputs = np.arange(10.0).reshape(-1, 1)
+    window = last_window(inputs = inputs, prediction_days = 3)
+
+    np.testing.assert_array_equal(window[:, 0], [7.0, 8.0, 9.0])
+    assert np.shares_memory(window, inputs)
+    with pytest.raises(ValueError):
+        last_window(inputs = inputs, prediction_days = 11)
+
+def test_horizon_predict_direct():
+    model = fake_model(name = 'lstm', outputs = 4, step = 0.1)
+    requests = [inference_request(asset = 'AAA', model = model, window = np.full(5, 0.5), scaler = _scaler(0, 10)),
+                inference_request(asset = 'BBB', model = model, window = np.full(5, 0.2), scaler = _scaler(0, 100))]
+    out = horizon_predict(requests = requests, horizon = 3, mode = 'direct')
+
+    assert model.calls == [(2, 5, 1)]
+    assert out['forecast'].shape == (2, 3)
+    np.testing.assert_allclose(out['forecast'], [[6.0, 7.0, 8.0], [30.0, 40.0, 50.0]], rtol = 1e-5)
+    with pytest.raises(ValueError):
+        horizon_predict(requests = requests, horizon = 5, mode = 'direct')
+
+def test_horizon_predict_recursive_feeds_the_outputs_back():
+    model, other = fake_model(name = 'lstm', step = 0.1), fake_model(name = 'gru', step = 0.2)
+    requests = [inference_request(asset = 'AAA', model = model, window = np.full(5, 0.5), scaler = _scaler(0, 10)),
+                inference_request(asset = 'BBB', model = other, window = np.full(5, 0.0), scaler = _scaler(0, 10)),
+                inference_request(asset = 'CCC', model = model, window = np.full(5, 0.1), scaler = _scaler(0, 10))]
+    out = horizon_predict(requests = requests, horizon = 3, mode = 'recursive')
+
+    assert model.calls == [(2, 5, 1)] * 3 and other.calls == [(1, 5, 1)] * 3
+    np.testing.assert_allclose(out['forecast'], [[6.0, 7.0, 8.0], [2.0, 4.0, 6.0], [2.0, 3.0, 4.0]], rtol = 1e-5)
+    with pytest.raises(ValueError):
+        horizon_predict(requests = [inference_request(asset = 'AAA', model = model, window = np.zeros((5, 2)),
+                                                    scaler = _scaler(0, 1))], horizon = 2, mode = 'recursive')
+
+def test_output_width():
+    assert output_width(horizon = 5, mode = 'direct') == 5
+    assert output_width(horizon = 5, mode = 'recursive') == 1
+    with pytest.raises(ValueError):
+        output_width(horizon = 5, mode = 'beam')
+    with pytest.raises(ValueError):
+        output_width(horizon = 0, mode = 'direct')
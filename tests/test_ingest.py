@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from time import monotonic
+import pandas as pd
+import pytest
+from lib.ingest import ingestion_engine, fetch_job, token_bucket
+from lib.providers import _provider, faulty_provider, synthetic_provider
+from lib.storage import sqlite_storage
+
+class counting_provider(_provider):
+    """Provider raising a given error on every download, counting the calls."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.calls = 0
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        self.calls += 1
+        raise self.error
+
+def _engine(provider: _provider, tmp_path, **kwargs) -> ingestion_engine:
+    storage = sqlite_storage(db = str(tmp_path / 'prices.db'), model_name = 'test')
+    return ingestion_engine(provider = provider, storage = storage, rate = 0, backoff_base = 0, seed = 0, **kwargs)
+
+def test_transient_errors_are_retried_a_bounded_number_of_times(tmp_path):
+    provider = counting_provider(error = ConnectionError('down'))
+    [result] = _engine(provider = provider, tmp_path = tmp_path, retries = 3).run(jobs = [fetch_job('AAA', '2020-01-01', '2020-02-01')])
+
+    assert result.status == 'failed'
+    assert result.attempts == provider.calls == 4
+    assert result.error.startswith('ConnectionError')
+
+def test_retry_budget_is_shared_by_the_run(tmp_path):
+    provider = counting_provider(error = ConnectionError('down'))
+    jobs = [fetch_job(ticker, '2020-01-01', '2020-02-01') for ticker in ('AAA', 'BBB', 'CCC')]
+    results = _engine(provider = provider, tmp_path = tmp_path, retries = 3, retry_budget = 2, workers = 1).run(jobs = jobs)
+
+    assert all(result.status == 'failed' for result in results)
+    assert provider.calls == len(jobs) + 2
+
+@pytest.mark.parametrize('error', [FileNotFoundError('no file'), ValueError('bad columns'), KeyError('Close')])
+def test_permanent_errors_are_not_retried(tmp_path, error):
+    provider = counting_provider(error = error)
+    [result] = _engine(provider = provider, tmp_path = tmp_path, retries = 3).run(jobs = [fetch_job('AAA', '2020-01-01', '2020-02-01')])
+
+    assert result.status == 'failed'
+    assert result.attempts == provider.calls == 1
+
+def test_faulty_provider_downloads_are_stored(tmp_path):
+    provider = faulty_provider(provider = synthetic_provider(seed = 1), latency = 0, failure_rate = 0.5, seed = 3)
+    engine = _engine(provider = provider, tmp_path = tmp_path, retries = 20)
+    results = engine.run(jobs = [fetch_job(ticker, '2020-01-01', '2020-03-01') for ticker in ('AAA', 'BBB', 'CCC')])
+
+    assert [result.status for result in results] == ['ok'] * 3
+    assert [result.rows for result in results] == [60] * 3
+    assert provider.failures > 0
+    assert provider.calls == sum(result.attempts for result in results)
+    assert engine.storage.stored_range(ticker = 'BBB')[0].startswith('2020-01-01')
+
+def test_token_bucket_paces_requests_after_the_burst():
+    bucket = token_bucket(rate = 50, capacity = 2)
+    start = monotonic()
+    waits = [bucket.acquire() for _ in range(7)]
+    elapsed = monotonic() - start
+
+    assert waits[:2] == [0.0, 0.0]   # The burst goes through at once.
+    assert all(wait > 0 for wait in waits[2:])
+    assert elapsed == pytest.approx(5 / 50, abs = 0.05)
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = token_bucket(rate = 0, capacity = 1)
+    assert sum(bucket.acquire() for _ in range(100)) == 0.0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import pytest
+import lib.instrument as instrument_module
+from lib.instrument import instrument, stage
+
+def _run(tmp_path) -> instrument:
+    tracker = instrument(run_id = 'run', profile_dir = str(tmp_path))
+    with tracker.activate(), stage('analyze', asset = 'AAA'):
+        with stage('query') as query_stage:
+            query_stage.count(rows = 10, bytes = 80)
+        for _ in range(2):
+            with stage('fit'):
+                pass
+    return tracker
+
+def test_stages_nest_and_inherit_the_labels(tmp_path):
+    tracker = _run(tmp_path = tmp_path)
+
+    assert sorted(record.path for record in tracker.records) == ['analyze', 'analyze/fit', 'analyze/fit', 'analyze/query']
+    assert all(record.labels == {'asset': 'AAA'} for record in tracker.records)
+    assert {record.path: record.counters for record in tracker.records}['analyze/query'] == {'rows': 10, 'bytes': 80}
+    assert instrument_module.active() is None
+
+def test_stage_without_an_instrument_is_not_recorded():
+    with stage('query') as record:
+        record.count(rows = 1)
+    assert record.counters == {'rows': 1}
+
+def test_failed_stage_is_recorded_and_raises(tmp_path):
+    tracker = instrument(run_id = 'run')
+    with pytest.raises(RuntimeError), tracker.activate(), stage('analyze'):
+        raise RuntimeError('diverged')
+    assert [(record.path, record.status) for record in tracker.records] == [('analyze', 'failed')]
+
+def test_merge_nests_the_worker_stages(tmp_path):
+    tracker = instrument(run_id = 'run')
+    worker = instrument(run_id = 'run')
+    with worker.activate(), stage('pipeline'):
+        pass
+    with tracker.activate(), stage('batch'):
+        tracker.merge(records = worker.records, asset = 'AAA')
+
+    assert {record.path: record.labels for record in tracker.records}['batch/pipeline'] == {'asset': 'AAA'}
+
+def test_json_and_prometheus_export(tmp_path):
+    tracker = _run(tmp_path = tmp_path)
+
+    run = json.loads(open(tracker.to_json(path = str(tmp_path / 'run.json'))).read())
+    assert run['run_id'] == 'run'
+    assert len(run['stages']) == 4 and run['stages'][0]['path'] == 'analyze'
+
+    prom = open(tracker.to_prometheus(path = str(tmp_path / 'run.prom'))).read()
+    assert 'market_analysis_stage_calls{stage="analyze/fit",asset="AAA"} 2' in prom
+    assert 'market_analysis_stage_rows{stage="analyze/query",asset="AAA"} 10' in prom
+    assert 'market_analysis_run_info{run_id="run",status="ok",failed_stage=""} 1' in prom
+    assert not (tmp_path / 'run.prom.tmp').exists()
+
+def test_unknown_profiler():
+    with pytest.raises(ValueError):
+        instrument(run_id = 'run', profiler = 'perf')
+
+def _failed_run(tmp_path) -> instrument:
+    tracker = instrument(run_id = 'run', profile_dir = str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with tracker.activate(), stage('analyze', asset = 'AAA'):
+            with stage('query'):
+                pass
+            with stage('fit'), stage('epoch'):
+                raise RuntimeError('diverged')
+    return tracker
+
+def test_failed_run_is_exported_with_the_stage_that_raised(tmp_path):
+    tracker = _failed_run(tmp_path = tmp_path)
+
+    assert tracker.status == 'failed'
+    assert tracker.failed_stage.path == 'analyze/fit/epoch'
+    assert {record.path: record.status for record in tracker.records}['analyze/query'] == 'ok'
+
+    run = json.loads(open(tracker.to_json(path = str(tmp_path / 'run.json'))).read())
+    assert (run['status'], run['failed_stage']) == ('failed', 'analyze/fit/epoch')
+    prom = open(tracker.to_prometheus(path = str(tmp_path / 'run.prom'))).read()
+    assert 'market_analysis_run_failed 1' in prom
+    assert 'failed_stage="analyze/fit/epoch"' in prom
+
+def test_worker_failures_do_not_fail_the_run(tmp_path):
+    tracker = instrument(run_id = 'run')
+    with tracker.activate(), stage('batch'):
+        worker = instrument(run_id = 'run')
+        with pytest.raises(ValueError), worker.activate(), stage('pipeline'):
+            raise ValueError('no prices')
+        tracker.merge(records = worker.records, asset = 'AAA')
+
+    assert tracker.status == 'ok'
+    assert tracker.failed_stage is None
+    assert 'market_analysis_run_failed 0' in open(tracker.to_prometheus(path = str(tmp_path / 'run.prom'))).read()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os, json
+import numpy as np
+import pandas as pd
+import pytest
+from lib.model_registry import model_registry, MODEL_EXT, META_EXT
+
+PARAMS = {'model': 'LSTM', 'pred_days': 30, 'units': 50, 'epoch': 5}
+
+class fake_model:
+    """Stand-in for a Keras model, saved as a file of a given size."""
+
+    def __init__(self, size: int = 10) -> None:
+        self.size = size
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as fl_stream:
+            fl_stream.write(b'0' * self.size)
+
+def _prices(rows: int, last: float | None = None) -> pd.DataFrame:
+    df = pd.DataFrame({'Date': pd.date_range('2020-01-01', periods = rows), 'Close': [float(i) for i in range(rows)]})
+    if last is not None:
+        df.loc[rows - 1, 'Close'] = last
+    return df
+
+def _ident(df: pd.DataFrame | None = None) -> dict:
+    return model_registry.model_ident(asset = 'BTC-USD', df = _prices(rows = 10) if df is None else df, params = PARAMS)
+
+def _key(df: pd.DataFrame, params: dict = PARAMS, asset: str = 'BTC-USD') -> str:
+    return model_registry.model_key(ident = model_registry.model_ident(asset = asset, df = df, params = params))
+
+def test_key_is_stable_for_the_same_data_and_hyperparameters():
+    assert _key(df = _prices(rows = 100)) == _key(df = _prices(rows = 100))
+    assert _key(df = _prices(rows = 100), params = dict(reversed(PARAMS.items()))) == _key(df = _prices(rows = 100))
+
+@pytest.mark.parametrize('change', [{'rows': 101}, {'last': -1.0}, {'params': dict(PARAMS, units = 64)}, {'asset': 'ETH-USD'}])
+def test_key_changes_with_the_data_range_last_row_hyperparameters_and_asset(change):
+    df = _prices(rows = change.get('rows', 100), last = change.get('last'))
+    assert _key(df = df, params = change.get('params', PARAMS), asset = change.get('asset', 'BTC-USD')) != _key(df = _prices(rows = 100))
+
+def test_save_writes_the_model_and_its_metadata(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 5, max_mb = 1)
+    df = _prices(rows = 100)
+    ident = model_registry.model_ident(asset = 'BTC-USD', df = df, params = PARAMS)
+    key = model_registry.model_key(ident = ident)
+    registry.save(key = key, model = fake_model(), meta = ident)
+
+    assert os.path.isfile(tmp_path / (key + MODEL_EXT))
+    meta = json.loads((tmp_path / (key + META_EXT)).read_text())
+    assert (meta['key'], meta['rows'], meta['last_date']) == (key, 100, str(df['Date'].iloc[-1]))
+    assert [entry[0] for entry in registry.entries()] == [key]
+
+def test_least_recently_used_models_are_evicted_past_the_entry_budget(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 4, max_mb = 1)
+    for i, key in enumerate('abcd'):
+        registry.save(key = key, model = fake_model(), meta = _ident())
+        os.utime(tmp_path / (key + MODEL_EXT), (i, i))
+    os.utime(tmp_path / ('a' + MODEL_EXT), (10, 10))  # Used again, the most recent.
+
+    registry.max_entries = 3
+    assert registry.evict() == ['b']
+    assert sorted(entry[0] for entry in registry.entries()) == ['a', 'c', 'd']
+    assert not os.path.exists(tmp_path / ('b' + META_EXT))
+
+def test_models_are_evicted_past_the_size_budget(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    for i, key in enumerate('abc'):
+        registry.save(key = key, model = fake_model(size = 100_000), meta = _ident())
+        os.utime(tmp_path / (key + MODEL_EXT), (i, i))
+
+    registry.max_mb = 0.25
+    assert registry.evict() == ['a']
+    assert [entry[0] for entry in registry.entries()] == ['b', 'c']
+
+def _cache(registry: model_registry, df: pd.DataFrame, params: dict = PARAMS) -> str:
+    ident = model_registry.model_ident(asset = 'BTC-USD', df = df, params = params)
+    key = model_registry.model_key(ident = ident)
+    registry.save(key = key, model = fake_model(), meta = ident)
+    return key
+
+def _warm_start(registry: model_registry, df: pd.DataFrame, max_rows: int = 10) -> str | None:
+    meta = registry.warm_start(ident = model_registry.model_ident(asset = 'BTC-USD', df = df, params = PARAMS),
+                            df = df, max_rows = max_rows)
+    return None if meta is None else meta['key']
+
+def test_warm_start_from_the_longest_cached_prefix(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    _cache(registry = registry, df = _prices(rows = 95))
+    parent = _cache(registry = registry, df = _prices(rows = 100))
+
+    assert _warm_start(registry = registry, df = _prices(rows = 104)) == parent
+
+def test_no_warm_start_past_the_appended_rows_budget(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    _cache(registry = registry, df = _prices(rows = 100))
+
+    assert _warm_start(registry = registry, df = _prices(rows = 111)) is None
+    assert _warm_start(registry = registry, df = _prices(rows = 100)) is None  # Nothing appended, a cache hit instead.
+
+def test_no_warm_start_when_the_stored_rows_changed(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    _cache(registry = registry, df = _prices(rows = 100))
+    df = _prices(rows = 104)
+    df.loc[99, 'Close'] = -1.0  # Last training row revised since the model was cached.
+
+    assert _warm_start(registry = registry, df = df) is None
+
+def test_no_warm_start_from_other_hyperparameters_or_start_dates(tmp_path):
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    _cache(registry = registry, df = _prices(rows = 100), params = dict(PARAMS, units = 64))
+    _cache(registry = registry, df = _prices(rows = 101).iloc[1:].reset_index(drop = True))
+
+    assert _warm_start(registry = registry, df = _prices(rows = 104)) is None
+
+def test_scaler_saved_with_the_model_is_loaded_back(tmp_path):
+    from sklearn.preprocessing import MinMaxScaler
+    registry = model_registry(root = str(tmp_path), max_entries = 10, max_mb = 1)
+    scaler = MinMaxScaler(feature_range = (0, 1)).fit(np.array([[3.0], [7.0], [11.0]]))
+    ident = _ident()
+    key = model_registry.model_key(ident = ident)
+    registry.save(key = key, model = fake_model(), meta = dict(ident, scaler = registry.scaler_state(scaler = scaler)))
+
+    loaded = registry.load_scaler(meta = registry.metadata(key = key))
+    values = np.array([[3.0], [5.0], [11.0]])
+    np.testing.assert_allclose(loaded.transform(values), scaler.transform(values))
+    assert registry.load_scaler(meta = _ident()) is None
+    assert registry.load_scaler(meta = None) is None
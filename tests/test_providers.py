@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import datetime
+import pandas as pd
+import pytest
+from lib.data import data
+from lib.exceptions import FetchError
+from lib.providers import _provider, local_provider, synthetic_provider, cached_provider, get_provider, OHLCV_COLUMNS
+
+class counting_provider(_provider):
+    """Provider counting the downloads it serves."""
+
+    def __init__(self, provider: _provider) -> None:
+        self.provider = provider
+        self.calls = 0
+
+    def download(self, ticker: str, start: str, end: str) -> pd.DataFrame:
+        self.calls += 1
+        return self.provider.download(ticker = ticker, start = start, end = end)
+
+def test_synthetic_bars_do_not_depend_on_the_requested_range():
+    provider = synthetic_provider(seed = 3)
+    long = provider.download(ticker = 'AAA', start = '2020-01-01', end = '2020-03-01')
+    short = provider.download(ticker = 'AAA', start = '2020-02-01', end = '2020-02-10')
+
+    assert list(long.columns) == list(OHLCV_COLUMNS)
+    assert long.index.name == 'Date'
+    assert (short.index[0], short.index[-1]) == (pd.Timestamp('2020-02-01'), pd.Timestamp('2020-02-09'))
+    pd.testing.assert_frame_equal(short, long.loc[short.index])
+    assert not provider.download(ticker = 'BBB', start = '2020-02-01', end = '2020-02-10').equals(short)
+
+@pytest.mark.parametrize('ext', ['csv', 'parquet'])
+def test_local_files_are_read_in_the_provider_layout(tmp_path, ext):
+    if ext == 'parquet':
+        pytest.importorskip('pyarrow')
+    bars = synthetic_provider().download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+    stored = bars.rename(columns = {'Adj Close': 'Adj_Close'}).reset_index().iloc[::-1]   # Storage layout, unsorted.
+    if ext == 'csv':
+        stored.to_csv(tmp_path / 'AAA.csv', index = False)
+    else:
+        stored.to_parquet(tmp_path / 'AAA.parquet', index = False)
+
+    df = local_provider(root = str(tmp_path)).download(ticker = 'AAA', start = '2021-01-10', end = '2021-01-20')
+    pd.testing.assert_frame_equal(df, bars.loc['2021-01-10':'2021-01-19'], check_freq = False, check_dtype = False)
+
+def test_local_provider_errors_are_permanent(tmp_path):
+    provider = local_provider(root = str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        provider.download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+
+    pd.DataFrame({'Date': ['2021-01-04'], 'Close': [1.0]}).to_csv(tmp_path / 'AAA.csv', index = False)
+    with pytest.raises(ValueError, match = 'Open'):
+        provider.download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+
+def test_cached_ranges_are_downloaded_once(tmp_path):
+    source = counting_provider(provider = synthetic_provider())
+    provider = cached_provider(provider = source, store = str(tmp_path))
+    first = provider.download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+    first.iloc[0, 0] = -1.0     # Callers get copies, the cache is not modified.
+    again = provider.download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+    provider.download(ticker = 'AAA', start = '2021-01-01', end = '2021-03-01')
+
+    assert source.calls == 2
+    assert again.iloc[0, 0] != -1.0
+
+    other_run = cached_provider(provider = source, store = str(tmp_path))
+    stored = other_run.download(ticker = 'AAA', start = '2021-01-01', end = '2021-02-01')
+    assert source.calls == 2
+    pd.testing.assert_frame_equal(stored, again, check_freq = False)
+
+def test_unknown_provider():
+    with pytest.raises(ValueError):
+        get_provider(name = 'bloomberg')
+
+def test_permanent_errors_are_not_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr('lib.ingest.sleep', lambda seconds: pytest.fail('a permanent error was retried'))
+    fetcher = data(start = datetime.datetime(2021, 1, 1), model_name = 'LSTM', provider = local_provider(root = str(tmp_path)),
+                rate = 0)
+
+    with pytest.raises(FetchError):
+        fetcher.asset_data(database = str(tmp_path / 'prices.db'), asset_type = 'Cryptocurrency', asset_list = ['AAA'])
+    assert [(result.status, result.attempts) for result in fetcher.results] == [('failed', 1)]
+    assert fetcher.results[0].error.startswith('FileNotFoundError')
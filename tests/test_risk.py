@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from lib.db_utils import risk_history
+from lib.ingest import price_frame
+from lib.providers import synthetic_provider
+from lib.risk import risk_engine, rolling_risk, RISK_METRICS
+from lib.storage import sqlite_storage
+
+ASSETS = ('AAA', 'BBB', 'CCC')
+WINDOWS = (5, 21)
+
+def _storage(db: str, end: str) -> sqlite_storage:
+    storage = sqlite_storage(db = db, model_name = 'test')
+    provider = synthetic_provider(seed = 7, freq = 'B')
+    for asset in ASSETS:
+        storage.replace(ticker = asset, df = price_frame(df = provider.download(ticker = asset, start = '2021-01-01', end = end)))
+    return storage
+
+def _history(db: str) -> pd.DataFrame:
+    return pd.concat([risk_history(db = db, asset = asset, window = window).assign(asset = asset, window = window)
+                    for asset in ASSETS for window in WINDOWS], ignore_index = True)
+
+def test_incremental_update_matches_a_full_recompute(tmp_path):
+    db = str(tmp_path / 'incremental.db')
+    storage = _storage(db = db, end = '2021-09-01')
+    engine = risk_engine(db = db, storage = storage, windows = WINDOWS, benchmark = 'AAA')
+    engine.update(assets = list(ASSETS))
+
+    provider = synthetic_provider(seed = 7, freq = 'B')
+    stored = {asset: storage.stored_range(ticker = asset)[1] for asset in ASSETS}
+    storage.append_many(frames = {asset: price_frame(df = provider.download(ticker = asset, start = '2021-01-01', end = '2021-12-01'),
+                                                    after = stored[asset]) for asset in ASSETS})
+    written = engine.update(assets = list(ASSETS))
+    assert all(0 < rows < 100 * len(ASSETS) for rows in written.values())    # Only the new days are written.
+
+    full_db = str(tmp_path / 'full.db')
+    risk_engine(db = full_db, storage = _storage(db = full_db, end = '2021-12-01'), windows = WINDOWS,
+                benchmark = 'AAA').update(assets = list(ASSETS), full = True)
+
+    incremental, full = _history(db = db), _history(db = full_db)
+    assert len(incremental) == len(full)
+    pd.testing.assert_frame_equal(incremental, full, rtol = 1e-9)
+
+def test_update_without_new_prices_writes_nothing(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    engine = risk_engine(db = db, storage = _storage(db = db, end = '2021-06-01'), windows = WINDOWS)
+    engine.update(assets = list(ASSETS))
+
+    assert engine.update(assets = list(ASSETS)) == dict.fromkeys(WINDOWS, 0)
+
+def test_rolling_risk_matches_a_direct_window_computation():
+    prices = synthetic_provider(seed = 2).download(ticker = 'AAA', start = '2020-01-01', end = '2020-04-01')['Close'].to_numpy()
+    window = 10
+    metrics = rolling_risk(prices = prices[:, None], window = window, periods = 252)
+
+    returns = np.diff(np.log(prices))
+    for day in (window, len(prices) - 1):
+        block = returns[day - window:day]
+        assert metrics['volatility'][day, 0] == pytest.approx(block.std(ddof = 1) * 252 ** .5)
+        assert metrics['max_drawdown'][day, 0] == pytest.approx((prices[day - window:day + 1]
+                                                                / np.maximum.accumulate(prices[day - window:day + 1]) - 1).min())
+    assert np.isnan(metrics['volatility'][window - 1, 0])
+    assert set(metrics) == set(RISK_METRICS)
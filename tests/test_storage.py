@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+from lib.providers import synthetic_provider
+from lib.storage import sqlite_storage, parquet_storage, get_storage, PRICE_COLUMNS
+
+def _bars(ticker: str = 'AAA', start: str = '2020-12-01', end: str = '2021-02-01') -> pd.DataFrame:
+    df = synthetic_provider(seed = 4).download(ticker = ticker, start = start, end = end)
+    return df.rename(columns = {'Adj Close': 'Adj_Close'}).reset_index().loc[:, list(PRICE_COLUMNS)]
+
+@pytest.fixture(params = ['sqlite', 'parquet'])
+def storage(request, tmp_path):
+    if request.param == 'parquet':
+        pytest.importorskip('pyarrow')
+        return parquet_storage(root = str(tmp_path / 'prices'))
+    return sqlite_storage(db = str(tmp_path / 'prices.db'), model_name = 'test')
+
+def test_replace_and_read_back(storage):
+    df = _bars()
+    assert storage.stored_range(ticker = 'BTC-USD') is None
+    assert storage.replace(ticker = 'BTC-USD', df = df) == len(df)
+
+    assert storage.stored_range(ticker = 'BTC-USD') == ('2020-12-01 00:00:00', '2021-01-31 00:00:00')
+    stored = storage.read(ticker = 'BTC-USD', columns = list(PRICE_COLUMNS))
+    pd.testing.assert_series_equal(stored['Close'], df['Close'], check_dtype = False)
+
+    assert storage.replace(ticker = 'BTC-USD', df = df.iloc[:10]) == 10
+    assert len(storage.read(ticker = 'BTC-USD')) == 10
+
+def test_read_selects_columns_and_dates(storage):
+    storage.replace(ticker = 'AAA', df = _bars())
+    df = storage.read(ticker = 'AAA', columns = ['Date', 'Close'], start = '2021-01-15', end = '2021-01-25')
+
+    assert list(df.columns) == ['Date', 'Close']
+    assert (df['Date'].iloc[0], df['Date'].iloc[-1]) == ('2021-01-15 00:00:00', '2021-01-25 00:00:00')
+    assert len(df) == 11
+
+def test_read_casts_the_dtypes(storage):
+    storage.replace(ticker = 'AAA', df = _bars())
+    df = storage.read(ticker = 'AAA', columns = ['Close', 'Volume'], dtypes = {'Close': 'float32'})
+
+    assert df['Close'].dtype == 'float32'
+    assert df['Volume'].dtype.kind == 'i'
+
+def test_append_adds_the_new_days(storage):
+    df = _bars()
+    storage.replace(ticker = 'AAA', df = df.iloc[:40])
+    storage.replace(ticker = 'BBB', df = _bars(ticker = 'BBB'))
+
+    assert storage.append(ticker = 'AAA', df = df.iloc[40:]) == len(df) - 40
+    assert storage.append(ticker = 'AAA', df = df.iloc[:0]) == 0
+    assert len(storage.read(ticker = 'AAA')) == len(df)
+    assert sorted(storage.assets()) == ['AAA', 'BBB']
+
+def test_assets_keep_the_ticker_names(storage):
+    for ticker in ('BTC-USD', 'BRK_B', 'X-Y_Z'):
+        storage.replace(ticker = ticker, df = _bars().iloc[:5])
+
+    assert sorted(storage.assets()) == ['BRK_B', 'BTC-USD', 'X-Y_Z']
+
+def test_append_skips_the_stored_dates(storage):
+    df = _bars()
+    storage.replace(ticker = 'AAA', df = df.iloc[:40])
+    assert storage.append(ticker = 'AAA', df = df.iloc[30:40]) == 0
+    storage.append(ticker = 'AAA', df = df.iloc[35:])
+    stored = storage.read(ticker = 'AAA')
+
+    assert len(stored) == len(df)
+    assert stored['Date'].is_unique
+
+def test_unknown_storage(tmp_path):
+    with pytest.raises(ValueError):
+        get_storage(name = 'csv', db = str(tmp_path / 'prices.db'), model_name = 'test')
+    with pytest.raises(ValueError):
+        get_storage(name = 'parquet', db = str(tmp_path / 'prices.db'), model_name = 'test')
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from lib.stream import ring_window, parse_bar
+
+def test_ring_window_keeps_the_latest_values_in_order():
+    window = ring_window(size = 4, values = np.arange(10.0))
+    np.testing.assert_array_equal(window.view(), [6, 7, 8, 9])
+
+    for value in range(10, 17):
+        window.push(value = value)
+        np.testing.assert_array_equal(window.view(), np.arange(value - 3, value + 1))
+
+def test_ring_window_view_is_not_a_copy():
+    window = ring_window(size = 3, values = np.ones(3))
+    view = window.view()
+
+    assert view.flags['C_CONTIGUOUS']
+    assert np.shares_memory(view, window._buf)
+
+def test_ring_window_needs_enough_values():
+    with pytest.raises(ValueError):
+        ring_window(size = 5, values = np.ones(4))
+
+def test_parse_bar_fills_the_missing_prices():
+    bar = parse_bar(bar = {'Date': '2024-01-02', 'Close': '101.5', 'Adj Close': 100.0}, ticker = 'BTC-USD')
+
+    assert bar['ticker'] == 'BTC-USD'
+    assert bar['Date'] == pd.Timestamp('2024-01-02')
+    assert (bar['Open'], bar['High'], bar['Low'], bar['Close']) == (101.5, 101.5, 101.5, 101.5)
+    assert bar['Adj_Close'] == 100.0
+    assert bar['Volume'] == 0.0
+
+def test_parse_bar_ticker_field_wins():
+    assert parse_bar(bar = {'ticker': 'ETH-USD', 'date': '2024-01-02', 'close': 1}, ticker = 'BTC-USD')['ticker'] == 'ETH-USD'
+
+@pytest.mark.parametrize('bar', [{'Date': '2024-01-02', 'Close': 1.0}, {'Ticker': 'A', 'Close': 1.0}, {'Ticker': 'A', 'Date': '2024-01-02'}])
+def test_parse_bar_rejects_incomplete_bars(bar):
+    with pytest.raises(ValueError):
+        parse_bar(bar = bar)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+import lib.sweep as sweep
+from lib.sweep import grid_trials, random_trials, hyper_sweep
+
+SPACE = {'units': [16, 32, 64], 'dropout': [0.1, 0.2, 0.3], 'batch': [16, 32]}
+DEFAULTS = {'units': 8, 'dropout': 0.0, 'optimizer': 'adam', 'loss': 'mse', 'epoch': 9, 'batch': 8}
+
+def _key(params: dict) -> tuple:
+    return tuple(params[key] for key in SPACE)
+
+def test_grid_covers_every_combination():
+    trials = grid_trials(space = SPACE, defaults = DEFAULTS)
+
+    assert len(trials) == 18
+    assert len(set(map(_key, trials))) == 18
+    assert all(params['optimizer'] == 'adam' and params['epoch'] == 9 for params in trials)
+
+def test_random_trials_are_distinct_and_seeded():
+    trials = random_trials(space = SPACE, defaults = DEFAULTS, n = 7, seed = 3)
+
+    assert len(set(map(_key, trials))) == 7
+    assert all(_key(params) in set(map(_key, grid_trials(space = SPACE, defaults = DEFAULTS))) for params in trials)
+    assert trials == random_trials(space = SPACE, defaults = DEFAULTS, n = 7, seed = 3)
+    assert trials != random_trials(space = SPACE, defaults = DEFAULTS, n = 7, seed = 4)
+
+def test_random_trials_of_a_small_space_is_the_grid():
+    assert random_trials(space = SPACE, defaults = DEFAULTS, n = 50) == grid_trials(space = SPACE, defaults = DEFAULTS)
+
+@pytest.fixture
+def sweeper(monkeypatch, tmp_path):
+    def fake_trial(prices, pred_days, horizon, params, validation, patience, seed):
+        # The more units and the more epochs, the better.
+        val_loss = 1.0 / (params['units'] * params['epoch']) + params['dropout']
+        return {'epochs_run': params['epoch'], 'val_loss': val_loss, 'loss': val_loss, 'wall_time': 0.0, 'status': 'ok'}
+
+    monkeypatch.setattr(sweep, 'run_trial', fake_trial)
+    monkeypatch.setattr(sweep, 'process_pool', lambda workers, threads = None: ThreadPoolExecutor(max_workers = workers))
+    return hyper_sweep(db = str(tmp_path / 'sweep.db'), asset = 'AAA', prices = pd.DataFrame({'Close': [1.0]}),
+                    pred_days = 5, defaults = DEFAULTS, workers = 2, threads = 1)
+
+def test_random_sweep_records_every_trial(sweeper):
+    df = sweeper.run(strategy = 'random', space = SPACE, n = 5)
+
+    assert len(df) == 5 and set(df['rung']) == {0}
+    assert df['val_loss'].is_monotonic_increasing
+
+def test_halving_keeps_the_best_trials_with_more_epochs(sweeper):
+    space = {'units': [16, 32, 64], 'dropout': [0.1, 0.2, 0.3]}
+    df = sweeper.run(strategy = 'halving', space = space)
+
+    assert df.groupby('rung').size().to_dict() == {0: 9, 1: 3, 2: 1}
+    assert df.groupby('rung')['epochs'].first().to_dict() == {0: 1, 1: 3, 2: 9}
+    assert df.iloc[0]['params'] == dict(DEFAULTS, units = 64, dropout = 0.1, epoch = 9)
+    assert {params['dropout'] for params in df.loc[df['rung'] == 1, 'params']} == {0.1}
+
+def test_unknown_strategy_and_random_without_trials(sweeper):
+    with pytest.raises(ValueError):
+        sweeper.run(strategy = 'bayes', space = SPACE)
+    with pytest.raises(ValueError):
+        sweeper.run(strategy = 'random', space = SPACE)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from lib.windows import sliding_windows, window_targets, _window_rows
+
+def _loop_windows(data: np.ndarray, window: int, stride: int = 1) -> np.ndarray:
+    """Windows built one by one, as the training loop used to."""
+
+    data = data.reshape(len(data), -1)
+    return np.array([data[start:start + window] for start in range(0, len(data) - window + 1, stride)])
+
+@pytest.mark.parametrize('stride', [1, 2, 5])
+@pytest.mark.parametrize('features', [1, 3])
+def test_windows_match_the_loop_windows(stride, features):
+    data = np.arange(200 * features, dtype = np.float64).reshape(200, features)
+    x = sliding_windows(data = data, window = 14, stride = stride)
+
+    assert x.shape == (len(range(0, 200 - 14 + 1, stride)), 14, features)
+    np.testing.assert_array_equal(x, _loop_windows(data = data, window = 14, stride = stride))
+
+def test_windows_are_read_only_views():
+    data = np.random.default_rng(0).random(50)
+    x = sliding_windows(data = data, window = 10)
+
+    assert np.shares_memory(x, data)
+    assert not x.flags.writeable
+
+def test_targets_follow_their_windows():
+    data = np.arange(30.0)
+    x, y = window_targets(data = data, window = 5, stride = 2)
+
+    assert len(x) == len(y)
+    np.testing.assert_array_equal(y, x[:, -1, 0] + 1)
+    assert not y.flags.writeable
+
+@pytest.mark.parametrize('stride', [1, 3])
+def test_horizon_targets_follow_their_windows(stride):
+    data = np.arange(30.0)
+    x, y = window_targets(data = data, window = 5, stride = stride, horizon = 4)
+
+    assert y.shape == (len(x), 4)
+    np.testing.assert_array_equal(y, x[:, -1:, 0] + np.arange(1, 5))
+    assert y[-1, -1] <= data[-1]
+    with pytest.raises(ValueError):
+        window_targets(data = data, window = 5, horizon = 0)
+
+def test_short_series_has_no_windows():
+    assert sliding_windows(data = np.arange(3.0), window = 7).shape == (0, 7, 1)
+
+@pytest.mark.parametrize('window, stride', [(0, 1), (5, 0)])
+def test_invalid_window_or_stride(window, stride):
+    with pytest.raises(ValueError):
+        sliding_windows(data = np.arange(10.0), window = window, stride = stride)
+
+def test_data_with_more_than_two_dimensions():
+    with pytest.raises(ValueError):
+        sliding_windows(data = np.zeros((10, 2, 2)), window = 3)
+
+def _gather(x: np.ndarray) -> np.ndarray:
+    """Windows gathered back from their rows, as window_dataset() does."""
+    rows, step = _window_rows(x = x)
+    return rows[np.arange(len(x))[:, None] * step + np.arange(x.shape[1])]
+
+@pytest.mark.parametrize('stride', [1, 4])
+def test_window_rows_share_the_series(stride):
+    data = np.arange(40.0).reshape(-1, 2)
+    x = sliding_windows(data = data, window = 6, stride = stride)
+    rows, step = _window_rows(x = x)
+
+    assert step == stride
+    assert np.shares_memory(rows, data)
+    np.testing.assert_array_equal(_gather(x = x), x)
+
+def test_window_rows_of_copied_windows():
+    x = np.ascontiguousarray(sliding_windows(data = np.arange(20.0), window = 5, stride = 3))
+    np.testing.assert_array_equal(_gather(x = x), x)
+
+@pytest.mark.parametrize('length', [5, 3])
+def test_window_rows_of_one_or_no_window(length):
+    x = sliding_windows(data = np.arange(float(length)), window = 5)
+    rows, _ = _window_rows(x = x)
+
+    assert len(rows) == len(x) * 5
+    np.testing.assert_array_equal(_gather(x = x), x)